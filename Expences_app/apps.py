@@ -1,6 +1,6 @@
-from django.apps import AppConfig
-
-
-class ExpencesAppConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'Expences_app'
+from django.apps import AppConfig
+
+
+class ExpencesAppConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'Expences_app'
@@ -0,0 +1,239 @@
+"""
+Per-user response cache of the ledger read endpoints.
+
+Every user has a ledger version stored in the `LEDGER_CACHE_ALIAS` cache. Cached responses are
+keyed by endpoint, user, version, query string and representation (a JSON page or an NDJSON
+stream, which is never stored, see split_up/streaming.py), so bumping the versions of the users
+touched by a write (the creator and the participants) makes exactly their entries unreachable;
+stale entries simply expire. A missing version starts from the current time in nanoseconds instead of
+1, so a version evicted from the cache is never handed out again.
+
+The same version gives every cached response a strong ETag, so a client polling with
+`If-None-Match` gets a 304 from a single cache read, before any expense row is loaded.
+"""
+import functools
+import hashlib
+import inspect
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.response import Response
+
+from split_up import routers, streaming
+
+_stats = {'hits': 0, 'misses': 0, 'not_modified': 0}
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[settings.LEDGER_CACHE_ALIAS]
+
+
+def _version_key(user_id):
+    return f'ledger-version:{user_id}'
+
+
+def get_version(user_id):
+    """The current ledger version of a user."""
+    cache = get_cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(user_id):
+    """Async version of `get_version`."""
+    if _in_process(get_cache()):
+        return get_version(user_id)
+    cache = get_cache()
+    key = _version_key(user_id)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def _in_process(cache):
+    # The async methods of Django's cache backends run the sync ones in a thread; the local memory
+    # cache never blocks, so it is cheaper to call it directly from the event loop
+    return isinstance(cache, LocMemCache)
+
+
+def _bump(user_ids):
+    cache = get_cache()
+    for user_id in set(user_ids):
+        key = _version_key(user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate_users(user_ids):
+    """
+    Invalidate the cached responses of `user_ids` after a write to their expenses.
+
+    The versions are bumped right away, so the rest of the writing request never reads a stale
+    entry, and once more when the transaction commits, to discard anything a concurrent request
+    cached from the pre-commit state in between. The users are also pinned to the primary
+    database for `REPLICA_PIN_SECONDS` (see split_up/routers.py).
+    """
+    user_ids = list(user_ids)
+    _written(user_ids)
+    transaction.on_commit(lambda: _written(user_ids))
+
+
+def _written(user_ids):
+    _bump(user_ids)
+    # Read-your-writes: the users read from the primary until the replicas have caught up, which
+    # also keeps a lagging replica from filling the cache under the new version
+    routers.pin(user_ids)
+
+
+def stats():
+    """Hit/miss counters of this process."""
+    with _stats_lock:
+        hits, misses, not_modified = _stats['hits'], _stats['misses'], _stats['not_modified']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'not_modified': not_modified,
+        'hit_rate': round(hits / total, 4) if total else None,
+    }
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _query_digest(request):
+    # The representation (JSON page or NDJSON stream) is part of the key, like the query string
+    query = request.GET.urlencode() if request.GET else ''
+    query += streaming.variant(request)
+    return hashlib.sha1(query.encode()).hexdigest() if query else '-'
+
+
+def response_key(name, request, version=None):
+    if version is None:
+        version = get_version(request.user.pk)
+    return f'ledger-response:{name}:{request.user.pk}:{version}:{_query_digest(request)}'
+
+
+def etag(name, request, version=None):
+    """Strong ETag of the response of endpoint `name` to `request`, computed without building it."""
+    if version is None:
+        version = get_version(request.user.pk)
+    digest = hashlib.sha1(f'{name}:{request.user.pk}:{version}:{_query_digest(request)}'.encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def not_modified(request, tag):
+    """True if the `If-None-Match` header of `request` matches `tag`."""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    # If-None-Match uses the weak comparison: W/"x" matches "x"
+    tags = [candidate.removeprefix('W/') for candidate in parse_etags(header)]
+    return '*' in tags or tag in tags
+
+
+def cache_per_user(name):
+    """
+    Cache the successful responses of a GET handler per user and ledger version.
+
+    `name` identifies the endpoint in the cache key. Responses carry an `ETag` and an
+    `X-Cache: HIT|MISS` header; a matching `If-None-Match` is answered with an empty 304.
+    Works on both sync and async handlers.
+    """
+    def decorator(handler):
+        if inspect.iscoroutinefunction(handler):
+            @functools.wraps(handler)
+            async def async_wrapper(self, request, *args, **kwargs):
+                version = await aget_version(request.user.pk)
+                tag = etag(name, request, version)
+                if not_modified(request, tag):
+                    _count('not_modified')
+                    return HttpResponseNotModified(headers={'ETag': tag})
+
+                cache = get_cache()
+                key = response_key(name, request, version)
+                cached = cache.get(key) if _in_process(cache) else await cache.aget(key)
+                if cached is not None:
+                    return _hit(cached, tag)
+
+                _count('misses')
+                response = await handler(self, request, *args, **kwargs)
+                # Streams are not cached: holding them whole is what streaming avoids
+                if response.status_code == 200 and not response.streaming:
+                    if _in_process(cache):
+                        cache.set(key, _freeze(response))
+                    else:
+                        await cache.aset(key, _freeze(response))
+                return _miss(response, tag)
+            return async_wrapper
+
+        @functools.wraps(handler)
+        def wrapper(self, request, *args, **kwargs):
+            version = get_version(request.user.pk)
+            tag = etag(name, request, version)
+            if not_modified(request, tag):
+                _count('not_modified')
+                response = Response(status=304)
+                response['ETag'] = tag
+                return response
+
+            cache = get_cache()
+            key = response_key(name, request, version)
+            cached = cache.get(key)
+            if cached is not None:
+                return _hit(cached, tag)
+
+            _count('misses')
+            response = handler(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, _freeze(response))
+            return _miss(response, tag)
+        return wrapper
+    return decorator
+
+
+def _hit(cached, tag):
+    _count('hits')
+    response = _thaw(cached)
+    response['X-Cache'] = 'HIT'
+    response['ETag'] = tag
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+def _miss(response, tag):
+    if response.status_code == 200:
+        response['ETag'] = tag
+    response['X-Cache'] = 'MISS'
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+def _freeze(response):
+    if isinstance(response, Response):
+        return ('data', response.data)
+    return ('content', response.content, response['Content-Type'])
+
+
+def _thaw(cached):
+    if cached[0] == 'data':
+        return Response(cached[1])
+    return HttpResponse(cached[1], content_type=cached[2])
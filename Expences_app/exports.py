@@ -0,0 +1,224 @@
+"""
+Balance sheet exports: the CSV rows, streamed by `balance-sheet/download/` or written to a file
+by a background `ExportJob`.
+
+Streaming a user's whole history ties up a web worker for as long as the download lasts. An
+export job instead runs on an in-process pool of `EXPORT_WORKERS` threads, with no broker: the
+job row is the queue entry, and `enqueue` hands its id to the pool once the transaction that
+created it commits. The worker counts the rows, writes them to `EXPORT_ROOT` one chunk of
+`EXPENSE_EXPORT_CHUNK_SIZE` rows at a time, recording `rows_written` after each chunk, and
+renames the file into place when it is complete, so a finished job never points at a partial
+file. With `EXPORT_WORKERS = 0` jobs run inline at commit, which the tests rely on.
+
+The pool is sized by `EXPORT_WORKERS` when a job is submitted: when the setting has changed, a
+new pool is started and the old one finishes its jobs. `wait_for_idle` waits for the submitted
+jobs to finish. At exit, the jobs still queued are marked failed and the running ones finished.
+Jobs queued or running when the process is killed are lost with it; `purge_exports` marks them
+failed once they are older than `EXPORT_RETENTION`, and deletes expired files.
+"""
+import atexit
+import csv
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import FilteredRelation, Q
+from django.utils import timezone
+
+from split_up import routers
+from .models import Expense, ExportJob, Participant
+
+HEADER = ['Expense ID', 'Description', 'Amount', 'Split Method', 'Created By', 'Created At', 'Your Share', 'Status']
+
+logger = logging.getLogger(__name__)
+
+# The pool, the EXPORT_WORKERS it was sized by, and the futures of its unfinished jobs by job id
+_pool = None
+_pool_size = None
+_pending = {}
+_pool_lock = threading.Lock()
+
+
+def balance_sheet_rows(user, using):
+    """
+    Every expense `user` created or takes part in, oldest first, read lazily from the database `using`.
+
+    One joined query: both sides of the OR are looked up by index, and the user's own participation
+    (if any) is attached through a filtered LEFT JOIN.
+    """
+    return (
+        Expense.objects.using(using)
+        .annotate(own_share=FilteredRelation('participants', condition=Q(participants__user=user)))
+        .filter(Q(created_by=user) | Q(expense_id__in=Participant.objects.filter(user=user).values('expense_id')))
+        .order_by('created_at', 'expense_id')
+        .values_list('expense_id', 'description', 'amount', 'split_method', 'created_by__name', 'created_at', 'own_share__amount', 'own_share__status')
+    )
+
+
+def csv_row(row):
+    """The CSV fields of one `balance_sheet_rows` row."""
+    expense_id, description, amount, split_method, created_by, created_at, user_share, status = row
+    # Expenses the user created without taking part in them have no share
+    if status is None:
+        user_share = 'N/A'
+        status = 'N/A'
+    return [
+        expense_id,
+        description,
+        amount,
+        split_method,
+        created_by,
+        created_at.strftime('%Y-%m-%d %H:%M:%S'),  # Format the date for CSV
+        user_share,
+        status
+    ]
+
+
+def file_path(job):
+    return os.path.join(settings.EXPORT_ROOT, job.file_name)
+
+
+def enqueue(job):
+    """Run `job` on the export pool once the current transaction commits."""
+    transaction.on_commit(lambda: _submit(job.pk))
+
+
+def _submit(job_id):
+    global _pool, _pool_size
+    if not settings.EXPORT_WORKERS:
+        run(job_id)
+        return
+    with _pool_lock:
+        if _pool_size != settings.EXPORT_WORKERS:
+            if _pool is not None:
+                _pool.shutdown(wait=False)  # its queued jobs still run
+            _pool = ThreadPoolExecutor(max_workers=settings.EXPORT_WORKERS, thread_name_prefix='export')
+            _pool_size = settings.EXPORT_WORKERS
+        future = _pending[job_id] = _pool.submit(_run_in_worker, job_id)
+    future.add_done_callback(lambda future: _forget(job_id, future))
+
+
+def _forget(job_id, future):
+    with _pool_lock:
+        if _pending.get(job_id) is future:
+            del _pending[job_id]
+
+
+def wait_for_idle(timeout=None):
+    """Wait for the jobs submitted so far to finish; returns False if some still run after `timeout` seconds."""
+    with _pool_lock:
+        futures = list(_pending.values())
+    _, not_done = wait(futures, timeout)
+    return not not_done
+
+
+@atexit.register
+def shutdown():
+    """Fail the jobs still queued, and wait for the running ones to finish."""
+    global _pool, _pool_size
+    with _pool_lock:
+        pending = list(_pending.items())
+        pool, _pool, _pool_size = _pool, None, None
+    # Outside of the lock: cancelling calls the done callbacks, which take it
+    cancelled = [job_id for job_id, future in pending if future.cancel()]
+    if pool is not None:
+        pool.shutdown(wait=True)
+    for job_id in cancelled:
+        fail(job_id, 'The server stopped before the export started.')
+
+
+def _run_in_worker(job_id):
+    # Pool threads outlive requests: manage their connections like the request cycle does
+    close_old_connections()
+    try:
+        run(job_id)
+    except Exception as e:
+        # run() records its failures, unless the database fails it there too: try once more
+        logger.exception('Export job %s failed', job_id)
+        close_old_connections()
+        try:
+            fail(job_id, e)
+        except Exception:
+            logger.exception('Could not record the failure of export job %s', job_id)
+    finally:
+        close_old_connections()
+
+
+def fail(job_id, error, started_at=None):
+    """Record `error` on the job and mark it failed, unless it has finished."""
+    finished_at = timezone.now()
+    ExportJob.objects.filter(pk=job_id, status__in=['queued', 'running']).update(
+        status='failed', file_name='', error=f'{error}', finished_at=finished_at,
+        duration=finished_at - started_at if started_at is not None else None
+    )
+
+
+def run(job_id):
+    """Write the CSV file of a queued job, recording its progress. Failures are recorded on the job."""
+    started_at = timezone.now()
+    paths = []
+    try:
+        if not ExportJob.objects.filter(pk=job_id, status='queued').update(status='running', started_at=started_at):
+            return  # already picked up, or no longer exists
+        job = ExportJob.objects.get(pk=job_id)
+        job.file_name = f'{job.pk}.csv'
+        partial_path = file_path(job) + '.part'
+        paths = [partial_path, file_path(job)]
+
+        # A long scan, which a replica can serve, unless the user has just written
+        rows = balance_sheet_rows(job.user_id, routers.read_alias_for(job.user_id))
+        job.total_rows = rows.count()
+        ExportJob.objects.filter(pk=job.pk).update(total_rows=job.total_rows)
+
+        os.makedirs(settings.EXPORT_ROOT, exist_ok=True)
+        with open(partial_path, 'w', newline='', encoding='utf-8') as file:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(HEADER)
+            for row in rows.iterator(chunk_size=settings.EXPENSE_EXPORT_CHUNK_SIZE):
+                writer.writerow(csv_row(row))
+                job.rows_written += 1
+                if job.rows_written % settings.EXPENSE_EXPORT_CHUNK_SIZE == 0:
+                    _flush(file, buffer, job)
+            _flush(file, buffer, job)
+        os.replace(partial_path, file_path(job))
+        job.status = 'done'
+        job.finished_at = timezone.now()
+        job.duration = job.finished_at - job.started_at
+        job.save(update_fields=['status', 'file_name', 'rows_written', 'finished_at', 'duration'])
+    except Exception as e:
+        # Keep neither the partial file nor a complete one the failed job no longer points at
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+        fail(job_id, e, started_at)
+
+
+def _flush(file, buffer, job):
+    file.write(buffer.getvalue())
+    buffer.seek(0)
+    buffer.truncate()
+    ExportJob.objects.filter(pk=job.pk).update(rows_written=job.rows_written)
+
+
+def purge_expired(now=None):
+    """
+    Delete the jobs, and files, finished more than `EXPORT_RETENTION` ago, and fail the jobs queued
+    or running for longer than that, which were lost with the process that ran them.
+
+    Returns (deleted, failed) job counts.
+    """
+    cutoff = (now or timezone.now()) - settings.EXPORT_RETENTION
+    expired = ExportJob.objects.filter(status__in=['done', 'failed'], finished_at__lt=cutoff)
+    for job in expired.exclude(file_name=''):
+        if os.path.exists(file_path(job)):
+            os.remove(file_path(job))
+    deleted, _ = expired.delete()
+    failed = ExportJob.objects.filter(status__in=['queued', 'running'], created_at__lt=cutoff).update(
+        status='failed', error='The export was interrupted.', finished_at=timezone.now()
+    )
+    return deleted, failed
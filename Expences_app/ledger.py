@@ -0,0 +1,183 @@
+"""
+Incremental maintenance of the pairwise `Balance` table.
+
+A pending `Participant` row means its user owes the creator of the expense the
+participant's amount. `Balance` keeps the running total of those rows per pair of
+users, so reads never have to aggregate the participant history: debts in opposite
+directions net out, leaving one row, from the user who owes to the one who is owed,
+or none once the pair is even.
+For the expenses of a group, `GroupMember.net_balance` likewise keeps every member's
+net position in the group. Every function here must be called inside the
+transaction that writes the participant rows it describes.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .models import Balance, GroupMember, Participant
+
+CENT = Decimal('0.01')
+
+
+def to_decimal(value):
+    """Convert a participant amount (float, str or Decimal) to a 2 decimal places Decimal."""
+    if value is None:
+        return Decimal('0.00')
+    return Decimal(str(value)).quantize(CENT)
+
+
+def add_debts(rows):
+    """Record new pending debts. `rows` is an iterable of (debtor_id, creditor_id, amount)."""
+    _apply(rows, 1)
+
+
+def settle_debts(rows):
+    """Remove settled debts. `rows` is an iterable of (debtor_id, creditor_id, amount)."""
+    _apply(rows, -1)
+
+
+def _apply(rows, sign):
+    # Deltas per pair of users, keyed (low_id, high_id): positive when the low id owes the high id
+    deltas = defaultdict(Decimal)
+    # The pairs of each creditor, whose rows are read with one query (the callers pass one creditor, mostly)
+    by_creditor = defaultdict(set)
+    for debtor_id, creditor_id, amount in rows:
+        if debtor_id != creditor_id:
+            pair, direction = _pair(debtor_id, creditor_id)
+            if pair not in deltas:
+                by_creditor[creditor_id].add(debtor_id)
+            deltas[pair] += direction * sign * to_decimal(amount)
+
+    existing = {}
+    for creditor_id, debtor_ids in by_creditor.items():
+        debtor_ids = [debtor_id for debtor_id in debtor_ids if deltas[_pair(debtor_id, creditor_id)[0]]]
+        if debtor_ids:
+            existing.update(
+                (_pair(balance.debtor_id, balance.creditor_id)[0], balance)
+                for balance in Balance.objects.select_for_update().filter(
+                    Q(creditor_id=creditor_id, debtor_id__in=debtor_ids) | Q(debtor_id=creditor_id, creditor_id__in=debtor_ids)
+                )
+            )
+
+    now = timezone.now()
+    changed = []
+    created = []
+    emptied = []
+    for (low_id, high_id), delta in deltas.items():
+        if not delta:
+            continue
+        balance = existing.get((low_id, high_id))
+        if balance is not None:
+            delta += balance.amount if balance.debtor_id == low_id else -balance.amount
+        # The pair keeps one row, in the direction of what is owed net, and none once it is even
+        debtor_id, creditor_id = (low_id, high_id) if delta > 0 else (high_id, low_id)
+        if balance is None:
+            created.append(Balance(debtor_id=debtor_id, creditor_id=creditor_id, amount=abs(delta)))
+        elif not delta:
+            emptied.append(balance.pk)
+        else:
+            balance.debtor_id, balance.creditor_id = debtor_id, creditor_id
+            balance.amount = abs(delta)
+            balance.updated_at = now
+            changed.append(balance)
+    if emptied:
+        Balance.objects.filter(pk__in=emptied).delete()
+    if changed:
+        Balance.objects.bulk_update(changed, ['debtor', 'creditor', 'amount', 'updated_at'])
+    if created:
+        Balance.objects.bulk_create(created)
+
+
+def _pair(debtor_id, creditor_id):
+    """The (low_id, high_id) key of a pair of users, and 1 if `debtor_id` is the low id, -1 otherwise."""
+    if debtor_id < creditor_id:
+        return (debtor_id, creditor_id), 1
+    return (creditor_id, debtor_id), -1
+
+
+def add_group_debts(rows):
+    """Record new pending debts in groups. `rows` is an iterable of (group_id, debtor_id, creditor_id, amount)."""
+    _apply_group(rows, 1)
+
+
+def settle_group_debts(rows):
+    """Remove settled debts from groups. `rows` is an iterable of (group_id, debtor_id, creditor_id, amount)."""
+    _apply_group(rows, -1)
+
+
+def _apply_group(rows, sign):
+    # A debt raises the creditor's net balance and lowers the debtor's by the same amount
+    by_group = defaultdict(lambda: defaultdict(Decimal))
+    for group_id, debtor_id, creditor_id, amount in rows:
+        if group_id is not None and debtor_id != creditor_id:
+            delta = sign * to_decimal(amount)
+            by_group[group_id][creditor_id] += delta
+            by_group[group_id][debtor_id] -= delta
+
+    for group_id, member_deltas in by_group.items():
+        member_deltas = {user_id: delta for user_id, delta in member_deltas.items() if delta}
+        if not member_deltas:
+            continue
+        members = list(GroupMember.objects.select_for_update().filter(group_id=group_id, user_id__in=list(member_deltas)))
+        for member in members:
+            member.net_balance += member_deltas[member.user_id]
+        GroupMember.objects.bulk_update(members, ['net_balance'])
+
+
+def compute_balances():
+    """Recompute {(debtor_id, creditor_id): amount} from the pending `Participant` rows, netted per pair of users."""
+    pending = (
+        Participant.objects.filter(status="pending")
+        .exclude(user=F('expense__created_by'))
+        .values_list('user_id', 'expense__created_by_id')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+    net = defaultdict(Decimal)
+    for debtor_id, creditor_id, total in pending:
+        pair, direction = _pair(debtor_id, creditor_id)
+        net[pair] += direction * to_decimal(total)
+    return {
+        (low_id, high_id) if amount > 0 else (high_id, low_id): abs(amount)
+        for (low_id, high_id), amount in net.items() if amount
+    }
+
+
+def rebuild_balances():
+    """Replace the whole `Balance` table with the balances recomputed from `Participant`."""
+    balances = compute_balances()
+    Balance.objects.all().delete()
+    Balance.objects.bulk_create(
+        [Balance(debtor_id=debtor_id, creditor_id=creditor_id, amount=amount)
+         for (debtor_id, creditor_id), amount in balances.items() if amount],
+        batch_size=1000
+    )
+    return balances
+
+
+def compute_group_balances():
+    """Recompute {(group_id, user_id): net_balance} from the pending `Participant` rows of group expenses."""
+    pending = (
+        Participant.objects.filter(status="pending", expense__group__isnull=False)
+        .exclude(user=F('expense__created_by'))
+        .values_list('expense__group_id', 'user_id', 'expense__created_by_id')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+    net = defaultdict(Decimal)
+    for group_id, debtor_id, creditor_id, total in pending:
+        net[(group_id, creditor_id)] += to_decimal(total)
+        net[(group_id, debtor_id)] -= to_decimal(total)
+    return dict(net)
+
+
+def rebuild_group_balances():
+    """Reset the net balance of every group member to the one recomputed from `Participant`."""
+    net = compute_group_balances()
+    members = list(GroupMember.objects.select_for_update())
+    for member in members:
+        member.net_balance = net.get((member.group_id, member.user_id), Decimal('0.00'))
+    GroupMember.objects.bulk_update(members, ['net_balance'], batch_size=1000)
+    return net
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from Expences_app.rollups import FIELDS, compute_rollups, rebuild_rollups
+from Expences_app.models import MonthlyRollup
+
+
+class Command(BaseCommand):
+    help = "Populate the MonthlyRollup table from the existing Participant rows, or verify it with --check."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Only compare the rollups with the recomputed ones and fail if they differ.",
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            expected = {key: tuple(totals[field] for field in FIELDS) for key, totals in compute_rollups().items()}
+            actual = {
+                (user_id, month, split_method): tuple(totals)
+                for user_id, month, split_method, *totals in MonthlyRollup.objects.values_list('user_id', 'month', 'split_method', *FIELDS)
+            }
+            mismatches = [
+                (key, actual.get(key), expected.get(key))
+                for key in expected.keys() | actual.keys()
+                if actual.get(key) != expected.get(key)
+            ]
+            for (user_id, month, split_method), found, wanted in mismatches:
+                self.stdout.write(f"{user_id} {month:%Y-%m} {split_method}: rollup {found}, expected {wanted}")
+            if mismatches:
+                raise CommandError(f"{len(mismatches)} rollup(s) out of sync; run backfill_rollups to repair.")
+            self.stdout.write(self.style.SUCCESS(f"Rollups are in sync ({len(expected)} rollups)."))
+            return
+
+        with transaction.atomic():
+            rollups = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {len(rollups)} rollups."))
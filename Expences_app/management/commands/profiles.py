@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from split_up import profiling
+
+
+class Command(BaseCommand):
+    help = (
+        "List the request profiles saved by staff users with `X-Profile: save`, "
+        "or summarize one: its slowest functions and SQL statements."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('profile_id', nargs='?', help="The profile to summarize (see the list).")
+        parser.add_argument(
+            '--sort',
+            default='cumulative',
+            choices=['cumulative', 'tottime', 'ncalls'],
+            help="Order of the functions of the summary.",
+        )
+        parser.add_argument('--limit', type=int, default=25, help="Functions and SQL statements shown by the summary.")
+
+    def handle(self, *args, **options):
+        if options['profile_id']:
+            self.summarize(options['profile_id'], options['sort'], options['limit'])
+            return
+
+        profiles = profiling.saved()
+        for data in profiles:
+            sql_ms = sum(query['duration_ms'] for query in data['queries'])
+            self.stdout.write(
+                f"{data['id']}  {data['created_at'][:19]}  {data['user']}  {data['method']} {data['path']}  "
+                f"{data['status']}  {data['duration_ms']:.1f} ms  {len(data['queries'])} queries ({sql_ms:.1f} ms)"
+            )
+        self.stdout.write(self.style.SUCCESS(f"{len(profiles)} profile(s) in {settings.PROFILE_ROOT}."))
+
+    def summarize(self, profile_id, sort, limit):
+        try:
+            data, stats = profiling.load(profile_id)
+        except FileNotFoundError:
+            raise CommandError(f"No profile {profile_id}.")
+
+        queries = data['queries']
+        sql_ms = sum(query['duration_ms'] for query in queries)
+        self.stdout.write(f"{data['method']} {data['path']} by {data['user']} at {data['created_at']}")
+        self.stdout.write(f"status {data['status']}, {data['duration_ms']:.1f} ms, {len(queries)} queries in {sql_ms:.1f} ms")
+
+        self.stdout.write(profiling.summary(stats, sort, limit))
+
+        self.stdout.write("Slowest SQL statements:")
+        for query in sorted(queries, key=lambda query: query['duration_ms'], reverse=True)[:limit]:
+            self.stdout.write(f"  {query['duration_ms']:8.3f} ms  {query['sql']}")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from Expences_app.exports import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete the balance sheet exports finished more than EXPORT_RETENTION ago, with their files, and fail the interrupted ones."
+
+    def handle(self, *args, **options):
+        deleted, failed = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired exports, failed {failed} interrupted exports."))
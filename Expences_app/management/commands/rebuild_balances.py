@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from Expences_app.ledger import compute_balances, compute_group_balances, rebuild_balances, rebuild_group_balances
+from Expences_app.models import Balance, GroupMember
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the Balance ledger and the group net balances from the pending Participant rows, "
+        "or verify them with --check."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Only compare the ledger with the recomputed balances and fail if they differ.",
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            expected = {pair: amount for pair, amount in compute_balances().items() if amount}
+            actual = {
+                (debtor_id, creditor_id): amount
+                for debtor_id, creditor_id, amount in Balance.objects.exclude(amount=0).values_list('debtor_id', 'creditor_id', 'amount')
+            }
+            mismatches = [
+                (pair, actual.get(pair), expected.get(pair))
+                for pair in expected.keys() | actual.keys()
+                if actual.get(pair) != expected.get(pair)
+            ]
+            for (debtor_id, creditor_id), found, wanted in mismatches:
+                self.stdout.write(f"{debtor_id} -> {creditor_id}: ledger {found}, expected {wanted}")
+
+            expected_net = {key: amount for key, amount in compute_group_balances().items() if amount}
+            actual_net = {
+                (group_id, user_id): amount
+                for group_id, user_id, amount in GroupMember.objects.exclude(net_balance=0).values_list('group_id', 'user_id', 'net_balance')
+            }
+            group_mismatches = [
+                (key, actual_net.get(key), expected_net.get(key))
+                for key in expected_net.keys() | actual_net.keys()
+                if actual_net.get(key) != expected_net.get(key)
+            ]
+            for (group_id, user_id), found, wanted in group_mismatches:
+                self.stdout.write(f"{user_id} in group {group_id}: net {found}, expected {wanted}")
+
+            if mismatches or group_mismatches:
+                raise CommandError(
+                    f"{len(mismatches)} balance(s) and {len(group_mismatches)} group net balance(s) out of sync; "
+                    "run rebuild_balances to repair."
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f"Ledger is in sync ({len(expected)} balances, {len(expected_net)} group net balances)."
+            ))
+            return
+
+        with transaction.atomic():
+            balances = rebuild_balances()
+            net = rebuild_group_balances()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {sum(1 for amount in balances.values() if amount)} balances "
+            f"and {sum(1 for amount in net.values() if amount)} group net balances."
+        ))
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from split_up.routers import replicate
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into every DATABASE_REPLICAS database, once or every "
+        "--interval seconds: a stand-in for replication in development."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help="Keep copying, waiting this many seconds between copies.",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError("No DATABASE_REPLICAS configured.")
+
+        while True:
+            for alias in settings.DATABASE_REPLICAS:
+                replicate(alias)
+            self.stdout.write(self.style.SUCCESS(f"Copied the primary into {', '.join(settings.DATABASE_REPLICAS)}."))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
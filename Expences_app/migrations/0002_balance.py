@@ -0,0 +1,53 @@
+# Generated by Django 5.1.2 on 2026-10-18 00:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def populate_balances(apps, schema_editor):
+    Participant = apps.get_model('Expences_app', 'Participant')
+    Balance = apps.get_model('Expences_app', 'Balance')
+    pending = (
+        Participant.objects.filter(status='pending')
+        .exclude(user=F('expense__created_by'))
+        .values_list('user_id', 'expense__created_by_id')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+    # One row per pair of users, net of the debts in both directions
+    net = {}
+    for debtor_id, creditor_id, total in pending:
+        net[(debtor_id, creditor_id)] = net.get((debtor_id, creditor_id), 0) + total
+        net[(creditor_id, debtor_id)] = net.get((creditor_id, debtor_id), 0) - total
+    Balance.objects.bulk_create(
+        [Balance(debtor_id=debtor_id, creditor_id=creditor_id, amount=total)
+         for (debtor_id, creditor_id), total in net.items() if total > 0],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Expences_app', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Balance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('creditor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credits', to=settings.AUTH_USER_MODEL)),
+                ('debtor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='debts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('debtor', 'creditor')},
+            },
+        ),
+        migrations.RunPython(populate_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.2 on 2026-10-18 03:20
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_expense_created_at(apps, schema_editor):
+    Expense = apps.get_model('Expences_app', 'Expense')
+    Participant = apps.get_model('Expences_app', 'Participant')
+    Participant.objects.update(
+        created_at=Subquery(Expense.objects.filter(pk=OuterRef('expense_id')).values('created_at')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Expences_app', '0008_export_jobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participant',
+            name='created_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(copy_expense_created_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='participant',
+            name='created_at',
+            field=models.DateTimeField(),
+        ),
+        migrations.RemoveIndex(
+            model_name='participant',
+            name='participant_user_status_idx',
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['user', 'status', 'created_at', 'expense'], name='participant_user_status_cr_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['user', 'created_at', 'expense'], name='participant_user_created_idx'),
+        ),
+    ]
@@ -1,39 +1,180 @@
-import uuid
-from django.db import models
-from django.conf import settings
-from django.core.validators import MinValueValidator, MaxValueValidator  # Import validators
-
-
-class Expense(models.Model):
-    SPLIT_METHOD_CHOICES = [
-        ('equal', 'Equal'),
-        ('exact', 'Exact'),
-        ('percentage', 'Percentage'),
-    ]
-    
-    expense_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, unique=True)  # Set as primary key
-    description = models.CharField(max_length=255, blank=False, null=False)
-    amount = models.DecimalField(max_digits=10, decimal_places=2, blank=False, null=False)
-    split_method = models.CharField(max_length=20, choices=SPLIT_METHOD_CHOICES, blank=False, null=False)
-    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="created_expenses")
-    
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
-
-    def __str__(self):
-        return f"{self.description} - {self.amount} ({self.split_method})"
-
-class Participant(models.Model):
-    STATUS_CHOICES = [
-        ('pending', 'Pending'),
-        ('settled', 'Settled'),
-    ]
-
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="participant_expenses")
-    expense = models.ForeignKey(Expense, on_delete=models.CASCADE, related_name="participants")
-    amount = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
-    percentage = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True, validators=[MinValueValidator(0), MaxValueValidator(100)])  # Validators for percentage
-    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
-
-    def __str__(self):
-        return f"Participant: {self.user.username}, Status: {self.status}"  # Changed to username since we are not using email
+import uuid
+from django.db import models
+from django.conf import settings
+from django.core.validators import MinValueValidator, MaxValueValidator  # Import validators
+
+
+class Group(models.Model):
+    """A group of users sharing expenses, e.g. a flat or a trip."""
+    group_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=255)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="created_groups")
+    members = models.ManyToManyField(settings.AUTH_USER_MODEL, through='GroupMember', related_name="expense_groups")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class GroupMember(models.Model):
+    """
+    Membership of a user in a group, with the user's materialized net balance in the group:
+    what the other members owe them minus what they owe the other members, over the pending
+    participations in the group's expenses. Kept up to date on expense create and settle.
+    """
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name="memberships")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="group_memberships")
+    net_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('group', 'user')
+
+    def __str__(self):
+        return f"{self.user} in {self.group}: {self.net_balance}"
+
+
+class Expense(models.Model):
+    SPLIT_METHOD_CHOICES = [
+        ('equal', 'Equal'),
+        ('exact', 'Exact'),
+        ('percentage', 'Percentage'),
+    ]
+    
+    expense_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, unique=True)  # Set as primary key
+    description = models.CharField(max_length=255, blank=False, null=False)
+    amount = models.DecimalField(max_digits=10, decimal_places=2, blank=False, null=False)
+    split_method = models.CharField(max_length=20, choices=SPLIT_METHOD_CHOICES, blank=False, null=False)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="created_expenses")
+    group = models.ForeignKey(Group, on_delete=models.SET_NULL, related_name="expenses", blank=True, null=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination order, globally and per creator (users_expense and the export)
+            models.Index(fields=['created_at', 'expense_id'], name='expense_created_idx'),
+            models.Index(fields=['created_by', 'created_at', 'expense_id'], name='expense_creator_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.description} - {self.amount} ({self.split_method})"
+
+class Participant(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('settled', 'Settled'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="participant_expenses")
+    expense = models.ForeignKey(Expense, on_delete=models.CASCADE, related_name="participants")
+    amount = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    percentage = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True, validators=[MinValueValidator(0), MaxValueValidator(100)])  # Validators for percentage
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    # Creation time of the expense, copied so that a user's participations are paginated in index order
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination order of a user's pending (or settled) participations: users_expense
+            models.Index(fields=['user', 'status', 'created_at', 'expense'], name='participant_user_status_cr_idx'),
+            # Keyset pagination order of all of a user's participations: balance_sheet
+            models.Index(fields=['user', 'created_at', 'expense'], name='participant_user_created_idx'),
+            # One user's participation in an expense: settle_expense and the joins from Expense
+            models.Index(fields=['expense', 'user', 'status'], name='participant_exp_usr_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Participant: {self.user.username}, Status: {self.status}"  # Changed to username since we are not using email
+
+
+class Balance(models.Model):
+    """
+    Materialized pending amount `debtor` owes `creditor`, net of what `creditor` owes `debtor`, kept up
+    to date on expense create and settle. A pair of users has at most one row, and none when even.
+    """
+    debtor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="debts")
+    creditor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="credits")
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('debtor', 'creditor')
+
+    def __str__(self):
+        return f"{self.debtor} owes {self.creditor}: {self.amount}"
+
+
+class MonthlyRollup(models.Model):
+    """
+    Materialized monthly totals of a user's shares, per split method, kept up to date on expense create
+    and settle. `month` is the first day of the month the expenses were created in.
+
+    - `spent`: the user's shares of the expenses they take part in, their own share included;
+    - `owed` / `settled`: the user's shares of other users' expenses that are still pending / settled;
+    - `expenses`: the number of expenses the user takes part in.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="monthly_rollups")
+    month = models.DateField()
+    split_method = models.CharField(max_length=20, choices=Expense.SPLIT_METHOD_CHOICES)
+    spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    owed = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    settled = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expenses = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Also the index of the analytics range reads: one user, a range of months
+        unique_together = ('user', 'month', 'split_method')
+
+    def __str__(self):
+        return f"{self.user} {self.month:%Y-%m} ({self.split_method}): spent {self.spent}"
+
+
+class ExportJob(models.Model):
+    """
+    A balance sheet export written to a CSV file in the background (see exports.py).
+
+    `total_rows` is counted when the job starts and `rows_written` grows chunk by chunk, so
+    clients can poll the progress; `duration` is the time from start to finish.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    job_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="export_jobs")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    total_rows = models.PositiveIntegerField(null=True, blank=True)
+    rows_written = models.PositiveIntegerField(default=0)
+    file_name = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration = models.DurationField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # A user's unfinished jobs, checked before a new one is queued
+            models.Index(fields=['user', 'status'], name='exportjob_user_status_idx'),
+        ]
+
+    @property
+    def progress(self):
+        """Percentage of the rows written, None until the job has counted them."""
+        if self.status == 'done':
+            return 100
+        if not self.total_rows:
+            return None if self.total_rows is None else 0
+        return min(100, self.rows_written * 100 // self.total_rows)
+
+    def __str__(self):
+        return f"Export {self.job_id} of {self.user} ({self.status})"
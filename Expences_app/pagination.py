@@ -0,0 +1,123 @@
+"""
+Keyset (cursor) pagination ordered by (created_at, expense_id).
+
+A page is fetched with `WHERE (created_at, expense_id) > last seen ORDER BY created_at, expense_id
+LIMIT n`, so page N costs the same as page 1 instead of growing like an OFFSET scan, provided an
+index on the filtered columns followed by (created_at, expense_id) returns the rows in that order
+(see the indexes of `Expense` and `Participant`). The cursor
+handed to the client is an opaque url-safe token holding the last seen position of every list
+of the response, so one cursor can drive several independently paginated lists.
+"""
+import base64
+import json
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    """Raised when a cursor or page size sent by the client cannot be used."""
+
+
+def get_limit(request):
+    """The page size requested with `?limit=`, capped at `EXPENSE_MAX_PAGE_SIZE`."""
+    limit = request.GET.get('limit')
+    if limit is None:
+        return settings.EXPENSE_PAGE_SIZE
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise InvalidCursor("limit must be a positive integer.")
+    if limit < 1:
+        raise InvalidCursor("limit must be a positive integer.")
+    return min(limit, settings.EXPENSE_MAX_PAGE_SIZE)
+
+
+def decode_cursor(request, sections):
+    """
+    Return {section: position} from the `?cursor=` query parameter.
+
+    A position is None for the first page and a (created_at, expense_id) tuple afterwards.
+    Sections missing from a cursor are exhausted and are left out of the result. A cursor with
+    no section, or one `sections` does not have (e.g. another endpoint's cursor), is invalid.
+    """
+    cursor = request.GET.get('cursor')
+    if not cursor:
+        return {section: None for section in sections}
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode() + b'=' * (-len(cursor) % 4)))
+        if not isinstance(data, dict) or not data or not data.keys() <= set(sections):
+            raise InvalidCursor("Invalid cursor.")
+        return {
+            section: (datetime.fromisoformat(data[section][0]), uuid.UUID(data[section][1]))
+            for section in sections if section in data
+        }
+    except (ValueError, TypeError, KeyError, IndexError):
+        raise InvalidCursor("Invalid cursor.")
+
+
+def encode_cursor(positions):
+    """
+    Build the `next` cursor from {section: (created_at, expense_id) or None}.
+
+    Sections whose position is None are exhausted; returns None when every section is.
+    """
+    data = {
+        section: [position[0].isoformat(), str(position[1])]
+        for section, position in positions.items() if position is not None
+    }
+    if not data:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).rstrip(b'=').decode()
+
+
+def keyset_page(queryset, position, limit, created_at='created_at', expense_id='expense_id'):
+    """
+    Fetch the page of `queryset` that follows `position`.
+
+    `created_at` and `expense_id` name the ordering fields on the queryset's model. Returns
+    (rows, next_position) where next_position is None when this is the last page.
+    """
+    rows = list(_page_queryset(queryset, position, limit, created_at, expense_id))
+    return _split_page(rows, limit, created_at, expense_id)
+
+
+async def akeyset_page(queryset, position, limit, created_at='created_at', expense_id='expense_id'):
+    """Async version of `keyset_page`."""
+    rows = [row async for row in _page_queryset(queryset, position, limit, created_at, expense_id)]
+    return _split_page(rows, limit, created_at, expense_id)
+
+
+def after(queryset, position, created_at='created_at', expense_id='expense_id'):
+    """Every row of `queryset` that follows `position` (None for all of them), in keyset order."""
+    queryset = queryset.order_by(created_at, expense_id)
+    if position is not None:
+        last_created_at, last_expense_id = position
+        # The redundant `created_at >= last` lets the index seek to the position instead of reading up to it
+        queryset = queryset.filter(
+            Q(**{f'{created_at}__gte': last_created_at}),
+            Q(**{f'{created_at}__gt': last_created_at}) | Q(**{f'{expense_id}__gt': last_expense_id})
+        )
+    return queryset
+
+
+def _page_queryset(queryset, position, limit, created_at, expense_id):
+    return after(queryset, position, created_at, expense_id)[:limit + 1]
+
+
+def _split_page(rows, limit, created_at, expense_id):
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, (_resolve(last, created_at), _resolve(last, expense_id))
+
+
+def _resolve(row, path):
+    if isinstance(row, dict):
+        return row[path]
+    for name in path.split('__'):
+        row = getattr(row, name)
+    return row
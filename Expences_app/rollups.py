@@ -0,0 +1,129 @@
+"""
+Incremental maintenance of the `MonthlyRollup` table.
+
+Every participation counts towards the rollup row of its user, the month its expense was
+created in and the expense's split method (see `MonthlyRollup` for the totals). Creating
+an expense adds its shares; settling a share moves it from `owed` to `settled` in the
+month of its expense, so a settled share never changes months. Reads over any date range
+then cost one row per month and split method, whatever the expense history.
+
+Like the functions of ledger.py, these must be called inside the transaction that writes
+the participant rows they describe.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Case, Count, DateField, F, Sum, Value, When
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .ledger import to_decimal
+from .models import MonthlyRollup, Participant
+
+FIELDS = ('spent', 'owed', 'settled', 'expenses')
+
+
+def month_of(created_at):
+    """The first day of the month of `created_at`, in the current time zone."""
+    return timezone.localdate(created_at).replace(day=1)
+
+
+def add_shares(rows):
+    """
+    Record the shares of new expenses.
+
+    `rows` is an iterable of (user_id, created_by_id, created_at, split_method, amount, status).
+    """
+    deltas = _deltas()
+    for user_id, created_by_id, created_at, split_method, amount, status in rows:
+        delta = deltas[(user_id, month_of(created_at), split_method)]
+        amount = to_decimal(amount)
+        delta['spent'] += amount
+        delta['expenses'] += 1
+        if user_id != created_by_id:
+            delta['owed' if status == "pending" else 'settled'] += amount
+    _apply(deltas)
+
+
+def settle_shares(rows):
+    """Move settled shares from owed to settled. `rows` is an iterable of (user_id, created_at, split_method, amount)."""
+    deltas = _deltas()
+    for user_id, created_at, split_method, amount in rows:
+        delta = deltas[(user_id, month_of(created_at), split_method)]
+        amount = to_decimal(amount)
+        delta['owed'] -= amount
+        delta['settled'] += amount
+    _apply(deltas)
+
+
+def _deltas():
+    return defaultdict(lambda: {'spent': Decimal('0.00'), 'owed': Decimal('0.00'), 'settled': Decimal('0.00'), 'expenses': 0})
+
+
+def _apply(deltas):
+    if not deltas:
+        return
+    users = {user_id for user_id, _, _ in deltas}
+    months = {month for _, month, _ in deltas}
+    existing = {
+        (rollup.user_id, rollup.month, rollup.split_method): rollup
+        for rollup in MonthlyRollup.objects.select_for_update().filter(user_id__in=users, month__in=months)
+    }
+    changed = []
+    created = []
+    for (user_id, month, split_method), delta in deltas.items():
+        rollup = existing.get((user_id, month, split_method))
+        if rollup is None:
+            created.append(MonthlyRollup(user_id=user_id, month=month, split_method=split_method, **delta))
+        else:
+            for field in FIELDS:
+                setattr(rollup, field, getattr(rollup, field) + delta[field])
+            changed.append(rollup)
+    if changed:
+        MonthlyRollup.objects.bulk_update(changed, FIELDS)
+    if created:
+        MonthlyRollup.objects.bulk_create(created)
+
+
+def compute_rollups():
+    """Recompute {(user_id, month, split_method): totals} from the `Participant` rows with one aggregate query."""
+    aggregates = (
+        Participant.objects
+        .annotate(
+            month=TruncMonth('expense__created_at', output_field=DateField()),
+            own=Case(When(user=F('expense__created_by'), then=Value(True)), default=Value(False)),
+        )
+        .values_list('user_id', 'month', 'expense__split_method', 'own', 'status')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+    rollups = _deltas()
+    for user_id, month, split_method, own, status, total, count in aggregates:
+        rollup = rollups[(user_id, month, split_method)]
+        rollup['spent'] += to_decimal(total)
+        rollup['expenses'] += count
+        if not own:
+            rollup['owed' if status == "pending" else 'settled'] += to_decimal(total)
+    return dict(rollups)
+
+
+def rebuild_rollups():
+    """Replace the whole `MonthlyRollup` table with the rollups recomputed from `Participant`."""
+    rollups = compute_rollups()
+    MonthlyRollup.objects.all().delete()
+    MonthlyRollup.objects.bulk_create(
+        [MonthlyRollup(user_id=user_id, month=month, split_method=split_method, **totals)
+         for (user_id, month, split_method), totals in rollups.items()],
+        batch_size=1000
+    )
+    return rollups
+
+
+def months_between(first, last):
+    """The first days of the months from `first` to `last`, both included."""
+    months = []
+    month = first
+    while month <= last:
+        months.append(month)
+        month = month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+    return months
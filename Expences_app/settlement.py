@@ -0,0 +1,72 @@
+"""
+Debt simplification: turn the pending balances of a set of users into a minimal settlement plan.
+
+Net balances come from the `Balance` ledger (the per-pair total of the pending
+`Participant` rows, see ledger.py), so the cost depends on the number of
+(debtor, creditor) pairs rather than on the participant history. The plan is
+built with the greedy min-cash-flow algorithm: the largest creditor is always
+paid by the largest debtor, which needs at most n - 1 transfers for n users
+with a non-zero balance.
+"""
+import heapq
+from collections import defaultdict
+
+from django.db.models import Q, Sum
+
+from .models import Balance
+
+
+def net_balances(user_ids=None):
+    """
+    Return {user_id: cents} for the pending debts between `user_ids` (all users when None).
+
+    A positive balance means the user is owed money, a negative one that the user owes money.
+    Only debts where both sides are in `user_ids` are counted.
+    """
+    balances = Balance.objects.filter(amount__gt=0)
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        balances = balances.filter(debtor_id__in=user_ids, creditor_id__in=user_ids)
+
+    net = defaultdict(int)
+    for creditor_id, total in balances.values_list('creditor_id').annotate(total=Sum('amount')).order_by():
+        net[creditor_id] += to_cents(total)
+    for debtor_id, total in balances.values_list('debtor_id').annotate(total=Sum('amount')).order_by():
+        net[debtor_id] -= to_cents(total)
+    return {user_id: cents for user_id, cents in net.items() if cents}
+
+
+def minimal_transfers(net):
+    """
+    Build the settlement plan for {user_id: cents} net balances that sum to zero.
+
+    Returns a list of (debtor_id, creditor_id, cents) transfers, largest first.
+    """
+    # heapq is a min-heap, so amounts are negated to pop the largest balance first.
+    # The counter keeps ties deterministic and avoids comparing user ids.
+    creditors = [(-cents, i, user_id) for i, (user_id, cents) in enumerate(net.items()) if cents > 0]
+    debtors = [(cents, i, user_id) for i, (user_id, cents) in enumerate(net.items()) if cents < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+
+    transfers = []
+    while creditors and debtors:
+        credit, credit_order, creditor_id = heapq.heappop(creditors)
+        debt, debt_order, debtor_id = heapq.heappop(debtors)
+        amount = min(-credit, -debt)
+        transfers.append((debtor_id, creditor_id, amount))
+        if -credit > amount:
+            heapq.heappush(creditors, (credit + amount, credit_order, creditor_id))
+        if -debt > amount:
+            heapq.heappush(debtors, (debt + amount, debt_order, debtor_id))
+    return transfers
+
+
+def counterparties(user_id):
+    """Ids of the users `user_id` has a pending balance with, in either direction."""
+    pairs = Balance.objects.filter(Q(debtor_id=user_id) | Q(creditor_id=user_id), amount__gt=0).values_list('debtor_id', 'creditor_id')
+    return {other for pair in pairs for other in pair if other != user_id}
+
+
+def to_cents(amount):
+    return int(round(amount * 100))
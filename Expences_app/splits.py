@@ -0,0 +1,159 @@
+"""
+Split engine: the shares of an expense in integer minor units (cents).
+
+Amounts are converted to cents and percentages to basis points (1/100 of a percent) once, at
+the edge, and every share is computed with integer arithmetic, so the shares of an expense
+always add up to its amount exactly. The cents an even division leaves over are handed out
+deterministically, one each, instead of being lost to rounding (100.00 split three ways is
+33.34 + 33.33 + 33.33, not 3 x 33.33):
+
+- equal: the first participants in the given order get the extra cents;
+- percentage: largest remainder method, the participants whose exact share lost the most
+  to truncation get the extra cents (ties go to the earlier participant).
+
+The engine knows nothing about users or the ORM. A split is described by a
+(method, total, values) request: `values` is the number of participants for an equal split,
+the amounts in cents for an exact split and the percentages in basis points for a percentage
+split. `split_many` computes the shares of a whole batch of requests, e.g. an import chunk.
+"""
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+EQUAL = 'equal'
+EXACT = 'exact'
+PERCENTAGE = 'percentage'
+
+HUNDRED_PERCENT = 10000  # in basis points
+
+CENT = Decimal('0.01')
+
+
+class SplitError(ValueError):
+    """Raised when a split is invalid; the message is meant for the API client."""
+
+
+def to_cents(value):
+    """Convert an amount (str, int, float or Decimal) to integer cents, rounding half up."""
+    return _to_hundredths(value, "amount")
+
+
+def to_basis_points(value):
+    """Convert a percentage (str, int, float or Decimal) to integer basis points, rounding half up."""
+    return _to_hundredths(value, "percentage")
+
+
+def _to_hundredths(value, name):
+    try:
+        value = Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+    except (InvalidOperation, ValueError):
+        raise SplitError(f"Invalid {name}: {value!r}.")
+    if not value.is_finite():
+        raise SplitError(f"Invalid {name}: {value!r}.")
+    return int(value * 100)
+
+
+def from_cents(cents):
+    """Convert integer cents (or basis points) back to a 2 decimal places Decimal."""
+    return Decimal(cents).scaleb(-2)
+
+
+def percentage_of(share, total):
+    """The percentage, rounded to 2 decimal places, that `share` cents are of `total` cents."""
+    return (Decimal(share * 100) / total).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def split_equal(total, count):
+    """Split `total` cents into `count` shares differing by at most one cent, larger shares first."""
+    if count < 1:
+        raise SplitError("An equal split needs at least one participant.")
+    base, extra = divmod(total, count)
+    return [base + 1] * extra + [base] * (count - extra)
+
+
+def split_exact(total, amounts):
+    """Check that the exact `amounts` in cents add up to `total` cents and return them as the shares."""
+    amounts = list(amounts)
+    if sum(amounts) != total:
+        raise SplitError("The total of exact amounts does not match the expense amount.")
+    return amounts
+
+
+def split_percentage(total, basis_points):
+    """Split `total` cents by percentages in basis points that must add up to 100%."""
+    basis_points = list(basis_points)
+    if sum(basis_points) != HUNDRED_PERCENT:
+        raise SplitError("The total percentages must add up to 100%.")
+
+    products = [total * points for points in basis_points]
+    shares = [product // HUNDRED_PERCENT for product in products]
+
+    # Truncating lost less than one cent per share; give those cents to the largest remainders
+    # (the sort is stable, so ties go to the earlier participant)
+    leftover = total - sum(shares)
+    if leftover:
+        remainders = [product % HUNDRED_PERCENT for product in products]
+        for i in sorted(range(len(shares)), key=remainders.__getitem__, reverse=True)[:leftover]:
+            shares[i] += 1
+    return shares
+
+
+def split(method, total, values):
+    """Compute the shares, in cents, of one (method, total, values) request."""
+    _check(method, total, values)
+    if method == EQUAL:
+        return split_equal(total, values)
+    if method == EXACT:
+        return split_exact(total, values)
+    return split_percentage(total, values)
+
+
+def _check(method, total, values):
+    if total <= 0:
+        raise SplitError("The expense amount must be positive.")
+    if method not in (EQUAL, EXACT, PERCENTAGE):
+        raise SplitError("Invalid split method.")
+    if method != EQUAL and values and min(values) < 0:
+        raise SplitError("Shares must not be negative.")
+
+
+def split_many(requests):
+    """
+    Compute the shares of a batch of (method, total, values) requests.
+
+    Returns one entry per request, in order: the list of shares, or the `SplitError` that
+    rejected the request, so one invalid split does not fail the batch.
+
+    The requests are grouped by method and each group is computed in one pass: one divmod
+    over the totals and participant counts of the equal splits, one sum per exact split, and
+    the largest remainder method, which depends on each request's own remainders, per
+    percentage split.
+    """
+    requests = list(requests)
+    results = [None] * len(requests)
+    by_method = {EQUAL: [], EXACT: [], PERCENTAGE: []}
+    for i, (method, total, values) in enumerate(requests):
+        try:
+            _check(method, total, values)
+            if method == EQUAL and values < 1:
+                raise SplitError("An equal split needs at least one participant.")
+        except SplitError as e:
+            results[i] = e
+        else:
+            by_method[method].append(i)
+
+    equal = by_method[EQUAL]
+    counts = [requests[i][2] for i in equal]
+    for i, count, (base, extra) in zip(equal, counts, map(divmod, (requests[i][1] for i in equal), counts)):
+        results[i] = [base + 1] * extra + [base] * (count - extra)
+
+    for i in by_method[EXACT]:
+        _, total, amounts = requests[i]
+        amounts = list(amounts)
+        results[i] = amounts if sum(amounts) == total else SplitError("The total of exact amounts does not match the expense amount.")
+
+    for i in by_method[PERCENTAGE]:
+        _, total, basis_points = requests[i]
+        try:
+            results[i] = split_percentage(total, basis_points)
+        except SplitError as e:
+            results[i] = e
+    return results
@@ -0,0 +1,119 @@
+"""Test helpers shared by the test suites of the project."""
+import copy
+import os
+import tempfile
+
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from split_up import routers
+
+
+class _AssertQueryBudgetContext(CaptureQueriesContext):
+    def __init__(self, test_case, budget, connection):
+        self.test_case = test_case
+        self.budget = budget
+        super().__init__(connection)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return
+        executed = len(self)
+        self.test_case.assertLessEqual(
+            executed, self.budget,
+            "%d queries executed, the budget is %d\nCaptured queries were:\n%s" % (
+                executed,
+                self.budget,
+                "\n".join("%d. %s" % (i, query["sql"]) for i, query in enumerate(self.captured_queries, start=1)),
+            ),
+        )
+
+
+class QueryBudgetMixin:
+    """
+    Adds `assertQueryBudget` to a TestCase.
+
+    Unlike `assertNumQueries`, the budget is an upper bound. Call the same endpoint with a small
+    and a large data set under one budget to catch N+1 regressions: a constant budget only
+    holds if the number of queries does not grow with the number of rows.
+    """
+
+    def assertQueryBudget(self, budget, using=DEFAULT_DB_ALIAS):
+        return _AssertQueryBudgetContext(self, budget, connections[using])
+
+
+class ReplicaMixin:
+    """
+    Gives a TransactionTestCase a read replica: a SQLite file registered as the `replica` database
+    and listed in DATABASE_REPLICAS, so the ledger read endpoints read from it.
+
+    Nothing replicates by itself: the replica only changes when the test calls `replicate()`,
+    which copies the committed primary into it, so a test controls exactly how far the replica
+    lags. (A TestCase would not do: its writes are never committed.)
+    """
+
+    replica = 'replica'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._replica_dir = tempfile.TemporaryDirectory()
+        replica = copy.deepcopy(connections.settings[DEFAULT_DB_ALIAS])
+        replica['NAME'] = os.path.join(cls._replica_dir.name, 'replica.sqlite3')
+        # Added after setUpClass and connected in setUp, so the replica is not blocked as a database
+        # the test case did not declare
+        connections.settings[cls.replica] = replica
+        cls._replica_settings = override_settings(DATABASE_REPLICAS=[cls.replica])
+        cls._replica_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._replica_settings.disable()
+        connections[cls.replica].close()
+        del connections[cls.replica]
+        del connections.settings[cls.replica]
+        cls._replica_dir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        connections[self.replica].connect()  # TransactionTestCase closes every connection after a test
+        caches['default'].clear()  # forget the pins of the previous test
+
+    def replicate(self):
+        routers.replicate(self.replica)
+
+    def unpin(self):
+        """Expire the pins of every user, as if `REPLICA_PIN_SECONDS` had passed."""
+        caches['default'].clear()
+
+    def assertReadsFrom(self, alias):
+        """Assert that the block runs queries on `alias` and not on the other database."""
+        other = DEFAULT_DB_ALIAS if alias == self.replica else self.replica
+        return _AssertReadsFromContext(self, connections[alias], connections[other])
+
+
+class _AssertReadsFromContext:
+    def __init__(self, test_case, expected, other):
+        self.test_case = test_case
+        self.expected = CaptureQueriesContext(expected)
+        self.other = CaptureQueriesContext(other)
+
+    def __enter__(self):
+        self.expected.__enter__()
+        self.other.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.other.__exit__(exc_type, exc_value, traceback)
+        self.expected.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return
+        self.test_case.assertGreater(len(self.expected), 0, f"No query ran on {self.expected.connection.alias!r}")
+        self.test_case.assertEqual(
+            [query['sql'] for query in self.other.captured_queries], [],
+            f"Queries ran on {self.other.connection.alias!r}",
+        )
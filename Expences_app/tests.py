@@ -1,3 +1,1992 @@
-from django.test import TestCase
-
-# Create your tests here.
+import base64
+import csv
+import gzip
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import uuid
+import warnings
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connection
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework.throttling import BaseThrottle
+from rest_framework_simplejwt.tokens import AccessToken
+
+from Users_app.authentication import CachedJWTAuthentication
+from split_up import metrics, profiling, renderers
+
+from . import exports, ledger, rollups, settlement, splits, urls, views
+from .models import Balance, Expense, ExportJob, GroupMember, MonthlyRollup, Participant
+from .testing import QueryBudgetMixin, ReplicaMixin
+
+User = get_user_model()
+
+
+def authenticate(client, user):
+    """
+    Authenticate every request of `client` as `user` with a Bearer token, like a real client.
+
+    The user is cached like after the client's first request, so the query counts are the views' own.
+    """
+    token = AccessToken.for_user(user)
+    CachedJWTAuthentication().get_user(token)
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+
+async def read_stream(response):
+    """The whole content of the async streaming `response`, read as an ASGI server would."""
+    return b''.join([chunk async for chunk in response.streaming_content])
+
+
+def make_user(name):
+    return User.objects.create(email=f'{name}@example.com', name=name, mobile_number='0000000000', password='!')
+
+
+class BalanceSheetDownloadTests(TestCase):
+    url = '/expense/balance-sheet/download/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('owner')
+        cls.friend = make_user('friend')
+
+    def setUp(self):
+        self.client = APIClient()
+        authenticate(self.client, self.user)
+
+    def add_expenses(self, count):
+        """Add `count` expenses: even ones shared with the user, odd ones created by the user only."""
+        expenses = [
+            Expense(description=f'expense {i}', amount=10, split_method='exact', created_by_id=(self.user if i % 2 else self.friend).pk)
+            for i in range(count)
+        ]
+        Expense.objects.bulk_create(expenses, batch_size=5000)
+        Participant.objects.bulk_create([
+            Participant(user_id=self.user.pk, expense_id=expense.pk, amount=4, created_at=expense.created_at)
+            for expense in expenses[::2]
+        ], batch_size=5000)
+
+    def download(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_rows(self):
+        self.add_expenses(2)
+        rows = list(csv.reader(io.StringIO(self.download())))
+
+        self.assertEqual(rows[0], ['Expense ID', 'Description', 'Amount', 'Split Method', 'Created By', 'Created At', 'Your Share', 'Status'])
+        shared, created = sorted(rows[1:], key=lambda row: row[1])
+        self.assertEqual((shared[1], shared[4], shared[6], shared[7]), ('expense 0', 'friend', '4.00', 'pending'))
+        self.assertEqual((created[1], created[4], created[6], created[7]), ('expense 1', 'owner', 'N/A', 'N/A'))
+
+    def test_query_count_does_not_grow_with_history(self):
+        total = 0
+        for count in (10, 1000, 100000):
+            with self.subTest(expenses=count):
+                self.add_expenses(count - total)
+                total = count
+                with self.assertNumQueries(1):
+                    content = self.download()
+                self.assertEqual(content.count('\n'), count + 1)
+
+
+# The URL names of Expences_app/urls.py whose view is tested under another name
+TESTED_AS = {
+    'get_user_name': 'get_user',
+    'create_expence': 'create_expense',
+    'users_expence_view': 'users_expense',
+    'users_owe_list': 'owe_list',
+    'balance-sheet-export-download': 'balance_sheet_export',
+}
+
+
+def assertEveryViewIsTested(test_case):
+    """Fail unless `test_case` has a `test_<name>` method for the view of every URL of Expences_app/urls.py."""
+    names = {TESTED_AS.get(pattern.name, pattern.name).replace('-', '_') for pattern in urls.urlpatterns}
+    untested = sorted(name for name in names if not hasattr(test_case, f'test_{name}'))
+    test_case.assertEqual(untested, [], f'{type(test_case).__name__} has no test for these views')
+
+
+class QueryPlanTests(TestCase):
+    """Run EXPLAIN QUERY PLAN on every query the views emit and fail on full table scans."""
+
+    # "SCAN <table>" without "USING ... INDEX" is a full table scan (older SQLite prints "SCAN TABLE <table>")
+    full_scan = re.compile(r'^SCAN (TABLE )?(?P<table>\S+)( AS \S+)?$')
+    # A page sorted after the rows are read rather than read in the order of an index
+    temp_sort = re.compile(r'^USE TEMP B-TREE FOR (.+ OF )?ORDER BY$')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('owner')
+        cls.friends = [make_user(f'friend{i}') for i in range(3)]
+
+    def setUp(self):
+        self.client = APIClient()
+        authenticate(self.client, self.user)
+        participants_data = {str(friend.id): 0 for friend in self.friends}
+        for i in range(3):
+            response = self.client.post('/expense/create_expense/', {
+                'description': f'expense {i}', 'amount': 40, 'split_method': 'equal',
+                'participants_data': participants_data, 'self': True,
+            }, format='json')
+            self.assertEqual(response.status_code, 201)
+        friend = APIClient()
+        authenticate(friend, self.friends[0])
+        friend.post('/expense/create_expense/', {
+            'description': 'from a friend', 'amount': 20, 'split_method': 'exact',
+            'participants_data': {str(self.user.id): 10}, 'self_amount': 10,
+        }, format='json')
+        self.expenses = list(Expense.objects.filter(created_by=self.user))
+
+    def assertNoFullScan(self, method, url, data=None, ordered=False):
+        """With `ordered`, the paginated queries must also read their rows in index order."""
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, data, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, response)
+
+        scans = []
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                for row in cursor.fetchall():
+                    if self.full_scan.match(row[-1]) or (ordered and self.temp_sort.match(row[-1])):
+                        scans.append(f'{row[-1]}\n    {sql}')
+        self.assertFalse(scans, f'{method.upper()} {url} falls back to a full table scan or sort:\n' + '\n'.join(scans))
+
+    def test_get_user(self):
+        self.assertNoFullScan('get', f'/expense/get_user/{self.friends[0].email}/')
+
+    def test_create_expense(self):
+        self.assertNoFullScan('post', '/expense/create_expense/', {
+            'description': 'dinner', 'amount': 30, 'split_method': 'percentage',
+            'participants_data': {str(self.friends[0].id): 50}, 'self_percentage': 50,
+        })
+
+    def test_import_expenses(self):
+        self.assertNoFullScan('post', '/expense/import_expenses/', [{
+            'description': 'dinner', 'amount': 30, 'split_method': 'exact',
+            'participants_data': {str(self.friends[1].id): 20}, 'self_amount': 10,
+        }])
+
+    def test_users_expense(self):
+        self.assertNoFullScan('get', '/expense/users_expense/', ordered=True)
+        self.assertNoFullScan('get', '/expense/users_expense/', {'limit': 1}, ordered=True)
+        cursor = self.client.get('/expense/users_expense/', {'limit': 1}).json()['next']
+        self.assertNoFullScan('get', '/expense/users_expense/', {'limit': 1, 'cursor': cursor}, ordered=True)
+
+    def test_owe_list(self):
+        self.assertNoFullScan('get', '/expense/owe_list/')
+
+    def test_settlement_plan(self):
+        self.assertNoFullScan('get', '/expense/settlement_plan/')
+
+    def test_settle_expense_for_users(self):
+        self.assertNoFullScan('post', f'/expense/settle_expense/{self.expenses[0].pk}/', {
+            'user_ids': [str(self.friends[0].id), str(self.friends[1].id)],
+        })
+
+    def test_settle_expense(self):
+        self.assertNoFullScan('post', f'/expense/settle_expense/{self.expenses[1].pk}/', {})
+
+    def test_settle_with_user(self):
+        self.assertNoFullScan('post', f'/expense/settle_with_user/{self.friends[0].id}/')
+
+    def test_balance_sheet(self):
+        self.assertNoFullScan('get', '/expense/balance_sheet/', ordered=True)
+        cursor = self.client.get('/expense/balance_sheet/', {'limit': 1}).json()['next']
+        self.assertNoFullScan('get', '/expense/balance_sheet/', {'limit': 1, 'cursor': cursor}, ordered=True)
+
+    def test_balance_sheet_download(self):
+        self.assertNoFullScan('get', '/expense/balance-sheet/download/')
+
+    def test_balance_sheet_exports(self):
+        with self.export_root():
+            self.assertNoFullScan('post', '/expense/balance-sheet/exports/')
+
+    def test_balance_sheet_export(self):
+        with self.export_root():
+            job_id = self.finished_export()
+            self.assertNoFullScan('get', f'/expense/balance-sheet/exports/{job_id}/')
+            self.assertNoFullScan('get', f'/expense/balance-sheet/exports/{job_id}/download/')
+
+    def test_groups(self):
+        self.assertNoFullScan('post', '/expense/groups/', {'name': 'flat', 'member_ids': [str(friend.id) for friend in self.friends]})
+
+    def test_group_members(self):
+        group_id = self.client.post('/expense/groups/', {'name': 'trip'}, format='json').json()['group_id']
+        self.assertNoFullScan('post', f'/expense/groups/{group_id}/members/', {'member_ids': [str(self.friends[0].id)]})
+
+    def test_group_summary(self):
+        group_id = self.client.post('/expense/groups/', {'name': 'trip', 'member_ids': [str(self.friends[0].id)]}, format='json').json()['group_id']
+        self.client.post('/expense/create_expense/', {
+            'description': 'fuel', 'amount': 20, 'split_method': 'equal',
+            'participants_data': {str(self.friends[0].id): 0}, 'self': True, 'group_id': group_id,
+        }, format='json')
+        self.assertNoFullScan('get', f'/expense/groups/{group_id}/summary/')
+
+    def test_analytics(self):
+        self.assertNoFullScan('get', '/expense/analytics/')
+
+    def test_cache_stats(self):
+        self.user.is_staff = True
+        self.user.save(update_fields=['is_staff'])
+        self.assertNoFullScan('get', '/expense/cache_stats/')
+
+    def export_root(self):
+        return override_settings(EXPORT_ROOT=self.enterContext(tempfile.TemporaryDirectory()))
+
+    def finished_export(self):
+        job = ExportJob.objects.create(user=self.user)
+        exports.run(job.pk)
+        return job.pk
+
+    def test_every_view_is_checked(self):
+        assertEveryViewIsTested(self)
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Every view must run a constant number of queries, whatever the size of the user's history."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('owner')
+        cls.friends = [make_user(f'friend{i}') for i in range(5)]
+
+    def setUp(self):
+        self.client = APIClient()
+        authenticate(self.client, self.user)
+
+    def add_history(self, count):
+        """Add `count` expenses created by the user and `count` created by each friend, all shared."""
+        participants_data = {str(friend.id): 0 for friend in self.friends}
+        for i in range(count):
+            response = self.client.post('/expense/create_expense/', {
+                'description': f'expense {i}', 'amount': 60, 'split_method': 'equal',
+                'participants_data': participants_data, 'self': True,
+            }, format='json')
+            self.assertEqual(response.status_code, 201)
+        for friend in self.friends:
+            client = APIClient()
+            authenticate(client, friend)
+            for i in range(count):
+                client.post('/expense/create_expense/', {
+                    'description': f'from {friend.name} {i}', 'amount': 20, 'split_method': 'exact',
+                    'participants_data': {str(self.user.id): 10}, 'self_amount': 10,
+                }, format='json')
+
+    def pending_expense(self):
+        return Expense.objects.filter(created_by=self.user, participants__status='pending').distinct().first()
+
+    def assertBudgetHolds(self, budget, method, url, data=None, prepare=None):
+        """
+        Call the endpoint with a small and with a large history under the same query budget.
+
+        `url` may be a callable, called for each call, and `prepare` one called before it, outside of the budget.
+        """
+        for count in (1, 20):
+            with self.subTest(history=count):
+                self.add_history(count)
+                if prepare is not None:
+                    prepare(count)
+                target = url() if callable(url) else url
+                with self.assertQueryBudget(budget):
+                    response = getattr(self.client, method)(target, data, format='json')
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                self.assertLess(response.status_code, 400, response)
+
+    def test_get_user(self):
+        self.assertBudgetHolds(1, 'get', f'/expense/get_user/{self.friends[0].email}/')
+
+    def test_create_expense(self):
+        self.assertBudgetHolds(9, 'post', '/expense/create_expense/', {
+            'description': 'dinner', 'amount': 60, 'split_method': 'equal',
+            'participants_data': {str(friend.id): 0 for friend in self.friends}, 'self': True,
+        })
+
+    def test_import_expenses(self):
+        self.assertBudgetHolds(9, 'post', '/expense/import_expenses/', [{
+            'description': f'dinner {i}', 'amount': 60, 'split_method': 'equal',
+            'participants_data': {str(friend.id): 0 for friend in self.friends}, 'self': True,
+        } for i in range(10)])
+
+    def test_users_expense(self):
+        self.assertBudgetHolds(3, 'get', '/expense/users_expense/')
+
+    def test_owe_list(self):
+        self.assertBudgetHolds(2, 'get', '/expense/owe_list/')
+
+    def test_settlement_plan(self):
+        self.assertBudgetHolds(4, 'get', '/expense/settlement_plan/')
+
+    def test_settle_expense_for_users(self):
+        self.assertBudgetHolds(9, 'post', lambda: f'/expense/settle_expense/{self.pending_expense().pk}/', {
+            'user_ids': [str(friend.id) for friend in self.friends],
+        })
+
+    def test_settle_with_user(self):
+        self.assertBudgetHolds(9, 'post', f'/expense/settle_with_user/{self.friends[0].id}/')
+
+    def test_settle_expense(self):
+        self.assertBudgetHolds(9, 'post', lambda: f'/expense/settle_expense/{self.pending_expense().pk}/', {})
+
+    def test_balance_sheet(self):
+        self.assertBudgetHolds(1, 'get', '/expense/balance_sheet/')
+
+    def test_balance_sheet_download(self):
+        self.assertBudgetHolds(1, 'get', '/expense/balance-sheet/download/')
+
+    def test_balance_sheet_exports(self):
+        # One unfinished export per user: forget the previous one
+        self.assertBudgetHolds(4, 'post', '/expense/balance-sheet/exports/', prepare=lambda count: ExportJob.objects.all().delete())
+
+    def test_balance_sheet_export(self):
+        self.enterContext(override_settings(EXPORT_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        self.assertBudgetHolds(1, 'get', lambda: f'/expense/balance-sheet/exports/{self.finished_export()}/')
+        self.assertBudgetHolds(1, 'get', lambda: f'/expense/balance-sheet/exports/{self.finished_export()}/download/')
+
+    def test_groups(self):
+        self.assertBudgetHolds(5, 'post', '/expense/groups/', {'name': 'flat', 'member_ids': [str(friend.id) for friend in self.friends]})
+
+    def test_group_members(self):
+        self.assertBudgetHolds(6, 'post', lambda: f'/expense/groups/{self.make_group()}/members/', {
+            'member_ids': [str(friend.id) for friend in self.friends],
+        })
+
+    def test_group_summary(self):
+        group_id = self.make_group(self.friends)
+        self.assertBudgetHolds(1, 'get', f'/expense/groups/{group_id}/summary/', prepare=lambda count: self.add_group_history(group_id, count))
+
+    def test_analytics(self):
+        self.assertBudgetHolds(1, 'get', '/expense/analytics/')
+
+    def test_cache_stats(self):
+        self.user.is_staff = True
+        self.user.save(update_fields=['is_staff'])
+        self.assertBudgetHolds(0, 'get', '/expense/cache_stats/')
+
+    def test_every_view_has_a_budget(self):
+        assertEveryViewIsTested(self)
+
+    def finished_export(self):
+        job = ExportJob.objects.create(user=self.user)
+        exports.run(job.pk)
+        return job.pk
+
+    def make_group(self, members=()):
+        response = self.client.post('/expense/groups/', {'name': 'flat', 'member_ids': [str(member.id) for member in members]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['group_id']
+
+    def add_group_history(self, group_id, count):
+        for i in range(count):
+            response = self.client.post('/expense/create_expense/', {
+                'description': f'groceries {i}', 'amount': 60, 'split_method': 'equal',
+                'participants_data': {str(friend.id): 0 for friend in self.friends}, 'self': True, 'group_id': group_id,
+            }, format='json')
+            self.assertEqual(response.status_code, 201)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('owner')
+        cls.friend = make_user('friend')
+        expenses = Expense.objects.bulk_create([
+            Expense(description=f'expense {i}', amount=10, split_method='exact', created_by=cls.friend if i < 7 else cls.user)
+            for i in range(10)
+        ])
+        # Most expenses share a timestamp: only the expense id breaks the ties
+        tie = timezone.now()
+        for expense in expenses[1:9]:
+            expense.created_at = tie
+        expenses[9].created_at = tie + timedelta(seconds=1)
+        Expense.objects.bulk_update(expenses, ['created_at'])
+        Participant.objects.bulk_create(
+            [Participant(user=cls.user, expense=expense, amount=4, created_at=expense.created_at) for expense in expenses[:7]]
+            + [Participant(user=cls.friend, expense=expense, amount=4, created_at=expense.created_at) for expense in expenses[7:]]
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        authenticate(self.client, self.user)
+
+    def walk(self, url, limit):
+        """The pages of `url`, following `next` until it is null."""
+        pages = [self.client.get(url, {'limit': limit}).json()]
+        while pages[-1]['next'] is not None:
+            pages.append(self.client.get(url, {'limit': limit, 'cursor': pages[-1]['next']}).json())
+            self.assertLess(len(pages), 20)
+        return pages
+
+    def test_every_row_once(self):
+        expected = sorted(
+            Expense.objects.filter(participants__user=self.user).order_by().values_list('created_at', 'expense_id')
+        )
+        for limit in (1, 2, 3, 7, 100):
+            with self.subTest(limit=limit):
+                pages = self.walk('/expense/balance_sheet/', limit)
+                seen = [record['expense_id'] for page in pages for record in page['individual_expenses']]
+                self.assertEqual(seen, [str(expense_id) for _, expense_id in expected])
+                self.assertEqual(len(pages), -(-7 // limit))
+                self.assertTrue(all(len(page['individual_expenses']) == limit for page in pages[:-1]))
+
+    def test_lists_paginate_independently(self):
+        # 7 expenses the user owes, 3 the user is owed: the shorter list is exhausted first
+        pages = self.walk('/expense/users_expense/', 2)
+        self.assertEqual([(len(page['i_owe']), len(page['others_owe_me'])) for page in pages], [(2, 2), (2, 1), (2, 0), (1, 0)])
+        descriptions = [record['description'] for page in pages for record in page['i_owe']]
+        self.assertEqual(len(set(descriptions)), 7)
+
+    def test_next_is_null_on_the_last_page(self):
+        self.assertIsNone(self.client.get('/expense/balance_sheet/', {'limit': 7}).json()['next'])
+        self.assertIsNone(self.client.get('/expense/balance_sheet/', {'limit': 8}).json()['next'])
+        self.assertIsNotNone(self.client.get('/expense/balance_sheet/', {'limit': 6}).json()['next'])
+
+    def test_invalid_cursor(self):
+        cursor = self.client.get('/expense/balance_sheet/', {'limit': 2}).json()['next']
+        positions = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+
+        def encode(data):
+            return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+        for tampered in (
+            cursor[:len(cursor) // 2],
+            cursor[::-1],
+            'not a cursor',
+            encode(['a', 'list']),
+            encode({'individual_expenses': ['yesterday', positions['individual_expenses'][1]]}),
+            encode({'individual_expenses': [positions['individual_expenses'][0], 'not-a-uuid']}),
+            encode({'individual_expenses': [positions['individual_expenses'][0]]}),
+        ):
+            for url in ('/expense/balance_sheet/', '/expense/users_expense/'):
+                with self.subTest(url=url, cursor=tampered):
+                    response = self.client.get(url, {'cursor': tampered})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.json(), {'error': 'Invalid cursor.'})
+
+    def test_limit(self):
+        for limit in ('0', '-1', 'ten', '1.5'):
+            for url in ('/expense/balance_sheet/', '/expense/users_expense/'):
+                with self.subTest(url=url, limit=limit):
+                    response = self.client.get(url, {'limit': limit})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.json(), {'error': 'limit must be a positive integer.'})
+        with override_settings(EXPENSE_MAX_PAGE_SIZE=3):
+            page = self.client.get('/expense/balance_sheet/', {'limit': 1000}).json()
+        self.assertEqual(len(page['individual_expenses']), 3)
+        self.assertIsNotNone(page['next'])
+
+
+class LedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('owner')
+        cls.friend = make_user('friend')
+        cls.other = make_user('other')
+
+    def client_for(self, user):
+        client = APIClient()
+        authenticate(client, user)
+        return client
+
+    def create_expense(self, creator, shares):
+        response = self.client_for(creator).post('/expense/create_expense/', {
+            'description': 'dinner', 'amount': sum(shares.values()), 'split_method': 'exact',
+            'participants_data': {str(user.id): amount for user, amount in shares.items()}, 'self_amount': 0,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return str(Expense.objects.filter(created_by=creator).latest('created_at').pk)
+
+    def balances(self):
+        return {(debtor_id, creditor_id): amount for debtor_id, creditor_id, amount in Balance.objects.values_list('debtor_id', 'creditor_id', 'amount')}
+
+    def check(self):
+        out = io.StringIO()
+        call_command('rebuild_balances', '--check', stdout=out)
+        return out.getvalue()
+
+    def test_balances_follow_the_participants(self):
+        first = self.create_expense(self.user, {self.friend: Decimal('10.50'), self.other: 7})
+        self.create_expense(self.friend, {self.user: 3, self.other: Decimal('0.25')})
+        self.create_expense(self.other, {self.user: 2})
+        self.assertEqual(self.balances(), ledger.compute_balances())
+        self.assertEqual(self.balances(), {
+            (self.friend.id, self.user.id): Decimal('7.50'),
+            (self.other.id, self.user.id): Decimal('5.00'),
+            (self.other.id, self.friend.id): Decimal('0.25'),
+        })
+
+        self.client_for(self.user).post(f'/expense/settle_expense/{first}/', {'user_ids': [str(self.friend.id)]}, format='json')
+        self.assertEqual(self.balances(), ledger.compute_balances())
+        self.assertEqual(self.balances()[(self.user.id, self.friend.id)], Decimal('3.00'))
+
+        self.client_for(self.friend).post(f'/expense/settle_with_user/{self.user.id}/')
+        self.client_for(self.user).post(f'/expense/settle_expense/{first}/', format='json')
+        self.assertEqual(self.balances(), ledger.compute_balances())
+        self.assertEqual(self.balances(), {
+            (self.user.id, self.other.id): Decimal('2.00'),
+            (self.other.id, self.friend.id): Decimal('0.25'),
+        })
+
+    def test_opposite_debts_net_out(self):
+        self.create_expense(self.user, {self.friend: 10})
+        self.create_expense(self.friend, {self.user: 4})
+        self.assertEqual(self.balances(), {(self.friend.id, self.user.id): Decimal('6.00')})
+
+        self.create_expense(self.friend, {self.user: 6})
+        self.assertEqual(self.balances(), {})
+        self.assertEqual(ledger.compute_balances(), {})
+
+        self.create_expense(self.friend, {self.user: Decimal('0.01')})
+        self.assertEqual(self.balances(), {(self.user.id, self.friend.id): Decimal('0.01')})
+        self.assertEqual(self.client_for(self.user).get('/expense/owe_list/').json(), {
+            'people_i_owe': [{'name': 'friend', 'total_owe': 0.01}], 'people_owe_me': [],
+        })
+
+    def test_debts_in_one_call(self):
+        ledger.add_debts([(self.user.id, self.friend.id, 10), (self.friend.id, self.user.id, '2.5'), (self.user.id, self.friend.id, 0.1)])
+        self.assertEqual(self.balances(), {(self.user.id, self.friend.id): Decimal('7.60')})
+        ledger.settle_debts([(self.user.id, self.friend.id, '7.6'), (self.user.id, self.user.id, 5)])
+        self.assertEqual(self.balances(), {})
+
+    def test_check_reports_drift(self):
+        self.create_expense(self.user, {self.friend: 10})
+        self.assertIn('Ledger is in sync (1 balances, 0 group net balances).', self.check())
+
+        Balance.objects.update(amount=Decimal('1.00'))
+        Balance.objects.create(debtor=self.user, creditor=self.other, amount=3)
+        out = io.StringIO()
+        with self.assertRaisesMessage(CommandError, '2 balance(s) and 0 group net balance(s) out of sync'):
+            call_command('rebuild_balances', '--check', stdout=out)
+        self.assertEqual(sorted(out.getvalue().splitlines()), sorted([
+            f'{self.friend.id} -> {self.user.id}: ledger 1.00, expected 10.00',
+            f'{self.user.id} -> {self.other.id}: ledger 3.00, expected None',
+        ]))
+
+        Balance.objects.all().delete()
+        with self.assertRaisesMessage(CommandError, '1 balance(s)'):
+            self.check()
+
+        call_command('rebuild_balances', stdout=io.StringIO())
+        self.assertEqual(self.balances(), {(self.friend.id, self.user.id): Decimal('10.00')})
+        self.assertIn('Ledger is in sync', self.check())
+
+
+class LedgerCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('owner')
+        cls.friend = make_user('friend')
+        cls.outsider = make_user('outsider')
+
+    def setUp(self):
+        self.client = APIClient()
+        authenticate(self.client, self.user)
+
+    def client_for(self, user):
+        client = APIClient()
+        authenticate(client, user)
+        return client
+
+    def create_expense(self, client, participant):
+        response = client.post('/expense/create_expense/', {
+            'description': 'dinner', 'amount': 20, 'split_method': 'exact',
+            'participants_data': {str(participant.id): 10}, 'self_amount': 10,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_repeated_reads_are_served_from_the_cache(self):
+        self.create_expense(self.client, self.friend)
+        for url in ('/expense/users_expense/', '/expense/owe_list/', '/expense/balance_sheet/'):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertEqual(first['X-Cache'], 'MISS')
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+                self.assertEqual(second['X-Cache'], 'HIT')
+                self.assertEqual(second.content, first.content)
+
+    def test_query_string_is_part_of_the_key(self):
+        self.client.get('/expense/balance_sheet/')
+        self.assertEqual(self.client.get('/expense/balance_sheet/', {'limit': 1})['X-Cache'], 'MISS')
+
+    def test_writes_invalidate_only_the_users_involved(self):
+        friend = self.client_for(self.friend)
+        outsider = self.client_for(self.outsider)
+        for client in (self.client, friend, outsider):
+            client.get('/expense/owe_list/')
+
+        self.create_expense(self.client, self.friend)
+
+        self.assertEqual(self.client.get('/expense/owe_list/')['X-Cache'], 'MISS')
+        response = friend.get('/expense/owe_list/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual([row['name'] for row in response.json()['people_i_owe']], ['owner'])
+        self.assertEqual(outsider.get('/expense/owe_list/')['X-Cache'], 'HIT')
+
+    def test_settle_invalidates(self):
+        self.create_expense(self.client, self.friend)
+        expense = Expense.objects.get(created_by=self.user)
+        friend = self.client_for(self.friend)
+        self.assertEqual(len(friend.get('/expense/owe_list/').json()['people_i_owe']), 1)
+
+        self.client.post(f'/expense/settle_expense/{expense.pk}/', {}, format='json')
+
+        response = friend.get('/expense/owe_list/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['people_i_owe'], [])
+
+    def test_stats_require_staff(self):
+        self.assertEqual(self.client.get('/expense/cache_stats/').status_code, 403)
+        admin = User.objects.create(email='admin@example.com', name='admin', mobile_number='0', password='!', is_staff=True)
+        response = self.client_for(admin).get('/expense/cache_stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {'hits', 'misses', 'not_modified', 'hit_rate'})
+
+
+class ConditionalGetTests(TestCase):
+    urls = ('/expense/users_expense/', '/expense/owe_list/', '/expense/balance_sheet/')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('owner')
+        cls.friend = make_user('friend')
+
+    def setUp(self):
+        self.client = APIClient()
+        authenticate(self.client, self.user)
+        self.create_expense()
+
+    def create_expense(self):
+        response = self.client.post('/expense/create_expense/', {
+            'description': 'dinner', 'amount': 20, 'split_method': 'exact',
+            'participants_data': {str(self.friend.id): 10}, 'self_amount': 10,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_matching_etag_is_answered_with_304_without_queries(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                tag = self.client.get(url)['ETag']
+                self.assertTrue(tag.startswith('"'))
+                with self.assertNumQueries(0):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=tag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['ETag'], tag)
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=f'W/{tag}').status_code, 304)
+
+    def test_304_is_only_sent_to_authenticated_users(self):
+        tag = self.client.get('/expense/balance_sheet/')['ETag']
+        response = APIClient().get('/expense/balance_sheet/', HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 401)
+
+    def test_etag_changes_with_the_ledger_and_the_query(self):
+        tag = self.client.get('/expense/balance_sheet/')['ETag']
+        self.assertNotEqual(self.client.get('/expense/balance_sheet/', {'limit': 1})['ETag'], tag)
+        self.assertEqual(self.client.get('/expense/balance_sheet/', HTTP_IF_NONE_MATCH='"stale", ' + tag).status_code, 304)
+
+        self.create_expense()
+
+        response = self.client.get('/expense/balance_sheet/', HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], tag)
+        self.assertEqual(len(response.json()['individual_expenses']), 2)
+
+
+class SettleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('owner')
+        cls.friends = [make_user(f'friend{i}') for i in range(3)]
+
+    def setUp(self):
+        self.client = APIClient()
+        authenticate(self.client, self.user)
+
+    def create_expense(self, client, participants, amount=10):
+        response = client.post('/expense/create_expense/', {
+            'description': 'dinner', 'amount': amount * (len(participants) + 1), 'split_method': 'exact',
+            'participants_data': {str(user.id): amount for user in participants}, 'self_amount': amount,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return str(Expense.objects.filter(description='dinner').latest('created_at').pk)
+
+    def balance(self, debtor, creditor):
+        return Balance.objects.filter(debtor=debtor, creditor=creditor).values_list('amount', flat=True).first()
+
+    def test_settle_listed_users(self):
+        expense_id = self.create_expense(self.client, self.friends)
+        first, second, third = self.friends
+
+        response = self.client.post(f'/expense/settle_expense/{expense_id}/', {
+            'user_ids': [str(second.id), 'not-a-uuid', str(first.id), str(self.user.id)],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'message': 'Expense settled for users: friend1, friend0.',
+            'not_settled': f"Some users could not be settled: ['not-a-uuid', '{self.user.id}']",
+        })
+        statuses = dict(Participant.objects.filter(expense_id=expense_id).values_list('user_id', 'status'))
+        self.assertEqual(statuses, {self.user.id: 'settled', first.id: 'settled', second.id: 'settled', third.id: 'pending'})
+        self.assertEqual((self.balance(first, self.user), self.balance(third, self.user)), (None, 10))
+
+        response = self.client.post(f'/expense/settle_expense/{expense_id}/', {'user_ids': [str(first.id)]}, format='json')
+        self.assertEqual(response.json()['message'], 'No participants were settled.')
+
+    def test_settle_with_user(self):
+        friend, other = self.friends[:2]
+        friend_client = APIClient()
+        authenticate(friend_client, friend)
+        settled = [self.create_expense(self.client, [friend, other]) for _ in range(3)]
+        owed_to_friend = self.create_expense(friend_client, [self.user])
+
+        response = self.client.post(f'/expense/settle_with_user/{friend.id}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['message'], 'Settled 3 expenses with friend0.')
+        self.assertEqual(response.json()['amount'], '30.00')
+        self.assertEqual(sorted(response.json()['expense_ids']), sorted(settled))
+        self.assertFalse(Participant.objects.filter(user=friend, status='pending').exists())
+        self.assertEqual(Participant.objects.filter(user=other, status='pending').count(), 3)
+        self.assertEqual(Participant.objects.get(expense_id=owed_to_friend, user=self.user).status, 'pending')
+        self.assertEqual((self.balance(friend, self.user), self.balance(self.user, friend)), (None, 10))
+
+        self.assertEqual(self.client.post(f'/expense/settle_with_user/{friend.id}/').status_code, 400)
+
+    def test_settle_with_unknown_user(self):
+        response = self.client.post('/expense/settle_with_user/00000000-0000-0000-0000-000000000000/')
+        self.assertEqual(response.status_code, 404)
+
+
+class SettlementPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('owner')
+        cls.friends = [make_user(f'friend{i}') for i in range(3)]
+
+    def setUp(self):
+        self.client = APIClient()
+        authenticate(self.client, self.user)
+
+    def client_for(self, user):
+        client = APIClient()
+        authenticate(client, user)
+        return client
+
+    def owes(self, debtor, creditor, amount):
+        response = self.client_for(creditor).post('/expense/create_expense/', {
+            'description': 'dinner', 'amount': amount, 'split_method': 'exact',
+            'participants_data': {str(debtor.id): amount}, 'self_amount': 0,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def plan(self, *users):
+        response = self.client.get('/expense/settlement_plan/', {'user_ids': ','.join(str(user.id) for user in users)})
+        self.assertEqual(response.status_code, 200)
+        return [(transfer['from_name'], transfer['to_name'], round(transfer['amount'] * 100)) for transfer in response.json()['transfers']]
+
+    def assertSettles(self, net, transfers):
+        """`transfers` pay every user's net balance to the cent, with at most n - 1 transfers."""
+        paid = {user_id: 0 for user_id in net}
+        for debtor_id, creditor_id, cents in transfers:
+            self.assertGreater(cents, 0)
+            paid[debtor_id] -= cents
+            paid[creditor_id] += cents
+        self.assertEqual(paid, net)
+        self.assertLessEqual(len(transfers), max(len([cents for cents in net.values() if cents]) - 1, 0))
+
+    def test_cycles_collapse(self):
+        first, second, _ = self.friends
+        # owner -> friend0 -> friend1 -> owner: nothing left to pay
+        self.owes(self.user, first, 10)
+        self.owes(first, second, 10)
+        self.owes(second, self.user, 10)
+        self.assertEqual(self.plan(first, second), [])
+
+        # owner -> friend0 -> friend1 15, friend1 -> owner 10: friend0 is out, owner pays friend1 the rest
+        self.owes(self.user, first, 5)
+        self.owes(first, second, 5)
+        self.assertEqual(self.plan(first, second), [('owner', 'friend1', 500)])
+
+    def test_chain_is_one_transfer(self):
+        first, second, _ = self.friends
+        self.owes(self.user, first, 10)
+        self.owes(first, second, 10)
+        self.assertEqual(self.plan(first, second), [('owner', 'friend1', 1000)])
+
+    def test_uneven_split_settles_to_the_cent(self):
+        # 100 split three ways is 33.34 + 33.33 + 33.33
+        for creditor in (self.user, *self.friends[:2]):
+            debtors = [user for user in (self.user, *self.friends) if user != creditor]
+            response = self.client_for(creditor).post('/expense/create_expense/', {
+                'description': 'dinner', 'amount': 100, 'split_method': 'equal',
+                'participants_data': {str(user.id): 0 for user in debtors[:2]}, 'self': True,
+            }, format='json')
+            self.assertEqual(response.status_code, 201)
+
+        net = settlement.net_balances([self.user.id, *(friend.id for friend in self.friends)])
+        self.assertEqual(sum(net.values()), 0)
+        self.assertSettles(net, settlement.minimal_transfers(net))
+
+        names = {user.name: user.id for user in (self.user, *self.friends)}
+        transfers = [(names[debtor], names[creditor], cents) for debtor, creditor, cents in self.plan(*self.friends)]
+        self.assertSettles(net, transfers)
+
+    def test_minimal_transfers(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            users = range(rng.randint(1, 12))
+            net = {user: rng.randint(-10000, 10000) for user in users}
+            if net:
+                net[0] -= sum(net.values())
+            with self.subTest(net=net):
+                self.assertSettles(net, settlement.minimal_transfers(net))
+
+    def test_invalid_user_ids(self):
+        response = self.client.get('/expense/settlement_plan/', {'user_ids': f'{self.friends[0].id},not-a-uuid'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'user_ids must be a comma separated list of user IDs.'})
+
+
+class AsgiReadViewTests(TestCase):
+    """The async read views give the same answers through the ASGI handler as through WSGI."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('owner')
+        cls.friend = make_user('friend')
+        client = APIClient()
+        authenticate(client, cls.user)
+        for amount in (20, 30):
+            client.post('/expense/create_expense/', {
+                'description': 'dinner', 'amount': amount, 'split_method': 'equal',
+                'participants_data': {str(cls.friend.id): 0}, 'self': True,
+            }, format='json')
+
+    async def test_read_endpoints(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.friend)}'}
+        wsgi = APIClient()
+        wsgi.credentials(HTTP_AUTHORIZATION=headers['Authorization'])
+        for url in ('/expense/users_expense/', '/expense/owe_list/', '/expense/balance_sheet/', f'/expense/get_user/{self.user.email}/'):
+            with self.subTest(url=url):
+                response = await self.async_client.get(url, headers=headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), (await sync_to_async(wsgi.get)(url)).json())
+
+        data = (await self.async_client.get('/expense/owe_list/', headers=headers)).json()
+        self.assertEqual(data['people_i_owe'], [{'name': 'owner', 'total_owe': 25.0}])
+
+    async def test_authentication_is_required(self):
+        response = await self.async_client.get('/expense/owe_list/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+        response = await self.async_client.get('/expense/owe_list/', headers={'Authorization': 'Bearer nope'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'token_not_valid')
+
+    async def test_permissions_and_throttles_are_drfs(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.friend)}'}
+        with mock.patch.object(views.OweView, 'permission_classes', [IsAdminUser]):
+            response = await self.async_client.get('/expense/owe_list/', headers=headers)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json(), {'detail': 'You do not have permission to perform this action.'})
+
+        class Closed(BaseThrottle):
+            def allow_request(self, request, view):
+                return False
+
+            def wait(self):
+                return 30
+
+        with mock.patch.object(views.OweView, 'throttle_classes', [Closed]):
+            response = await self.async_client.get('/expense/owe_list/', headers=headers)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+
+class SplitEngineTests(TestCase):
+    """Properties of the split engine checked on seeded random splits."""
+
+    runs = 500
+
+    def random_splits(self, seed):
+        rng = random.Random(seed)
+        for _ in range(self.runs):
+            total = rng.choice([1, 2, 99, 100, 10000, rng.randint(1, 10 ** 9)])
+            count = rng.choice([1, 2, 3, 7, rng.randint(1, 500)])
+            yield rng, total, count
+
+    def random_basis_points(self, rng, count):
+        cuts = sorted(rng.randint(0, splits.HUNDRED_PERCENT) for _ in range(count - 1))
+        return [b - a for a, b in zip([0, *cuts], [*cuts, splits.HUNDRED_PERCENT])]
+
+    def test_equal(self):
+        for rng, total, count in self.random_splits(1):
+            shares = splits.split('equal', total, count)
+            self.assertEqual(sum(shares), total)
+            self.assertEqual(len(shares), count)
+            self.assertLessEqual(max(shares) - min(shares), 1)
+            self.assertEqual(shares, sorted(shares, reverse=True))
+
+    def test_percentage(self):
+        for rng, total, count in self.random_splits(2):
+            points = self.random_basis_points(rng, count)
+            shares = splits.split('percentage', total, points)
+            self.assertEqual(sum(shares), total)
+            for share, point in zip(shares, points):
+                # every share is its exact value rounded down or up to a cent
+                self.assertLess(abs(share * splits.HUNDRED_PERCENT - total * point), splits.HUNDRED_PERCENT)
+            self.assertEqual(shares, splits.split('percentage', total, points))
+
+    def test_exact(self):
+        for rng, total, count in self.random_splits(3):
+            amounts = self.random_basis_points(rng, count)
+            amounts = [amount * total // splits.HUNDRED_PERCENT for amount in amounts]
+            amounts[0] += total - sum(amounts)
+            self.assertEqual(splits.split('exact', total, amounts), amounts)
+            with self.assertRaisesMessage(splits.SplitError, 'does not match'):
+                splits.split('exact', total + 1, amounts)
+
+    def test_remainders(self):
+        self.assertEqual(splits.split('equal', 10000, 3), [3334, 3333, 3333])
+        self.assertEqual(splits.split('percentage', 100, [3333, 3333, 3334]), [33, 33, 34])
+        self.assertEqual(splits.split('percentage', 200, [3333, 3333, 3334]), [67, 66, 67])
+
+    def test_conversions(self):
+        self.assertEqual(splits.to_cents('10.005'), 1001)
+        self.assertEqual(splits.to_cents(0.1 + 0.2), 30)
+        self.assertEqual(splits.to_basis_points(33.33), 3333)
+        self.assertEqual(splits.from_cents(3334), Decimal('33.34'))
+        for value in (None, 'abc', 'nan', float('inf')):
+            with self.assertRaises(splits.SplitError):
+                splits.to_cents(value)
+
+    def test_invalid_requests(self):
+        for request, message in (
+            (('equal', 100, 0), 'at least one participant'),
+            (('equal', 0, 2), 'must be positive'),
+            (('percentage', 100, [5000, 4000]), '100%'),
+            (('exact', 100, [150, -50]), 'must not be negative'),
+            (('shares', 100, [1]), 'Invalid split method'),
+        ):
+            with self.subTest(request=request), self.assertRaisesMessage(splits.SplitError, message):
+                splits.split(*request)
+
+    def test_split_many(self):
+        results = splits.split_many([('equal', 100, 3), ('exact', 100, [60, 30]), ('percentage', 100, [10000])])
+        self.assertEqual(results[0], [34, 33, 33])
+        self.assertIsInstance(results[1], splits.SplitError)
+        self.assertEqual(results[2], [100])
+
+    def test_split_many_matches_split(self):
+        rng = random.Random(7)
+        requests = [('equal', 0, 2), ('equal', 100, 0), ('shares', 100, [1]), ('exact', 100, [150, -50])]
+        for _ in range(300):
+            method, total, count = rng.choice(['equal', 'exact', 'percentage']), rng.randint(1, 100000), rng.randint(1, 8)
+            values = count if method == 'equal' else [rng.randint(0, 10000) for _ in range(count)]
+            if method == 'exact' and rng.random() < 0.8:
+                values[-1] = total - sum(values[:-1])
+            elif method == 'percentage' and rng.random() < 0.8:
+                values = splits.split_equal(10000, count)
+            requests.append((method, total, values))
+
+        for request, result in zip(requests, splits.split_many(requests), strict=True):
+            with self.subTest(request=request):
+                try:
+                    expected = splits.split(*request)
+                except splits.SplitError as e:
+                    self.assertIsInstance(result, splits.SplitError)
+                    self.assertEqual(str(result), str(e))
+                else:
+                    self.assertEqual(result, expected)
+
+
+class CreateExpenseSplitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('owner')
+        cls.friends = [make_user(f'friend{i}') for i in range(2)]
+
+    def setUp(self):
+        self.client = APIClient()
+        authenticate(self.client, self.user)
+
+    def test_equal_split_keeps_every_cent(self):
+        response = self.client.post('/expense/create_expense/', {
+            'description': 'dinner', 'amount': 100, 'split_method': 'equal',
+            'participants_data': {str(friend.id): 0 for friend in self.friends}, 'self': True,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        rows = {user_id: (amount, status) for user_id, amount, status in Participant.objects.values_list('user_id', 'amount', 'status')}
+        self.assertEqual(rows, {
+            self.user.id: (Decimal('33.34'), 'settled'),
+            self.friends[0].id: (Decimal('33.33'), 'pending'),
+            self.friends[1].id: (Decimal('33.33'), 'pending'),
+        })
+        self.assertEqual(sum(amount for amount, _ in rows.values()), Decimal('100'))
+
+    def test_invalid_split_is_rejected(self):
+        response = self.client.post('/expense/create_expense/', {
+            'description': 'dinner', 'amount': 100, 'split_method': 'percentage',
+            'participants_data': {str(self.friends[0].id): 50}, 'self_percentage': 40,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'The total percentages must add up to 100%.'})
+        self.assertFalse(Expense.objects.exists())
+
+    def test_unknown_participant_leaves_no_expense(self):
+        for participant_id, status_code in ((str(uuid.uuid4()), 404), ('not-a-uuid', 400)):
+            response = self.client.post('/expense/create_expense/', {
+                'description': 'dinner', 'amount': 30, 'split_method': 'exact',
+                'participants_data': {str(self.friends[0].id): 10, participant_id: 10}, 'self_amount': 10,
+            }, format='json')
+            self.assertEqual(response.status_code, status_code)
+            if status_code == 404:
+                self.assertEqual(response.json(), {'error': 'One or more participants not found.'})
+            self.assertFalse(Expense.objects.exists())
+            self.assertFalse(Participant.objects.exists())
+            self.assertFalse(Balance.objects.exists())
+
+    def test_exact_total_is_checked_before_writing(self):
+        response = self.client.post('/expense/create_expense/', {
+            'description': 'dinner', 'amount': 30, 'split_method': 'exact',
+            'participants_data': {str(friend.id): 10 for friend in self.friends}, 'self_amount': 5,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Expense.objects.exists())
+
+    def test_expense_participants_and_ledger_are_written_atomically(self):
+        data = {
+            'description': 'dinner', 'amount': 30, 'split_method': 'equal',
+            'participants_data': {str(friend.id): 0 for friend in self.friends}, 'self': True,
+        }
+        # The last write of the transaction fails: the expense, its participants and the ledger rows roll back
+        with mock.patch.object(rollups, 'add_shares', side_effect=DatabaseError('disk I/O error')):
+            response = self.client.post('/expense/create_expense/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'disk I/O error'})
+        self.assertFalse(Expense.objects.exists())
+        self.assertFalse(Participant.objects.exists())
+        self.assertFalse(Balance.objects.exists())
+        self.assertFalse(MonthlyRollup.objects.exists())
+
+        self.assertEqual(self.client.post('/expense/create_expense/', data, format='json').status_code, 201)
+        self.assertEqual(Participant.objects.count(), 3)
+        self.assertEqual(ledger.compute_balances(), {
+            (friend.id, self.user.id): Decimal('10.00') for friend in self.friends
+        })
+        self.assertEqual(Balance.objects.count(), 2)
+
+
+class ImportExpensesTests(TestCase):
+    url = '/expense/import_expenses/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('owner')
+        cls.friend = make_user('friend')
+
+    def setUp(self):
+        self.client = APIClient()
+        authenticate(self.client, self.user)
+
+    def expense(self, client_id, amount=20, **fields):
+        return {
+            'client_id': client_id, 'description': 'lunch', 'amount': amount, 'split_method': 'equal',
+            'participants_data': {str(self.friend.id): 0}, 'self': True, **fields,
+        }
+
+    def owed(self):
+        return Balance.objects.filter(debtor=self.friend, creditor=self.user).values_list('amount', flat=True).first()
+
+    def test_json_array(self):
+        response = self.client.post(self.url, [self.expense('a'), self.expense('b', amount=30)], format='json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['created'], data['failed']), (2, 0))
+        self.assertEqual([(result['index'], result['client_id'], result['status']) for result in data['results']], [(0, 'a', 'created'), (1, 'b', 'created')])
+        self.assertEqual(
+            sorted(str(pk) for pk in Expense.objects.values_list('pk', flat=True)),
+            sorted(result['expense_id'] for result in data['results'])
+        )
+        self.assertEqual(self.owed(), Decimal('25'))
+
+    def test_ndjson(self):
+        body = '\n'.join([json.dumps(self.expense('a')), '', '{"client_id": "b", "amount": ', json.dumps(self.expense('c'))]) + '\n'
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        # Blank lines are skipped; an invalid line fails on its own
+        self.assertEqual([(result['index'], result['status']) for result in results], [(0, 'created'), (1, 'failed'), (2, 'created')])
+        self.assertTrue(results[1]['error'].startswith('Invalid JSON: '))
+        self.assertEqual(Expense.objects.count(), 2)
+
+    def test_invalid_items_are_reported_next_to_the_valid_ones(self):
+        response = self.client.post(self.url, [
+            self.expense('valid'),
+            self.expense('unknown', participants_data={str(uuid.uuid4()): 0}),
+            self.expense('split', split_method='percentage', participants_data={str(self.friend.id): 50}, self_percentage=40),
+            self.expense('missing', description=''),
+            'not an object',
+            self.expense('also valid'),
+        ], format='json', QUERY_STRING='chunk_size=4')
+        data = response.json()
+        self.assertEqual((data['created'], data['failed']), (2, 4))
+        self.assertEqual([(result.get('client_id'), result['status'], result.get('error')) for result in data['results']], [
+            ('valid', 'created', None),
+            ('unknown', 'failed', 'One or more participants not found.'),
+            ('split', 'failed', 'The total percentages must add up to 100%.'),
+            ('missing', 'failed', 'Missing required fields.'),
+            (None, 'failed', 'Each expense must be a JSON object.'),
+            ('also valid', 'created', None),
+        ])
+        self.assertEqual(Expense.objects.count(), 2)
+        self.assertEqual(self.owed(), Decimal('20'))
+
+    def test_invalid_requests(self):
+        for chunk_size in ('0', '-1', 'ten'):
+            with self.subTest(chunk_size=chunk_size):
+                response = self.client.post(f'{self.url}?chunk_size={chunk_size}', [self.expense('a')], format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'error': 'chunk_size must be a positive integer.'})
+        response = self.client.post(self.url, self.expense('a'), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Expected a JSON array of expenses.'})
+        self.assertFalse(Expense.objects.exists())
+
+    def test_failed_chunk_writes_nothing(self):
+        add_debts = ledger.add_debts
+        calls = []
+
+        def fail_first_chunk(debts):
+            calls.append(debts)
+            if len(calls) == 1:
+                raise DatabaseError('database is locked')
+            return add_debts(debts)
+
+        with mock.patch.object(ledger, 'add_debts', side_effect=fail_first_chunk):
+            response = self.client.post(f'{self.url}?chunk_size=2', [
+                self.expense('a'), self.expense('b', description=''), self.expense('c'),
+            ], format='json')
+        self.assertEqual([(result['status'], result.get('error')) for result in response.json()['results']], [
+            ('failed', 'database is locked'), ('failed', 'Missing required fields.'), ('created', None),
+        ])
+        self.assertNotIn('expense_id', response.json()['results'][0])
+        # The first chunk was rolled back as a whole: only the expense of the second one is left
+        self.assertEqual(list(Expense.objects.values_list('pk', flat=True)), [uuid.UUID(response.json()['results'][2]['expense_id'])])
+        self.assertEqual(Participant.objects.count(), 2)
+        self.assertEqual(self.owed(), Decimal('10'))
+
+
+class SQLiteProfileTests(TestCase):
+    """The connection pragmas of split_up/settings.py are applied to every new connection."""
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+        self.assertEqual(self.pragma('temp_store'), 2)  # MEMORY
+        # the test database lives in memory, where WAL does not apply
+        self.assertIn(self.pragma('journal_mode'), ('wal', 'memory'))
+
+    def test_write_transactions_begin_immediate(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+class ReplicaRoutingTests(ReplicaMixin, TransactionTestCase):
+    read_urls = ('/expense/users_expense/', '/expense/owe_list/', '/expense/balance_sheet/', '/expense/balance-sheet/download/')
+
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('owner')
+        self.friend = make_user('friend')
+        self.client = APIClient()
+        authenticate(self.client, self.user)
+        self.friend_client = APIClient()
+        authenticate(self.friend_client, self.friend)
+
+    def create_expense(self):
+        response = self.client.post('/expense/create_expense/', {
+            'description': 'dinner', 'amount': 20, 'split_method': 'equal',
+            'participants_data': {str(self.friend.id): 0}, 'self': True,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_ledger_reads_use_the_replica(self):
+        self.create_expense()
+        self.replicate()
+        self.unpin()
+        for url in self.read_urls:
+            with self.subTest(url=url), self.assertReadsFrom(self.replica):
+                response = self.friend_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+
+    def test_replica_lags_until_replicated(self):
+        self.replicate()
+        self.create_expense()
+        self.unpin()
+        self.assertEqual(self.friend_client.get('/expense/owe_list/').json()['people_i_owe'], [])
+        self.assertNotIn(b'dinner', b''.join(self.friend_client.get('/expense/balance-sheet/download/').streaming_content))
+
+        call_command('sync_replicas', stdout=io.StringIO())
+        self.assertIn(b'dinner', b''.join(self.friend_client.get('/expense/balance-sheet/download/').streaming_content))
+
+    def test_users_read_their_own_writes_from_the_primary(self):
+        self.replicate()
+        self.create_expense()  # not replicated yet
+        for client in (self.client, self.friend_client):
+            with self.assertReadsFrom('default'):
+                response = client.get('/expense/users_expense/')
+            self.assertIn(b'dinner', response.content)
+
+    def test_writes_go_to_the_primary(self):
+        self.replicate()
+        self.unpin()
+        with self.assertReadsFrom('default'):
+            self.create_expense()
+        self.assertEqual(Expense.objects.using(self.replica).count(), 0)
+
+    def test_other_reads_use_the_primary(self):
+        self.replicate()
+        self.unpin()
+        with self.assertReadsFrom('default'):
+            self.client.get('/expense/settlement_plan/')
+
+
+class GroupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('owner')
+        cls.friends = [make_user(f'friend{i}') for i in range(3)]
+        cls.outsider = make_user('outsider')
+
+    def setUp(self):
+        self.client = APIClient()
+        authenticate(self.client, self.user)
+        response = self.client.post('/expense/groups/', {
+            'name': 'flat', 'member_ids': [str(friend.id) for friend in self.friends],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.group_id = response.json()['group_id']
+
+    def client_for(self, user):
+        client = APIClient()
+        authenticate(client, user)
+        return client
+
+    def create_expense(self, client, participants, amount=10, **extra):
+        response = client.post('/expense/create_expense/', {
+            'description': 'rent', 'amount': amount * (len(participants) + 1), 'split_method': 'exact',
+            'participants_data': {str(user.id): amount for user in participants}, 'self_amount': amount,
+            'group_id': self.group_id, **extra,
+        }, format='json')
+        return response
+
+    def net_balances(self):
+        return {
+            member['name']: member['net_balance']
+            for member in self.client.get(f'/expense/groups/{self.group_id}/summary/').json()['members']
+        }
+
+    def test_create_group(self):
+        members = set(GroupMember.objects.filter(group_id=self.group_id).values_list('user_id', flat=True))
+        self.assertEqual(members, {self.user.id, *(friend.id for friend in self.friends)})
+
+        response = self.client.post('/expense/groups/', {'name': 'trip', 'member_ids': [str(uuid.uuid4())]}, format='json')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post('/expense/groups/', {'name': 'trip', 'member_ids': 'everyone'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_expenses_update_the_net_balances(self):
+        first, second, third = self.friends
+        self.assertEqual(self.create_expense(self.client, [first, second]).status_code, 201)
+        self.assertEqual(self.create_expense(self.client_for(first), [self.user, third], amount=5).status_code, 201)
+        # an expense outside of the group does not count
+        self.assertEqual(self.create_expense(self.client, [first], group_id=None).status_code, 201)
+
+        self.assertEqual(self.net_balances(), {'owner': 15, 'friend0': 0, 'friend2': -5, 'friend1': -10})
+        response = self.client.get(f'/expense/groups/{self.group_id}/summary/').json()
+        self.assertEqual(response['name'], 'flat')
+        self.assertEqual([member['name'] for member in response['members']], ['owner', 'friend0', 'friend2', 'friend1'])
+
+    def test_settling_updates_the_net_balances(self):
+        first, second, third = self.friends
+        self.create_expense(self.client, [first, second])
+        expense_id = Expense.objects.get(group_id=self.group_id).pk
+        self.create_expense(self.client, [first, third], amount=5)
+
+        self.client.post(f'/expense/settle_expense/{expense_id}/', {'user_ids': [str(second.id)]}, format='json')
+        self.assertEqual(self.net_balances(), {'owner': 20, 'friend1': 0, 'friend2': -5, 'friend0': -15})
+
+        self.client.post(f'/expense/settle_with_user/{first.id}/')
+        self.assertEqual(self.net_balances(), {'owner': 5, 'friend0': 0, 'friend1': 0, 'friend2': -5})
+
+        self.client.post(f'/expense/settle_expense/{Expense.objects.latest("created_at").pk}/')
+        self.assertEqual(set(self.net_balances().values()), {0})
+
+    def test_members_only(self):
+        response = self.create_expense(self.client, [self.friends[0], self.outsider])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'All participants must be members of the group.'})
+
+        outsider = self.client_for(self.outsider)
+        self.assertEqual(self.create_expense(outsider, [self.user]).status_code, 404)
+        self.assertEqual(outsider.get(f'/expense/groups/{self.group_id}/summary/').status_code, 404)
+        self.assertEqual(self.create_expense(self.client, [self.friends[0]], group_id='not-a-group').status_code, 404)
+        self.assertFalse(Expense.objects.exists())
+
+        response = self.client.post(f'/expense/groups/{self.group_id}/members/', {'member_ids': [str(self.outsider.id)]}, format='json')
+        self.assertEqual(response.json(), {'message': 'Added 1 members.'})
+        self.assertEqual(self.create_expense(outsider, [self.user]).status_code, 201)
+
+    def test_import_into_a_group(self):
+        first, _, _ = self.friends
+        response = self.client.post('/expense/import_expenses/', [
+            {'description': 'rent', 'amount': 20, 'split_method': 'equal', 'participants_data': {str(first.id): 0}, 'self': True, 'group_id': self.group_id},
+            {'description': 'rent', 'amount': 20, 'split_method': 'equal', 'participants_data': {str(self.outsider.id): 0}, 'self': True, 'group_id': self.group_id},
+        ], format='json')
+        self.assertEqual([result['status'] for result in response.json()['results']], ['created', 'failed'])
+        self.assertEqual(self.net_balances(), {'owner': 10, 'friend1': 0, 'friend2': 0, 'friend0': -10})
+
+    def test_summary_is_one_query(self):
+        for _ in range(5):
+            self.create_expense(self.client, self.friends)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/expense/groups/{self.group_id}/summary/')
+        self.assertEqual(sum(member['net_balance'] for member in response.json()['members']), 0)
+
+    def test_rebuild_balances_restores_the_net_balances(self):
+        self.create_expense(self.client, self.friends)
+        call_command('rebuild_balances', '--check', stdout=io.StringIO())
+
+        GroupMember.objects.filter(user=self.user).update(net_balance=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_balances', '--check', stdout=io.StringIO())
+        call_command('rebuild_balances', stdout=io.StringIO())
+        self.assertEqual(self.net_balances()['owner'], 30)
+
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('owner')
+        cls.friends = [make_user(f'friend{i}') for i in range(2)]
+
+    def setUp(self):
+        self.client = APIClient()
+        authenticate(self.client, self.user)
+        self.this_month = f'{timezone.localdate():%Y-%m}'
+
+    def client_for(self, user):
+        client = APIClient()
+        authenticate(client, user)
+        return client
+
+    def create_expense(self, client, participants, amount=10, split_method='exact'):
+        response = client.post('/expense/create_expense/', {
+            'description': 'dinner', 'amount': amount * (len(participants) + 1), 'split_method': split_method,
+            'participants_data': {str(user.id): amount for user in participants}, 'self_amount': amount, 'self': True,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return str(Expense.objects.latest('created_at').pk)
+
+    def totals(self, client=None, **params):
+        response = (client or self.client).get('/expense/analytics/', {'from': self.this_month, 'to': self.this_month, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['totals']
+
+    def test_create_and_settle_update_the_rollups(self):
+        first, second = self.friends
+        expense_id = self.create_expense(self.client, [first, second])
+        self.create_expense(self.client_for(first), [self.user], amount=5, split_method='equal')
+
+        # the creator's own share is spent, not owed
+        self.assertEqual(self.totals(), {'spent': 15, 'owed': 5, 'settled': 0, 'expenses': 2})
+        self.assertEqual(self.totals(self.client_for(first)), {'spent': 15, 'owed': 10, 'settled': 0, 'expenses': 2})
+
+        self.client.post(f'/expense/settle_expense/{expense_id}/', {'user_ids': [str(second.id)]}, format='json')
+        self.assertEqual(self.totals(self.client_for(second)), {'spent': 10, 'owed': 0, 'settled': 10, 'expenses': 1})
+        self.client.post(f'/expense/settle_with_user/{first.id}/')
+        self.assertEqual(self.totals(self.client_for(first)), {'spent': 15, 'owed': 0, 'settled': 10, 'expenses': 2})
+
+        month = self.client.get('/expense/analytics/').json()['months'][-1]
+        self.assertEqual(month['month'], self.this_month)
+        self.assertEqual(month['by_split_method'], {
+            'exact': {'spent': 10, 'owed': 0, 'settled': 0, 'expenses': 1},
+            'equal': {'spent': 5, 'owed': 5, 'settled': 0, 'expenses': 1},
+        })
+
+    def test_import_updates_the_rollups(self):
+        first, _ = self.friends
+        self.client.post('/expense/import_expenses/', [
+            {'description': 'rent', 'amount': 20, 'split_method': 'equal', 'participants_data': {str(first.id): 0}, 'self': True}
+            for _ in range(3)
+        ], format='json')
+        self.assertEqual(self.totals(), {'spent': 30, 'owed': 0, 'settled': 0, 'expenses': 3})
+        self.assertEqual(self.totals(self.client_for(first)), {'spent': 30, 'owed': 30, 'settled': 0, 'expenses': 3})
+
+    def test_months_and_range(self):
+        self.create_expense(self.client, self.friends)
+        response = self.client.get('/expense/analytics/').json()
+        self.assertEqual(len(response['months']), 12)
+        self.assertEqual(response['to'], self.this_month)
+        self.assertEqual(response['months'][0], {'month': response['from'], 'spent': 0, 'owed': 0, 'settled': 0, 'expenses': 0, 'by_split_method': {}})
+        self.assertEqual(response['totals']['spent'], 10)
+
+        response = self.client.get('/expense/analytics/', {'from': '2019-11', 'to': '2020-02'}).json()
+        self.assertEqual([month['month'] for month in response['months']], ['2019-11', '2019-12', '2020-01', '2020-02'])
+        self.assertEqual(response['totals']['expenses'], 0)
+
+        for params in ({'from': '2020-13'}, {'to': 'today'}, {'from': '2020-02', 'to': '2020-01'}, {'from': '2000-01', 'to': '2020-01'}):
+            self.assertEqual(self.client.get('/expense/analytics/', params).status_code, 400)
+
+    def test_constant_queries(self):
+        self.create_expense(self.client, self.friends)
+        with self.assertNumQueries(1):
+            self.client.get('/expense/analytics/')
+        for _ in range(5):
+            self.create_expense(self.client, self.friends, split_method='equal')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/expense/analytics/').json()['totals']['expenses'], 6)
+
+    def test_backfill_rollups(self):
+        expense_id = self.create_expense(self.client, self.friends)
+        call_command('backfill_rollups', '--check', stdout=io.StringIO())
+
+        # rows written before the rollups existed
+        Expense.objects.filter(pk=expense_id).update(created_at=timezone.now().replace(year=2020, month=3, day=15))
+        with self.assertRaises(CommandError):
+            call_command('backfill_rollups', '--check', stdout=io.StringIO())
+        call_command('backfill_rollups', stdout=io.StringIO())
+        call_command('backfill_rollups', '--check', stdout=io.StringIO())
+
+        self.assertEqual(self.totals()['expenses'], 0)
+        self.assertEqual(self.totals(**{'from': '2020-03', 'to': '2020-03'}), {'spent': 10, 'owed': 0, 'settled': 0, 'expenses': 1})
+        self.assertEqual(MonthlyRollup.objects.count(), 3)
+
+
+@override_settings(EXPORT_WORKERS=0, EXPENSE_EXPORT_CHUNK_SIZE=3)
+class ExportJobTests(TestCase):
+    url = '/expense/balance-sheet/exports/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('owner')
+        cls.friend = make_user('friend')
+
+    def setUp(self):
+        self.client = APIClient()
+        authenticate(self.client, self.user)
+        export_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(EXPORT_ROOT=export_root))
+
+    def add_expenses(self, count):
+        expenses = [Expense(description=f'expense {i}', amount=10, split_method='exact', created_by_id=self.friend.pk) for i in range(count)]
+        Expense.objects.bulk_create(expenses)
+        Participant.objects.bulk_create([
+            Participant(user_id=self.user.pk, expense_id=expense.pk, amount=4, created_at=expense.created_at) for expense in expenses
+        ])
+
+    def start_export(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], 'queued')
+        return response.json()['job_id']
+
+    def test_export_is_written_in_the_background(self):
+        self.add_expenses(7)
+        job_id = self.start_export()
+
+        job = self.client.get(f'{self.url}{job_id}/').json()
+        self.assertEqual((job['status'], job['progress'], job['rows_written'], job['total_rows']), ('done', 100, 7, 7))
+        self.assertIsNotNone(job['duration_seconds'])
+
+        response = self.client.get(job['download_url'])
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="balance_sheet.csv"')
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content, self.client.get('/expense/balance-sheet/download/').getvalue().decode())
+        self.assertEqual(len(list(csv.reader(io.StringIO(content)))), 8)
+
+    def test_jobs_are_private(self):
+        job_id = self.start_export()
+        friend = APIClient()
+        authenticate(friend, self.friend)
+        self.assertEqual(friend.get(f'{self.url}{job_id}/').status_code, 404)
+        self.assertEqual(friend.get(f'{self.url}{job_id}/download/').status_code, 404)
+
+    def test_one_unfinished_job_per_user(self):
+        job = ExportJob.objects.create(user=self.user)
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['job_id'], str(job.job_id))
+        self.assertIsNone(response.json()['progress'])
+        self.assertEqual(self.client.get(f'{self.url}{job.job_id}/download/').status_code, 409)
+
+    def test_failed_job_records_the_error(self):
+        with override_settings(EXPORT_ROOT=__file__):  # not a directory
+            job_id = self.start_export()
+        job = self.client.get(f'{self.url}{job_id}/').json()
+        self.assertEqual(job['status'], 'failed')
+        self.assertTrue(job['error'])
+        self.assertIsNone(job['download_url'])
+
+    def test_database_errors_fail_the_job(self):
+        for target in ('balance_sheet_rows', 'file_path'):
+            with self.subTest(target), mock.patch.object(exports, target, side_effect=RuntimeError('database is locked')):
+                job_id = self.start_export()
+            job = ExportJob.objects.get(pk=job_id)
+            self.assertEqual((job.status, job.error, job.file_name), ('failed', 'database is locked', ''))
+            self.assertIsNotNone(job.finished_at)
+        self.assertEqual(os.listdir(settings.EXPORT_ROOT), [])
+
+    def test_failure_to_save_the_finished_job(self):
+        self.add_expenses(2)
+        with self.captureOnCommitCallbacks() as callbacks:
+            job_id = self.client.post(self.url).json()['job_id']
+        with mock.patch.object(ExportJob, 'save', side_effect=RuntimeError('database is locked')):
+            for callback in callbacks:
+                callback()
+        self.assertEqual(ExportJob.objects.get(pk=job_id).status, 'failed')
+        # The job no longer points at the file: it is not kept
+        self.assertEqual(os.listdir(settings.EXPORT_ROOT), [])
+
+    def test_purge_exports(self):
+        job_id = self.start_export()
+        lost = ExportJob.objects.create(user=self.friend, status='running')
+        path = exports.file_path(ExportJob.objects.get(pk=job_id))
+
+        call_command('purge_exports', stdout=io.StringIO())
+        self.assertEqual(ExportJob.objects.count(), 2)
+
+        with override_settings(EXPORT_RETENTION=timedelta(0)):
+            call_command('purge_exports', stdout=io.StringIO())
+        self.assertFalse(ExportJob.objects.filter(pk=job_id).exists())
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(ExportJob.objects.get(pk=lost.pk).status, 'failed')
+
+
+class ExportWorkerTests(TransactionTestCase):
+    def setUp(self):
+        self.user = make_user('owner')
+        self.client = APIClient()
+        authenticate(self.client, self.user)
+        export_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(EXPORT_ROOT=export_root))
+
+    def start_export(self):
+        job_id = self.client.post('/expense/balance-sheet/exports/').json()['job_id']
+        # Polling the job while the worker writes it could trip the in-memory test database's table locks
+        self.assertTrue(exports.wait_for_idle(timeout=10))
+        return job_id
+
+    def test_worker_thread_writes_the_file(self):
+        expense = Expense.objects.create(description='rent', amount=10, split_method='exact', created_by=self.user)
+        for workers in (1, 3):  # a new setting gets a new pool
+            with self.subTest(workers=workers), override_settings(EXPORT_WORKERS=workers):
+                job_id = self.start_export()
+                response = self.client.get(f'/expense/balance-sheet/exports/{job_id}/download/')
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(str(expense.pk), b''.join(response.streaming_content).decode())
+
+    def test_worker_records_unexpected_failures(self):
+        with override_settings(EXPORT_WORKERS=2), mock.patch.object(exports, 'run', side_effect=RuntimeError('database is locked')):
+            with self.assertLogs('Expences_app.exports', 'ERROR'):
+                job_id = self.start_export()
+        job = ExportJob.objects.get(pk=job_id)
+        self.assertEqual((job.status, job.error), ('failed', 'database is locked'))
+
+    def test_shutdown_fails_the_queued_jobs(self):
+        other = make_user('other')
+        client = APIClient()
+        authenticate(client, other)
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocked(job_id):
+            started.set()
+            release.wait(10)
+
+        with override_settings(EXPORT_WORKERS=1), mock.patch.object(exports, 'run', side_effect=blocked):
+            running = self.client.post('/expense/balance-sheet/exports/').json()['job_id']
+            self.assertTrue(started.wait(10))
+            queued = client.post('/expense/balance-sheet/exports/').json()['job_id']
+            threading.Timer(0.1, release.set).start()
+            exports.shutdown()
+        self.assertEqual(ExportJob.objects.get(pk=queued).status, 'failed')
+        # Not run: the mock stood in for it
+        self.assertEqual(ExportJob.objects.get(pk=running).status, 'queued')
+
+
+class NDJSONStreamingTests(TestCase):
+    """The list endpoints stream NDJSON, gzipped on request, with the records of their JSON pages."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('owner')
+        cls.friend = make_user('friend')
+        for user, other in ((cls.user, cls.friend), (cls.friend, cls.user)):
+            client = APIClient()
+            authenticate(client, user)
+            for amount in (20, 30, 40):
+                client.post('/expense/create_expense/', {
+                    'description': 'dinner', 'amount': amount, 'split_method': 'equal',
+                    'participants_data': {str(other.id): 0}, 'self': True,
+                }, format='json')
+
+    def setUp(self):
+        self.authorization = f'Bearer {AccessToken.for_user(self.user)}'
+
+    async def get(self, url, **headers):
+        response = await self.async_client.get(url, headers={'Authorization': self.authorization, **headers})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    async def stream(self, url, **headers):
+        response = await self.get(url, Accept='application/x-ndjson', **headers)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response.is_async)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return response, await read_stream(response)
+
+    def lines(self, content):
+        return [json.loads(line) for line in content.decode().splitlines()]
+
+    @override_settings(STREAM_CHUNK_SIZE=2)
+    async def test_balance_sheet(self):
+        response, content = await self.stream('/expense/balance_sheet/')
+        self.assertIn('Accept', response['Vary'])
+        records = self.lines(content)
+        page = (await self.get('/expense/balance_sheet/')).json()['individual_expenses']
+        self.assertEqual(len(records), 6)
+        self.assertEqual(records, page)
+
+        # a cursor resumes the stream
+        first = (await self.get('/expense/balance_sheet/?limit=4')).json()
+        _, content = await self.stream(f'/expense/balance_sheet/?cursor={first["next"]}')
+        self.assertEqual(self.lines(content), page[4:])
+
+    async def test_users_expense(self):
+        _, content = await self.stream('/expense/users_expense/')
+        records = self.lines(content)
+        page = (await self.get('/expense/users_expense/')).json()
+        self.assertEqual([record.pop('list') for record in records], ['i_owe'] * 3 + ['others_owe_me'] * 3)
+        self.assertEqual(records, page['i_owe'] + page['others_owe_me'])
+
+    async def test_gzip(self):
+        _, plain = await self.stream('/expense/balance_sheet/')
+        response, compressed = await self.stream('/expense/balance_sheet/', **{'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(compressed), plain)
+
+    async def test_negotiation_and_cache(self):
+        for accept in ('application/json', '*/*', 'application/x-ndjson;q=0.5, application/json'):
+            response = await self.get('/expense/balance_sheet/', Accept=accept)
+            self.assertFalse(response.streaming)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+        # the cached JSON page is not served to a streaming client, nor its ETag matched
+        response, _ = await self.stream('/expense/balance_sheet/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertNotEqual(response['ETag'], (await self.get('/expense/balance_sheet/'))['ETag'])
+        response, _ = await self.stream('/expense/balance_sheet/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    @override_settings(STREAM_CHUNK_SIZE=2)
+    def test_wsgi_reads_the_stream_chunk_by_chunk(self):
+        client = APIClient()
+        authenticate(client, self.user)
+        for url in ('/expense/balance_sheet/', '/expense/users_expense/'):
+            with self.subTest(url=url), warnings.catch_warnings():
+                _, content = async_to_sync(self.stream)(url)
+                # Django warns when it buffers a whole async stream for WSGI
+                warnings.simplefilter('error')
+                response = client.get(url, HTTP_ACCEPT='application/x-ndjson')
+                self.assertFalse(response.is_async)
+                chunks = iter(response)
+                first = next(chunks)
+                self.assertEqual(len(first.splitlines()), 2)
+                self.assertEqual(first + b''.join(chunks), content)
+
+
+class RendererTests(TestCase):
+    """The orjson fast path and the stdlib fallback encode exactly like DRF's JSONRenderer."""
+
+    data = {
+        'amount': Decimal('2400.00'),
+        'expense_id': uuid.UUID('eb663885-6a16-48cb-84ba-d2ecd9c6269d'),
+        'created_at': datetime(2024, 10, 22, 15, 1, 5, 483699, tzinfo=dt_timezone.utc),
+        'settled_at': datetime(2024, 10, 22, 15, 1, 5, tzinfo=dt_timezone.utc),
+        'names': ['Jürgen', None, 1.5],
+    }
+
+    def test_same_json_as_drf(self):
+        expected = JSONRenderer().render(self.data)
+        self.assertEqual(renderers.dumps(self.data), expected)
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(renderers.dumps(self.data), expected)
+        self.assertEqual(
+            json.loads(expected),
+            {'amount': 2400.0, 'expense_id': 'eb663885-6a16-48cb-84ba-d2ecd9c6269d', 'created_at': '2024-10-22T15:01:05.483699Z',
+             'settled_at': '2024-10-22T15:01:05Z', 'names': ['Jürgen', None, 1.5]},
+        )
+
+    def test_same_json_as_django(self):
+        expected = json.dumps(self.data, cls=DjangoJSONEncoder, separators=(',', ':'), ensure_ascii=False).encode()
+        self.assertEqual(renderers.django_dumps(self.data), expected)
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(renderers.django_dumps(self.data), expected)
+        self.assertEqual(
+            json.loads(expected),
+            {'amount': '2400.00', 'expense_id': 'eb663885-6a16-48cb-84ba-d2ecd9c6269d', 'created_at': '2024-10-22T15:01:05.483Z',
+             'settled_at': '2024-10-22T15:01:05Z', 'names': ['Jürgen', None, 1.5]},
+        )
+
+    def test_balance_sheet_format(self):
+        """balance_sheet/ keeps the format of the JsonResponse it used to be: amounts as strings, timestamps to the millisecond."""
+        user, friend = make_user('owner'), make_user('friend')
+        client = APIClient()
+        authenticate(client, friend)
+        client.post('/expense/create_expense/', {
+            'description': 'dinner', 'amount': '100.10', 'split_method': 'equal', 'participants_data': {str(user.id): 0}, 'self': True,
+        }, format='json')
+        expense = Expense.objects.get()
+        created_at = datetime(2024, 10, 22, 15, 1, 5, 483699, tzinfo=dt_timezone.utc)
+        Expense.objects.update(created_at=created_at)
+        Participant.objects.update(created_at=created_at)
+
+        authenticate(client, user)
+        self.assertEqual(client.get('/expense/balance_sheet/').json(), {
+            'individual_expenses': [{
+                'expense_id': str(expense.pk),
+                'description': 'dinner',
+                'user_share': '50.05',
+                'total_amount': '100.10',
+                'split_method': 'equal',
+                'created_by': 'friend',
+                'created_at': '2024-10-22T15:01:05.483Z',
+                'status': 'pending',
+            }],
+            'next': None,
+        })
+        response = async_to_sync(self.async_client.get)('/expense/balance_sheet/', headers={
+            'Authorization': f'Bearer {AccessToken.for_user(user)}', 'Accept': 'application/x-ndjson',
+        })
+        record = json.loads(async_to_sync(read_stream)(response))
+        self.assertEqual((record['user_share'], record['created_at']), ('50.05', '2024-10-22T15:01:05.483Z'))
+
+    def test_views_use_the_fast_renderer(self):
+        user = make_user('owner')
+        client = APIClient()
+        authenticate(client, user)
+        response = client.get('/expense/settlement_plan/')
+        self.assertIsInstance(response.accepted_renderer, renderers.FastJSONRenderer)
+        # DRF's indented output is still available on request
+        response = client.get('/expense/settlement_plan/', HTTP_ACCEPT='application/json; indent=2')
+        self.assertIn(b'\n  ', response.content)
+
+    def test_pages_are_built_from_projections(self):
+        user, friend = make_user('owner'), make_user('friend')
+        client = APIClient()
+        authenticate(client, friend)
+        client.post('/expense/create_expense/', {
+            'description': 'dinner', 'amount': 30, 'split_method': 'equal', 'participants_data': {str(user.id): 0}, 'self': True,
+        }, format='json')
+        authenticate(client, user)
+        with mock.patch.object(Participant, '__init__', side_effect=AssertionError("model instance created")), \
+                mock.patch.object(Expense, '__init__', side_effect=AssertionError("model instance created")):
+            page = client.get('/expense/balance_sheet/').json()['individual_expenses']
+            i_owe = client.get('/expense/users_expense/').json()['i_owe']
+        self.assertEqual((page[0]['user_share'], page[0]['total_amount'], page[0]['created_by']), ('15.00', '30.00', 'friend'))
+        self.assertEqual((i_owe[0]['amount'], i_owe[0]['created_by']), (15.0, 'friend@example.com'))
+
+
+class RequestMetricsTests(TestCase):
+    """Every request gets a Server-Timing header and is added to the histograms of its route at /metrics."""
+
+    def setUp(self):
+        metrics.reset()
+        self.user, self.friend = make_user('owner'), make_user('friend')
+        self.api = APIClient()
+        authenticate(self.api, self.user)
+
+    def server_timing(self, response):
+        """{name: {'dur': milliseconds, 'desc': description}} of the Server-Timing header."""
+        timing = {}
+        for entry in response['Server-Timing'].split(', '):
+            name, *params = entry.split(';')
+            params = dict(param.split('=', 1) for param in params)
+            timing[name] = {'dur': float(params['dur']), 'desc': params.get('desc', '').strip('"')}
+        return timing
+
+    def test_sync_view(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api.post('/expense/create_expense/', {
+                'description': 'dinner', 'amount': 30, 'split_method': 'equal', 'participants_data': {str(self.friend.id): 0}, 'self': True,
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        timing = self.server_timing(response)
+        self.assertEqual(timing['db']['desc'], f'{len(queries)} queries')
+        self.assertGreater(timing['serialize']['dur'], 0)
+        self.assertAlmostEqual(timing['total']['dur'], timing['view']['dur'] + timing['serialize']['dur'], delta=0.02)
+        self.assertLessEqual(timing['db']['dur'], timing['view']['dur'])
+
+    async def test_async_view(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        response = await self.async_client.get('/expense/owe_list/', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        # The queries run in the sync thread of the async view (the user lookup, the balances) are counted
+        timing = self.server_timing(response)
+        self.assertGreater(int(timing['db']['desc'].split()[0]), 0)
+        self.assertGreater(timing['db']['dur'], 0)
+
+    def test_metrics_endpoint(self):
+        for _ in range(2):
+            self.api.get(f'/expense/get_user/{self.friend.email}/')
+        self.api.get('/expense/get_user/nobody@example.com/')
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        content = response.content.decode()
+        # One series per URL pattern, whatever the ids in the paths
+        labels = 'method="GET",route="/expense/get_user/<str:email>/"'
+        self.assertIn(f'split_up_requests_total{{{labels},status="200"}} 2', content)
+        self.assertIn(f'split_up_requests_total{{{labels},status="404"}} 1', content)
+        self.assertIn(f'split_up_request_duration_seconds_count{{{labels}}} 3', content)
+        self.assertIn(f'split_up_request_queries_bucket{{{labels},le="+Inf"}} 3', content)
+        self.assertNotIn(self.friend.email, content)
+
+        response = self.client.get('/metrics', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+
+class ProfilingTests(TestCase):
+    """Staff users profile single requests with `X-Profile`; the header of anyone else is ignored."""
+
+    def setUp(self):
+        self.staff, self.friend = make_user('staff'), make_user('friend')
+        self.staff.is_staff = True
+        self.staff.save()
+        profile_root = tempfile.TemporaryDirectory()
+        self.addCleanup(profile_root.cleanup)
+        settings_override = override_settings(PROFILE_ROOT=profile_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def headers(self, user, mode):
+        return {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}', 'HTTP_X_PROFILE': mode}
+
+    def create_expense(self, user, mode):
+        return self.client.post('/expense/create_expense/', {
+            'description': 'dinner', 'amount': 30, 'split_method': 'equal', 'participants_data': {str(self.friend.id): 0}, 'self': True,
+        }, content_type='application/json', **self.headers(user, mode))
+
+    def test_inline(self):
+        self.create_expense(self.staff, 'none')
+        response = self.client.get('/expense/balance_sheet/', **self.headers(self.staff, 'inline'))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['status'], 200)
+        self.assertEqual(data['path'], '/expense/balance_sheet/')
+        # The view runs on the profiled event loop, its queries in the profiled thread
+        self.assertIn('views.py', data['profile'])
+        self.assertIn('execute', data['profile'])
+        self.assertTrue(any('Expences_app_participant' in query['sql'] for query in data['queries']))
+        self.assertEqual(profiling.saved(), [])
+
+    def test_save_and_summarize(self):
+        response = self.create_expense(self.staff, 'save')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'message': 'Expense created successfully.'})
+        profile_id = response['X-Profile-Id']
+
+        [data] = profiling.saved()
+        self.assertEqual((data['id'], data['user'], data['method'], data['status']), (profile_id, 'staff@example.com', 'POST', 201))
+        self.assertTrue(any(query['sql'].startswith('INSERT') for query in data['queries']))
+
+        out = io.StringIO()
+        call_command('profiles', stdout=out)
+        self.assertIn(f'{profile_id}', out.getvalue())
+        self.assertIn('POST /expense/create_expense/', out.getvalue())
+
+        out = io.StringIO()
+        call_command('profiles', profile_id, '--limit', '5', stdout=out)
+        self.assertIn('Ordered by: cumulative time', out.getvalue())
+        self.assertIn('Slowest SQL statements:', out.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command('profiles', 'missing', stdout=io.StringIO())
+
+    def test_ignored_for_other_users(self):
+        response = self.create_expense(self.friend, 'inline')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'message': 'Expense created successfully.'})
+        self.assertNotIn('X-Profile-Id', response)
+
+    def test_no_profiler_without_header(self):
+        with mock.patch.object(profiling.cProfile, 'Profile', side_effect=AssertionError("profiled")):
+            response = self.client.get('/expense/balance_sheet/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.staff)}')
+            self.assertEqual(response.status_code, 200)
+            # An unknown mode is no header either
+            response = self.client.get('/expense/balance_sheet/', **self.headers(self.staff, 'yes'))
+            self.assertEqual(response.status_code, 200)
+
+
+class AsyncProfilingTests(TransactionTestCase):
+    """Under ASGI the profiled request runs on an event loop and a thread of its own, and still sees the database."""
+
+    async def test_async_request(self):
+        staff = await sync_to_async(make_user)('staff')
+        staff.is_staff = True
+        await staff.asave()
+        with tempfile.TemporaryDirectory() as profile_root, override_settings(PROFILE_ROOT=profile_root):
+            response = await self.async_client.get('/expense/owe_list/', headers={
+                'Authorization': f'Bearer {AccessToken.for_user(staff)}', 'X-Profile': 'save',
+            })
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), {'people_i_owe': [], 'people_owe_me': []})
+            [data] = await sync_to_async(profiling.saved)()
+        self.assertEqual(data['id'], response['X-Profile-Id'])
+        self.assertTrue(data['queries'])
@@ -1,16 +1,27 @@
-from django.urls import path
-from .views import SearchUserByEmailView, CreateExpenseView , UsersAllExpensesView, OweView, SettleExpenseView, BalanceSheetView, BalanceSheetDownloadView
-
-
-
-urlpatterns = [
-    path('get_user/<str:email>/', SearchUserByEmailView.as_view(), name='get_user_name'),
-    path('create_expense/', CreateExpenseView.as_view(), name="create_expence"),
-    path('users_expense/', UsersAllExpensesView.as_view(), name="users_expence_view"),
-    path('owe_list/', OweView.as_view(), name="users_owe_list"),
-    path('settle_expense/<str:expense_id>/', SettleExpenseView.as_view(), name="settle_expense"),
-    
-    path('balance_sheet/', BalanceSheetView.as_view(), name='balance_sheet'),
-    path('balance-sheet/download/', BalanceSheetDownloadView.as_view(), name='balance-sheet-download')
-    
-]   
+from django.urls import path
+from .views import SearchUserByEmailView, CreateExpenseView, ImportExpensesView, UsersAllExpensesView, OweView, SettlementPlanView, SettleExpenseView, SettleWithUserView, BalanceSheetView, BalanceSheetDownloadView, ExportJobsView, ExportJobView, ExportJobDownloadView, GroupView, GroupMembersView, GroupSummaryView, AnalyticsView, CacheStatsView
+
+
+
+urlpatterns = [
+    path('get_user/<str:email>/', SearchUserByEmailView.as_view(), name='get_user_name'),
+    path('create_expense/', CreateExpenseView.as_view(), name="create_expence"),
+    path('import_expenses/', ImportExpensesView.as_view(), name="import_expenses"),
+    path('users_expense/', UsersAllExpensesView.as_view(), name="users_expence_view"),
+    path('owe_list/', OweView.as_view(), name="users_owe_list"),
+    path('settlement_plan/', SettlementPlanView.as_view(), name="settlement_plan"),
+    path('settle_expense/<str:expense_id>/', SettleExpenseView.as_view(), name="settle_expense"),
+    path('settle_with_user/<uuid:user_id>/', SettleWithUserView.as_view(), name="settle_with_user"),
+    
+    path('balance_sheet/', BalanceSheetView.as_view(), name='balance_sheet'),
+    path('balance-sheet/download/', BalanceSheetDownloadView.as_view(), name='balance-sheet-download'),
+    path('balance-sheet/exports/', ExportJobsView.as_view(), name='balance-sheet-exports'),
+    path('balance-sheet/exports/<uuid:job_id>/', ExportJobView.as_view(), name='balance-sheet-export'),
+    path('balance-sheet/exports/<uuid:job_id>/download/', ExportJobDownloadView.as_view(), name='balance-sheet-export-download'),
+    path('groups/', GroupView.as_view(), name='groups'),
+    path('groups/<uuid:group_id>/members/', GroupMembersView.as_view(), name='group_members'),
+    path('groups/<uuid:group_id>/summary/', GroupSummaryView.as_view(), name='group_summary'),
+    path('analytics/', AnalyticsView.as_view(), name='analytics'),
+    path('cache_stats/', CacheStatsView.as_view(), name='cache_stats')
+    
+]   
@@ -1,771 +1,1833 @@
-import csv
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.response import Response
-from rest_framework import status
-from rest_framework.views import APIView
-from django.contrib.auth import get_user_model
-from django.db.models import Sum, Q
-from django.http import JsonResponse, HttpResponse
-from .models import  Expense, Participant
-
-
-User = get_user_model()
-
-class SearchUserByEmailView(APIView):
-    """
-    SearchUserByEmailView: API to search for a user by email.
-
-    This view allows you to search for a user by providing their email address in the URL path.
-    It returns the user's ID, name, and email if the user exists in the database.
-
-    Authentication:
-    - Requires Bearer JWT Token (Authorization header).
-
-    URL Path Parameter:
-    - `email` (str): The email address of the user you're looking for.
-
-    Response:
-    - 200 OK: Returns the user information if the user is found.
-        Example:
-        {
-            "user_id": "5fe51365-fb31-4c10-ba34-bdbe5556fb68",
-            "name": "Nikhil Patil",
-            "email": "nikhilpatil18012004@gmail.com"
-        }
-    - 404 Not Found: If the email is missing or if the user with the given email does not exist.
-        Example:
-        {
-            "error": "email not found in input"
-        }
-        or
-        {
-            "error": "User not found."
-        }
-
-    Endpoint:
-    - GET /expense/get_user/nikhilpatil18012004@gmail.com/
-    """
-    
-    permission_classes = [IsAuthenticated]
-    
-    def get(self, request, email=None):
-        try:
-            if not email:
-                return Response({"error": "email not found in input"}, status=status.HTTP_404_NOT_FOUND)
-            
-            user = User.objects.get(email=email)
-            return Response({
-                "user_id": str(user.id),
-                "name": user.name,
-                "email": user.email
-            }, status=status.HTTP_200_OK)
-        
-        except User.DoesNotExist:
-            return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
-
-class CreateExpenseView(APIView):
-    """
-    CreateExpenseView: API to create an expense and split it among participants using different methods.
-
-    The view supports three types of split methods:
-    1. Equal Split: The total amount is divided equally among all participants.
-    2. Exact Split: Each participant contributes a specified amount.
-    3. Percentage Split: Each participant contributes a percentage of the total amount.
-
-    Authentication:
-    - Requires Bearer JWT Token (Authorization header).
-
-    Input (Common Fields):
-    - `description` (str): A brief description of the expense.
-    - `amount` (float): The total expense amount.
-    - `split_method` (str): The split method, which can be one of 'equal', 'exact', or 'percentage'.
-    - `participants_data` (dict): A dictionary containing participant user IDs as keys and their share (amount/percentage) as values.
-
-    Split Method Specific Fields:
-    1. **Equal Split**:
-       - `self` (bool): Indicates if the creator should be included in the split. Default is `true`.
-       
-       Example Input:
-       ```json
-       {
-           "description": "KedarNath",
-           "amount": 9000,
-           "split_method": "equal",
-           "participants_data": {
-               "eac58f88-5b89-42b7-aa23-c4a0200663ea": 1000,
-               "04ed7b18-2c74-437e-90be-87820c74932d": 2000,
-               "a060c415-4870-4d7e-a580-3b34afab8c22": 4000
-           },
-           "self": true
-       }
-       ```
-
-    2. **Exact Split**:
-       - `self_amount` (float): The exact amount the creator is contributing.
-       
-       Example Input:
-       ```json
-       {
-           "description": "KedarNath",
-           "amount": 9000,
-           "split_method": "exact",
-           "participants_data": {
-               "eac58f88-5b89-42b7-aa23-c4a0200663ea": 2000,
-               "04ed7b18-2c74-437e-90be-87820c74932d": 2000,
-               "a060c415-4870-4d7e-a580-3b34afab8c22": 4000
-           },
-           "self_amount": 1000
-       }
-       ```
-
-    3. **Percentage Split**:
-       - `self_percentage` (float): The percentage of the total amount the creator is contributing.
-       
-       Example Input:
-       ```json
-       {
-           "description": "KedarNath",
-           "amount": 9000,
-           "split_method": "percentage",
-           "participants_data": {
-               "eac58f88-5b89-42b7-aa23-c4a0200663ea": 20,
-               "04ed7b18-2c74-437e-90be-87820c74932d": 20,
-               "a060c415-4870-4d7e-a580-3b34afab8c22": 40
-           },
-           "self_percentage": 10
-       }
-       ```
-
-    Response:
-    - 201 Created: Returns a success message if the expense is created.
-      Example Output:
-      ```json
-      {
-          "message": "Expense created successfully."
-      }
-      ```
-
-    - 400 Bad Request: Returns an error message if any required fields are missing or validation fails.
-      Example Output:
-      ```json
-      {
-          "error": "The total of exact amounts does not match the expense amount."
-      }
-      ```
-
-    - 404 Not Found: Returns an error message if any participant is not found.
-      Example Output:
-      ```json
-      {
-          "error": "One or more participants not found."
-      }
-      ```
-
-    Validation:
-    - For equal split, the amount is divided equally among all participants, including the creator if `self` is `true`.
-    - For exact split, the total of the exact amounts provided for all participants (including `self_amount`) must equal the total `amount`.
-    - For percentage split, the total percentages provided for all participants (including `self_percentage`) must equal 100%.
-
-    Endpoint:
-    - POST /expense/create_expense/
-    """
-    permission_classes = [IsAuthenticated]
-    
-    def post(self, request):
-        try:
-            # Extract input data
-            description = request.data.get('description')
-            amount = request.data.get('amount')
-            split_method = request.data.get('split_method')
-            participants_data = request.data.get('participants_data')  # Dictionary {user_id: value}
-
-            # Validate required fields
-            if not description or not amount or not split_method or not participants_data:
-                return Response({"error": "Missing required fields."}, status=status.HTTP_400_BAD_REQUEST)
-
-            try:
-                amount = float(amount)
-                
-                # Create the expense
-                expense = Expense.objects.create(
-                    description=description,
-                    amount=amount,
-                    split_method=split_method,
-                    created_by=request.user
-                )
-
-                # Equal Split Method
-                if split_method == 'equal':
-                    self_exist = request.data.get('self', False)
-                    total_participants = len(participants_data) + (1 if self_exist else 0)
-                    equal_share = round(amount / total_participants, 2)
-                    equal_percentage = round((equal_share / amount) * 100, 2)
-
-                    # Add the creator as a participant
-                    if self_exist:
-                        Participant.objects.create(
-                            user=request.user,
-                            expense=expense,
-                            amount=equal_share,
-                            percentage=equal_percentage,
-                            status="settled"
-                        )
-
-                    # Add other participants
-                    for user_id in participants_data.keys():
-                        user = User.objects.get(id=user_id)
-                        Participant.objects.create(
-                            user=user,
-                            expense=expense,
-                            amount=equal_share,
-                            percentage=equal_percentage
-                        )
-
-                # Exact Split Method
-                elif split_method == 'exact':
-                    total_exact_amount = 0
-                    self_amount = request.data.get('self_amount')
-                    total_exact_amount += float(self_amount)
-                    self_exact_percentage = round((float(self_amount) / amount) * 100, 2)
-
-                    # Add the creator as a participant
-                    Participant.objects.create(
-                        user=request.user,
-                        expense=expense,
-                        amount=self_amount,
-                        percentage=self_exact_percentage,
-                        status="settled"
-                    )
-
-                    # Add other participants
-                    for user_id, exact_amount in participants_data.items():
-                        user = User.objects.get(id=user_id)
-                        exact_amount = float(exact_amount)
-                        total_exact_amount += exact_amount
-                        exact_percentage = round((exact_amount / amount) * 100, 2)
-
-                        Participant.objects.create(
-                            user=user,
-                            expense=expense,
-                            amount=exact_amount,
-                            percentage=exact_percentage
-                        )
-
-                    # Ensure total amounts match the expense
-                    if round(total_exact_amount, 2) != round(amount, 2):
-                        return Response({"error": "The total of exact amounts does not match the expense amount."}, status=status.HTTP_400_BAD_REQUEST)
-
-                # Percentage Split Method
-                elif split_method == 'percentage':
-                    total_percentage = 0
-                    self_percentage = float(request.data.get('self_percentage'))
-                    total_percentage += self_percentage
-                    self_participant_amount = round((self_percentage / 100) * amount, 2)
-
-                    # Add the creator as a participant
-                    Participant.objects.create(
-                        user=request.user,
-                        expense=expense,
-                        amount=self_participant_amount,
-                        percentage=self_percentage,
-                        status="settled"
-                    )
-
-                    # Add other participants
-                    for user_id, percentage in participants_data.items():
-                        user = User.objects.get(id=user_id)
-                        percentage = float(percentage)
-                        total_percentage += percentage
-                        participant_amount = round((percentage / 100) * amount, 2)
-
-                        Participant.objects.create(
-                            user=user,
-                            expense=expense,
-                            amount=participant_amount,
-                            percentage=percentage
-                        )
-
-                   
-                    if round(total_percentage, 2) != 100:
-                        return Response({"error": "The total percentages must add up to 100%."}, status=status.HTTP_400_BAD_REQUEST)
-
-                return Response({"message": "Expense created successfully."}, status=status.HTTP_201_CREATED)
-
-            except User.DoesNotExist:
-                return Response({"error": "One or more participants not found."}, status=status.HTTP_404_NOT_FOUND)
-            except Exception as e:
-                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-
-    def get_user(self, user_id):
-        """Utility method to get user by user_id."""
-        return User.objects.get(id=user_id)
-  
-        
-        
-class UsersAllExpensesView(APIView):
-    """
-    UsersAllExpensesView: API to fetch all expenses for the authenticated user. 
-
-    This view returns two types of data:
-    1. **i_owe**: Expenses where the user is a participant and owes money to others.
-    2. **others_owe_me**: Expenses where the user is the creator, and other participants owe them money.
-
-    Authentication:
-    - Requires Bearer JWT Token (Authorization header).
-
-    Input:
-    - No input payload required (GET request).
-
-    Output:
-    - **i_owe** (list): A list of expenses where the user owes others.
-        - `description` (str): A description of the expense.
-        - `amount` (float): The amount the user owes.
-        - `split_method` (str): The method used to split the expense ('equal', 'exact', or 'percentage').
-        - `created_by` (str): The email of the user who created the expense.
-        - `status` (str): The payment status of the user's share ('pending' or 'settled').
-        - `created_at` (str): The timestamp when the expense was created.
-
-    - **others_owe_me** (list): A list of expenses where others owe the user.
-        - `expense_id` (UUID): The unique ID of the expense.
-        - `description` (str): A description of the expense.
-        - `amount` (float): The total expense amount.
-        - `split_method` (str): The method used to split the expense.
-        - `created_at` (str): The timestamp when the expense was created.
-        - `participants` (list): A list of participants who owe the user.
-            - `user_id` (UUID): The unique ID of the participant.
-            - `user_email` (str): The email of the participant.
-            - `amount` (float): The amount the participant owes.
-            - `status` (str): The payment status of the participant's share ('pending' or 'settled').
-
-    Example Output:
-    ```json
-    {
-        "i_owe": [
-            {
-                "description": "Dinner at Restaurant",
-                "amount": 1200.0,
-                "split_method": "equal",
-                "created_by": "john.doe@example.com",
-                "status": "pending",
-                "created_at": "2024-10-21T14:34:22Z"
-            }
-        ],
-        "others_owe_me": [
-            {
-                "expense_id": "eb663885-6a16-48cb-84ba-d2ecd9c6269d",
-                "description": "Birthday Party Expenses",
-                "amount": 6000.0,
-                "split_method": "percentage",
-                "created_at": "2024-10-22T15:01:05.483699Z",
-                "participants": [
-                    {
-                        "user_id": "eac58f88-5b89-42b7-aa23-c4a0200663ea",
-                        "user_email": "infonikhil@gmail.com",
-                        "amount": 2400.0,
-                        "status": "settled"
-                    },
-                    {
-                        "user_id": "a060c415-4870-4d7e-a580-3b34afab8c22",
-                        "user_email": "NitSharma@gmail.com",
-                        "amount": 1800.0,
-                        "status": "pending"
-                    }
-                ]
-            }
-        ]
-    }
-    ```
-
-    Response Status Codes:
-    - **200 OK**: Successfully returns the list of expenses.
-    - **500 Internal Server Error**: Returns an error message in case of an internal server issue.
-
-    Endpoint:
-    - GET /expense/users_expense/
-    """
-    permission_classes = [IsAuthenticated]
-
-    def get(self, request):
-        try:
-            # Fetch expenses where the user is the creator (others owe them)
-            created_expenses = Expense.objects.filter(created_by=request.user)
-            others_owe_me = [{
-                'expense_id': exp.expense_id,
-                'description': exp.description,
-                'amount': exp.amount,
-                'split_method': exp.split_method,
-                'created_at': exp.created_at,
-                'participants': [
-                    {   
-                        'user_id': part.user.id,
-                        'user_email': part.user.email,
-                        'amount': part.amount,
-                        'status': part.status
-                    } for part in exp.participants.exclude(user=request.user)
-                ]
-            } for exp in created_expenses]
-
-            # Fetch expenses where the user is a participant (they owe others)
-            participant_expenses = Participant.objects.filter(user=request.user, status='pending')
-            i_owe = [{
-                'description': part.expense.description,
-                'amount': part.amount,
-                'split_method': part.expense.split_method,
-                'created_by': part.expense.created_by.email,
-                'status': part.status,
-                'created_at': part.expense.created_at
-            } for part in participant_expenses]
-
-            # Return the response with the i_owe and others_owe_me data
-            return Response({
-                'i_owe': i_owe,
-                'others_owe_me': others_owe_me
-            }, status=status.HTTP_200_OK)
-            
-        except Exception as e:
-            return Response({'error': f'{e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-class OweView(APIView):
-    """
-    OweView: API to fetch total amounts the user owes to others and others owe to the user.
-    
-    This view returns two types of data:
-    1. **people_i_owe**: A list of people to whom the user owes money.
-    2. **people_owe_me**: A list of people who owe money to the user.
-
-    Authentication:
-    - Requires Bearer JWT Token (Authorization header).
-
-    Input:
-    - No input payload required (GET request).
-
-    Output:
-    - **people_i_owe** (list): A list of people the user owes.
-        - `name` (str): The name of the person to whom the user owes money.
-        - `total_owe` (float): The total amount the user owes this person.
-        
-    - **people_owe_me** (list): A list of people who owe the user.
-        - `name` (str): The name of the person who owes the user money.
-        - `total_owed_to_me` (float): The total amount this person owes the user.
-
-    Example Output:
-    ```json
-    {
-        "people_i_owe": [
-            {
-                "name": "John Doe",
-                "total_owe": 4500.0
-            }
-        ],
-        "people_owe_me": [
-            {
-                "name": "Nit Sharma",
-                "total_owed_to_me": 11250.0
-            },
-            {
-                "name": "Patil Nikhil",
-                "total_owed_to_me": 10650.0
-            },
-            {
-                "name": "info Nikhil",
-                "total_owed_to_me": 6450.0
-            }
-        ]
-    }
-    ```
-
-    Response Status Codes:
-    - **200 OK**: Successfully returns the list of people the user owes and those who owe the user.
-    - **500 Internal Server Error**: Returns an error message in case of an internal server issue.
-
-   Endpoint:
-    - GET /expense/owe_list/
-    """
-    permission_classes = [IsAuthenticated]
-
-    def get(self, request):
-        try:
-            user = request.user
-
-            # Get list of all people the user owes money to
-            people_i_owe = Participant.objects.filter(
-                user=user, status="pending"
-            ).values('expense__created_by__name').annotate(total_owe=Sum('amount'))
-
-            # Get list of all people who owe money to the user
-            people_owe_me = Participant.objects.filter(
-                expense__created_by=user, status="pending"
-            ).values('user__name').annotate(total_owed_to_me=Sum('amount'))
-
-            # Format the results to include names
-            data = {
-                "people_i_owe": [
-                    {
-                        "name": person['expense__created_by__name'],
-                        "total_owe": person['total_owe']
-                    }
-                    for person in people_i_owe
-                ],
-                "people_owe_me": [
-                    {
-                        "name": person['user__name'],
-                        "total_owed_to_me": person['total_owed_to_me']
-                    }
-                    for person in people_owe_me
-                ],
-            }
-
-            return Response(data, status=status.HTTP_200_OK)
-        except Exception as e:
-            return Response({'error': f'{e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-class SettleExpenseView(APIView):
-    """
-    SettleExpenseView: API to settle payments for an expense. The user who created the expense can mark participants as "settled".
-
-    Task:
-    - Allows settling payments for participants of an expense.
-
-    Authentication:
-    - Requires Bearer JWT Token (Authorization header).
-
-    Input:
-    - **user_ids** (optional): List of user IDs to mark as settled for the expense.
-    ```json
-    {
-        "user_ids": ["eac58f88-5b89-42b7-aa23-c4a0200663ea", "04ed7b18-2c74-437e-90be-87820c74932d"]
-    }
-    ```
-    - If `user_ids` is not provided, all pending participants will be settled.
-
-    URL Path:
-    - The API expects the `expense_id` to be passed in the URL path, representing the specific expense to settle participants for.
-
-    Example Request:
-    - POST /expenses/settle_expense/{expense_id}/
-    
-    Output:
-    - If `user_ids` are provided:
-    ```json
-    {
-        "message": "Expense settled for users: John Doe, Jane Doe.",
-        "not_settled": "Some users could not be settled: ['user_id1', 'user_id2']"
-    }
-    ```
-    - If `user_ids` is not provided, the response will settle all pending participants:
-    ```json
-    {
-        "message": "All participants have been settled."
-    }
-    ```
-
-    Response Status Codes:
-    - **200 OK**: Successfully settled participants.
-    - **400 Bad Request**: Invalid input (e.g., `user_ids` is not a list or no pending participants).
-    - **404 Not Found**: Expense not found or the user is not the creator of the expense.
-    - **500 Internal Server Error**: Internal server error with an error message.
-
-    Example Output:
-    - When no users are settled:
-    ```json
-    {
-        "message": "No participants were settled.",
-        "not_settled": "Some users could not be settled: ['eac58f88-5b89-42b7-aa23-c4a0200663ea', '04ed7b18-2c74-437e-90be-87820c74932d']"
-    }
-    ```
-
-    Example Usage:
-    - POST /expenses/settle_expense/{expense_id}/
-    """
-
-    permission_classes = [IsAuthenticated]
-
-    def post(self, request, expense_id):
-        try:
-            user_ids = request.data.get("user_ids", None)  # List of user_ids to settle
-
-            try:
-                # Fetch the expense by ID and ensure it's created by the current user
-                expense = Expense.objects.get(expense_id=expense_id, created_by=request.user)
-
-                if user_ids:
-                    # Validate that user_ids is a list
-                    if not isinstance(user_ids, list):
-                        return Response({"error": "user_ids must be a list."}, status=status.HTTP_400_BAD_REQUEST)
-                    
-                    settled_users = []
-                    not_found_users = []
-
-                    # Settle specific participants
-                    for user_id in user_ids:
-                        try:
-                            participant = Participant.objects.get(expense=expense, user__id=user_id, status="pending")
-                            participant.status = "settled"
-                            participant.save()
-                            settled_users.append(participant.user.name)  # Store settled user names
-                        except Participant.DoesNotExist:
-                            not_found_users.append(user_id)  # Store user IDs that were not found or already settled
-
-                    if settled_users:
-                        message = f"Expense settled for users: {', '.join(settled_users)}."
-                    else:
-                        message = "No participants were settled."
-
-                    # Include users that were not found or already settled
-                    if not_found_users:
-                        return Response({
-                            "message": message,
-                            "not_settled": f"Some users could not be settled: {not_found_users}"
-                        }, status=status.HTTP_200_OK)
-
-                    return Response({"message": message}, status=status.HTTP_200_OK)
-
-                else:
-                    # Settle all participants if no user_ids are provided
-                    participants = Participant.objects.filter(expense=expense, status="pending")
-                    
-                    if not participants.exists():
-                        return Response({"message": "No pending payments to settle for this expense."}, status=status.HTTP_400_BAD_REQUEST)
-
-                    participants.update(status="settled")
-                    
-                    return Response({"message": "All participants have been settled."}, status=status.HTTP_200_OK)
-
-            except Expense.DoesNotExist:
-                return Response({"error": "Expense not found or you are not the creator."}, status=status.HTTP_404_NOT_FOUND)
-            except Exception as e:
-                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-        except Exception as e:
-            return Response({'error': f'{e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-class BalanceSheetView(APIView):
-    """
-    BalanceSheetView: API to retrieve the balance sheet of expenses for the authenticated user.
-
-    Task:
-    - Retrieves all expenses the user has participated in, including their share and the total expense amount.
-
-    Authentication:
-    - Requires Bearer JWT Token (Authorization header).
-
-    Output:
-    - Returns a JSON response with the user's individual expenses.
-    ```json
-    {
-        "individual_expenses": [
-            {
-                "expense_id": "eb663885-6a16-48cb-84ba-d2ecd9c6269d",
-                "description": "Birthday Party Expenses",
-                "user_share": 2400.0,
-                "total_amount": 6000.0,
-                "split_method": "percentage",
-                "created_by": "John Doe",
-                "created_at": "2024-10-22T15:01:05.483699Z",
-                "status": "settled"
-            },
-            ...
-        ]
-    }
-    ```
-
-    Response Status Codes:
-    - **200 OK**: Successfully retrieved individual expenses.
-
-    Example Usage:
-    - GET /expense/balance_sheet/
-    """
-
-    permission_classes = [IsAuthenticated]
-
-    def get(self, request):
-        participated_expenses = Participant.objects.filter(user=request.user)
-        
-        individual_expenses_data = []
-
-        # Process participated expenses (user as participant)
-        for participation in participated_expenses:
-            expense = participation.expense
-            total_amount = expense.amount
-            
-            individual_expenses_data.append({
-                'expense_id': expense.expense_id,
-                'description': expense.description,
-                'user_share': participation.amount,  
-                'total_amount': total_amount,  # Total expense amount
-                'split_method': expense.split_method,
-                'created_by': expense.created_by.name,
-                'created_at': expense.created_at,
-                'status': participation.status,  # User's status (pending/settled)
-            })
-
-        return JsonResponse({
-            'individual_expenses': individual_expenses_data,
-        })
-
-
-class BalanceSheetDownloadView(APIView):
-    """
-    BalanceSheetDownloadView: API to download the balance sheet of expenses for the authenticated user in CSV format.
-
-    Task:
-    - Allows users to download a CSV file containing their expenses along with their shares and statuses.
-
-    Authentication:
-    - Requires Bearer JWT Token (Authorization header).
-
-    Output:
-    - Returns a CSV file containing the following headers:
-    - `Expense ID`, `Description`, `Amount`, `Split Method`, `Created By`, `Created At`, `Your Share`, `Status`.
-
-    Example Response:
-    - The response will prompt a download of a CSV file named "balance_sheet.csv".
-
-    Example Usage:
-    - GET /expense/balance_sheet/download/
-    """
-
-    permission_classes = [IsAuthenticated]
-
-    def get(self, request):
-        # Create the HttpResponse object with the appropriate CSV header
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="balance_sheet.csv"'
-
-        # Create a CSV writer object and write the header row
-        writer = csv.writer(response)
-        writer.writerow(['Expense ID', 'Description', 'Amount', 'Split Method', 'Created By', 'Created At', 'Your Share', 'Status'])
-
-        # Fetch the expenses where the user is either the creator or a participant
-        overall_expenses = Expense.objects.filter(Q(created_by=request.user) | Q(participants__user=request.user)).distinct()
-
-        # Loop through each expense and write its data along with user-specific share and status
-        for exp in overall_expenses:
-            # Get the participants of the expense
-            participants = exp.participants.all()
-
-            # Get data for the current user
-            participant_data = participants.filter(user=request.user).first()
-
-            if participant_data:
-                user_share = participant_data.amount  # Fetch the user's share amount
-                status = participant_data.status      # Fetch the status of the expense for the user
-            else:
-                user_share = 'N/A'
-                status = 'N/A'
-
-            # Write a row for this expense
-            writer.writerow([
-                exp.expense_id,
-                exp.description,
-                exp.amount,
-                exp.split_method,
-                exp.created_by.name,  # Assuming `created_by` is a User model with a `name` attribute
-                exp.created_at.strftime('%Y-%m-%d %H:%M:%S'),  # Format the date for CSV
-                user_share,
-                status
-            ])
-
-        # Return the CSV response for download
-        return response
+import csv
+import json
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.views import APIView
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from .models import  Expense, Participant, Balance, Group, GroupMember, MonthlyRollup, ExportJob
+from split_up import renderers, routers, streaming
+from split_up.async_views import APIResponse, AsyncAPIView
+from . import cache, exports, ledger, pagination, rollups, settlement, splits
+
+
+User = get_user_model()
+
+
+class SplitValidationError(Exception):
+    """Raised when the split of an expense is rejected before anything is written."""
+
+
+class GroupNotFound(Exception):
+    """Raised when a group does not exist or the requesting user is not one of its members."""
+
+
+class InvalidMembers(Exception):
+    """Raised when the `member_ids` of a group request are not a list of user ids."""
+
+
+class SearchUserByEmailView(AsyncAPIView):
+    """
+    SearchUserByEmailView: API to search for a user by email.
+
+    This view allows you to search for a user by providing their email address in the URL path.
+    It returns the user's ID, name, and email if the user exists in the database.
+
+    Authentication:
+    - Requires Bearer JWT Token (Authorization header).
+
+    URL Path Parameter:
+    - `email` (str): The email address of the user you're looking for.
+
+    Response:
+    - 200 OK: Returns the user information if the user is found.
+        Example:
+        {
+            "user_id": "5fe51365-fb31-4c10-ba34-bdbe5556fb68",
+            "name": "Nikhil Patil",
+            "email": "nikhilpatil18012004@gmail.com"
+        }
+    - 404 Not Found: If the email is missing or if the user with the given email does not exist.
+        Example:
+        {
+            "error": "email not found in input"
+        }
+        or
+        {
+            "error": "User not found."
+        }
+
+    Endpoint:
+    - GET /expense/get_user/nikhilpatil18012004@gmail.com/
+    """
+    permission_classes = [IsAuthenticated]
+    
+    async def get(self, request, email=None):
+        try:
+            if not email:
+                return APIResponse({"error": "email not found in input"}, status=status.HTTP_404_NOT_FOUND)
+            
+            user = await User.objects.aget(email=email)
+            return APIResponse({
+                "user_id": str(user.id),
+                "name": user.name,
+                "email": user.email
+            }, status=status.HTTP_200_OK)
+        
+        except User.DoesNotExist:
+            return APIResponse({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+
+class CreateExpenseView(APIView):
+    """
+    CreateExpenseView: API to create an expense and split it among participants using different methods.
+
+    The view supports three types of split methods:
+    1. Equal Split: The total amount is divided equally among all participants.
+    2. Exact Split: Each participant contributes a specified amount.
+    3. Percentage Split: Each participant contributes a percentage of the total amount.
+
+    Authentication:
+    - Requires Bearer JWT Token (Authorization header).
+
+    Input (Common Fields):
+    - `description` (str): A brief description of the expense.
+    - `amount` (float): The total expense amount.
+    - `split_method` (str): The split method, which can be one of 'equal', 'exact', or 'percentage'.
+    - `participants_data` (dict): A dictionary containing participant user IDs as keys and their share (amount/percentage) as values.
+    - `group_id` (str, optional): The group the expense belongs to. The creator and every participant must be
+      members of the group; the members' net balances in the group are updated with the expense.
+
+    Split Method Specific Fields:
+    1. **Equal Split**:
+       - `self` (bool): Indicates if the creator should be included in the split. Default is `true`.
+       
+       Example Input:
+       ```json
+       {
+           "description": "KedarNath",
+           "amount": 9000,
+           "split_method": "equal",
+           "participants_data": {
+               "eac58f88-5b89-42b7-aa23-c4a0200663ea": 1000,
+               "04ed7b18-2c74-437e-90be-87820c74932d": 2000,
+               "a060c415-4870-4d7e-a580-3b34afab8c22": 4000
+           },
+           "self": true
+       }
+       ```
+
+    2. **Exact Split**:
+       - `self_amount` (float): The exact amount the creator is contributing.
+       
+       Example Input:
+       ```json
+       {
+           "description": "KedarNath",
+           "amount": 9000,
+           "split_method": "exact",
+           "participants_data": {
+               "eac58f88-5b89-42b7-aa23-c4a0200663ea": 2000,
+               "04ed7b18-2c74-437e-90be-87820c74932d": 2000,
+               "a060c415-4870-4d7e-a580-3b34afab8c22": 4000
+           },
+           "self_amount": 1000
+       }
+       ```
+
+    3. **Percentage Split**:
+       - `self_percentage` (float): The percentage of the total amount the creator is contributing.
+       
+       Example Input:
+       ```json
+       {
+           "description": "KedarNath",
+           "amount": 9000,
+           "split_method": "percentage",
+           "participants_data": {
+               "eac58f88-5b89-42b7-aa23-c4a0200663ea": 20,
+               "04ed7b18-2c74-437e-90be-87820c74932d": 20,
+               "a060c415-4870-4d7e-a580-3b34afab8c22": 40
+           },
+           "self_percentage": 10
+       }
+       ```
+
+    Response:
+    - 201 Created: Returns a success message if the expense is created.
+      Example Output:
+      ```json
+      {
+          "message": "Expense created successfully."
+      }
+      ```
+
+    - 400 Bad Request: Returns an error message if any required fields are missing or validation fails.
+      Example Output:
+      ```json
+      {
+          "error": "The total of exact amounts does not match the expense amount."
+      }
+      ```
+
+    - 404 Not Found: Returns an error message if any participant is not found, or if the group is not found
+      or the creator is not one of its members.
+      Example Output:
+      ```json
+      {
+          "error": "One or more participants not found."
+      }
+      ```
+
+    Validation:
+    - For equal split, the amount is divided equally among all participants, including the creator if `self` is `true`.
+    - For exact split, the total of the exact amounts provided for all participants (including `self_amount`) must equal the total `amount`.
+    - For percentage split, the total percentages provided for all participants (including `self_percentage`) must equal 100%.
+    - Shares are computed in integer cents (see splits.py) and always add up to the amount: the cents left over by
+      an equal split go to the first participants, the creator first (100 split 3 ways is 33.34 + 33.33 + 33.33).
+    - All participants are fetched with one query and the split is validated before anything is written;
+      the expense and its participants are then saved in a single transaction.
+
+    Endpoint:
+    - POST /expense/create_expense/
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        try:
+            # Extract and validate input data
+            description, amount, split_method, participants_data = self.parse_expense(request.data)
+
+            # Resolve and validate the whole split before anything is written
+            participants = self.build_participants(request.user, amount, split_method, participants_data, request.data)
+            group_id = self.get_group_id(request.user, request.data.get('group_id'), [p.user_id for p in participants])
+
+            # Create the expense and all of its participants in one transaction
+            with transaction.atomic():
+                expense = Expense.objects.create(
+                    description=description,
+                    amount=amount,
+                    split_method=split_method,
+                    created_by=request.user,
+                    group_id=group_id
+                )
+                for participant in participants:
+                    participant.expense_id = expense.pk
+                    participant.created_at = expense.created_at
+                Participant.objects.bulk_create(participants)
+                ledger.add_debts((p.user_id, request.user.pk, p.amount) for p in participants if p.status == "pending")
+                ledger.add_group_debts((group_id, p.user_id, request.user.pk, p.amount) for p in participants if p.status == "pending")
+                rollups.add_shares((p.user_id, request.user.pk, expense.created_at, split_method, p.amount, p.status) for p in participants)
+                cache.invalidate_users([request.user.pk, *(p.user_id for p in participants)])
+
+            return Response({"message": "Expense created successfully."}, status=status.HTTP_201_CREATED)
+
+        except (SplitValidationError, splits.SplitError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except User.DoesNotExist:
+            return Response({"error": "One or more participants not found."}, status=status.HTTP_404_NOT_FOUND)
+        except GroupNotFound:
+            return Response({"error": "Group not found."}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    def parse_expense(self, data):
+        """
+        Extract the common fields of an expense payload.
+
+        Returns (description, amount, split_method, participants_data) and raises
+        `SplitValidationError` when a required field is missing.
+        """
+        description = data.get('description')
+        amount = data.get('amount')
+        split_method = data.get('split_method')
+        participants_data = data.get('participants_data')  # Dictionary {user_id: value}
+
+        # Validate required fields
+        if not description or not amount or not split_method or not participants_data:
+            raise SplitValidationError("Missing required fields.")
+
+        return description, splits.from_cents(splits.to_cents(amount)), split_method, participants_data
+
+    def build_participants(self, creator, amount, split_method, participants_data, data, users=None):
+        """
+        Build the unsaved Participant rows of an expense.
+
+        All referenced users are fetched with a single `id__in` query (or taken
+        from `users`, a {UUID: user} mapping resolved by the caller) and the
+        shares are computed in cents by the split engine (splits.py), so nothing
+        is written when the split is rejected. Raises `splits.SplitError` for an
+        invalid split and `User.DoesNotExist` for an unknown participant.
+        """
+        user_ids, request, self_included = self.split_request(creator, amount, split_method, participants_data, data, users)
+        return self.make_participants(user_ids, request, splits.split(*request), self_included)
+
+    def split_request(self, creator, amount, split_method, participants_data, data, users=None):
+        """
+        Describe the split of an expense for the split engine.
+
+        Returns (user_ids, (method, total, values), self_included): share i of the split goes
+        to user_ids[i]; when `self_included` the first share is the creator's own.
+        """
+        users = self.get_users(participants_data.keys(), users)
+        total = splits.to_cents(amount)
+
+        # Equal Split Method: the creator is included when `self` is true
+        if split_method == splits.EQUAL:
+            self_included = bool(data.get('self', False))
+            user_ids = ([creator.pk] if self_included else []) + [user.pk for user in users]
+            return user_ids, (split_method, total, len(user_ids)), self_included
+
+        user_ids = [creator.pk] + [user.pk for user in users]
+
+        # Exact Split Method: `self_amount` and the amounts must add up to the expense amount
+        if split_method == splits.EXACT:
+            values = [splits.to_cents(data.get('self_amount'))]
+            values += [splits.to_cents(exact_amount) for exact_amount in participants_data.values()]
+
+        # Percentage Split Method: `self_percentage` and the percentages must add up to 100%
+        elif split_method == splits.PERCENTAGE:
+            values = [splits.to_basis_points(data.get('self_percentage'))]
+            values += [splits.to_basis_points(percentage) for percentage in participants_data.values()]
+
+        else:
+            raise SplitValidationError("Invalid split method.")
+
+        return user_ids, (split_method, total, values), True
+
+    def make_participants(self, user_ids, request, shares, self_included):
+        """Turn the shares of a split into Participant rows; the creator's own share is already settled."""
+        method, total, values = request
+        participants = []
+        for index, (user_id, share) in enumerate(zip(user_ids, shares)):
+            if method == splits.PERCENTAGE:
+                percentage = splits.from_cents(values[index])
+            else:
+                percentage = splits.percentage_of(share, total)
+            participants.append(Participant(
+                user_id=user_id,
+                amount=splits.from_cents(share),
+                percentage=percentage,
+                status="settled" if self_included and index == 0 else "pending",
+            ))
+        return participants
+
+    def get_users(self, user_ids, users=None):
+        """Utility method to fetch users by user_id with one query, in the given order."""
+        user_ids = list(user_ids)
+        if users is None:
+            users = User.objects.in_bulk(user_ids)
+        try:
+            return [users[uuid.UUID(str(user_id))] for user_id in user_ids]
+        except KeyError:
+            raise User.DoesNotExist
+
+    def get_user(self, user_id):
+        """Utility method to get user by user_id."""
+        return User.objects.get(id=user_id)
+
+    def get_group_id(self, creator, group_id, user_ids, groups=None):
+        """
+        Validate the optional `group_id` of an expense and return it as a UUID (None without a group).
+
+        The members of the group are fetched with one query (or taken from `groups`, a
+        {UUID: set of member ids} mapping resolved by the caller). Raises `GroupNotFound` when
+        the group does not exist or the creator is not a member, and `SplitValidationError`
+        when a participant is not a member.
+        """
+        if group_id in (None, ''):
+            return None
+        try:
+            group_id = uuid.UUID(str(group_id))
+        except ValueError:
+            raise GroupNotFound
+        if groups is None:
+            groups = {group_id: set(GroupMember.objects.filter(group_id=group_id).values_list('user_id', flat=True))}
+        members = groups.get(group_id)
+        if not members or creator.pk not in members:
+            raise GroupNotFound
+        if not members.issuperset(user_ids):
+            raise SplitValidationError("All participants must be members of the group.")
+        return group_id
+
+
+class ImportExpensesView(CreateExpenseView):
+    """
+    ImportExpensesView: API to create many expenses in one request, e.g. when a client syncs offline-recorded expenses.
+
+    Authentication:
+    - Requires Bearer JWT Token (Authorization header).
+
+    Input:
+    - Either a JSON array (`Content-Type: application/json`) or newline-delimited JSON
+      (`Content-Type: application/x-ndjson`, one expense per line) of expense payloads.
+    - Every expense uses the same fields and split rules as `CreateExpenseView` (including the optional
+      `group_id`) and may carry an optional `client_id` which is echoed back in its result.
+
+    Query Parameters:
+    - `chunk_size` (int, optional): Number of expenses committed per transaction. Defaults to `EXPENSE_IMPORT_CHUNK_SIZE`.
+
+    Example Input (NDJSON):
+    ```
+    {"client_id": "a1", "description": "Lunch", "amount": 300, "split_method": "equal", "participants_data": {"eac58f88-5b89-42b7-aa23-c4a0200663ea": 0}, "self": true}
+    {"client_id": "a2", "description": "Taxi", "amount": 500, "split_method": "percentage", "participants_data": {"eac58f88-5b89-42b7-aa23-c4a0200663ea": 40}, "self_percentage": 50}
+    ```
+
+    Output:
+    - The outcome of every expense, in input order.
+    ```json
+    {
+        "created": 1,
+        "failed": 1,
+        "results": [
+            {"index": 0, "client_id": "a1", "status": "created", "expense_id": "eb663885-6a16-48cb-84ba-d2ecd9c6269d"},
+            {"index": 1, "client_id": "a2", "status": "failed", "error": "The total percentages must add up to 100%."}
+        ]
+    }
+    ```
+
+    Processing:
+    - Expenses are handled in chunks of `chunk_size`. The users referenced by a chunk are resolved with one
+      query and the members of its groups with another (users and groups already seen in earlier chunks are
+      reused), every expense is validated in memory and the valid ones are written with one bulk insert per
+      table inside a single transaction.
+    - An invalid expense never blocks the other expenses of its chunk.
+
+    Response Status Codes:
+    - **200 OK**: The import ran; see `results` for the outcome of each expense.
+    - **400 Bad Request**: The body is not a JSON array or NDJSON, or `chunk_size` is invalid.
+
+    Endpoint:
+    - POST /expense/import_expenses/
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            chunk_size = int(request.query_params.get('chunk_size', settings.EXPENSE_IMPORT_CHUNK_SIZE))
+            if chunk_size < 1:
+                raise ValueError
+        except ValueError:
+            return Response({"error": "chunk_size must be a positive integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            if request.content_type.startswith('application/x-ndjson'):
+                items = self.iter_ndjson(request)
+            else:
+                if not isinstance(request.data, list):
+                    return Response({"error": "Expected a JSON array of expenses."}, status=status.HTTP_400_BAD_REQUEST)
+                items = enumerate(request.data)
+
+            users = {}
+            groups = {}
+            results = []
+            chunk = []
+            for item in items:
+                chunk.append(item)
+                if len(chunk) == chunk_size:
+                    results.extend(self.import_chunk(request.user, chunk, users, groups))
+                    chunk = []
+            if chunk:
+                results.extend(self.import_chunk(request.user, chunk, users, groups))
+
+            created = sum(1 for result in results if result['status'] == 'created')
+            return Response({
+                "created": created,
+                "failed": len(results) - created,
+                "results": results
+            }, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    def iter_ndjson(self, request):
+        """Yield (index, expense) for every non-blank line of an NDJSON body, without reading it all at once."""
+        if request.stream is None:
+            return
+        index = 0
+        for line in request.stream:
+            if not line.strip():
+                continue
+            try:
+                yield index, json.loads(line)
+            except ValueError as e:
+                yield index, SplitValidationError(f"Invalid JSON: {e}")
+            index += 1
+
+    def import_chunk(self, creator, chunk, users, groups):
+        """
+        Validate and write one chunk of (index, expense) items in a single transaction.
+
+        `users` is a {UUID: user} cache and `groups` a {UUID: set of member ids} cache shared
+        between chunks; the users and groups they are missing are fetched with one query each.
+        Returns the result of every item of the chunk.
+        """
+        missing = set()
+        missing_groups = set()
+        for _, item in chunk:
+            if isinstance(item, dict) and isinstance(item.get('participants_data'), dict):
+                for user_id in item['participants_data']:
+                    try:
+                        user_id = uuid.UUID(str(user_id))
+                    except ValueError:
+                        continue
+                    if user_id not in users:
+                        missing.add(user_id)
+            if isinstance(item, dict) and item.get('group_id'):
+                try:
+                    group_id = uuid.UUID(str(item['group_id']))
+                except ValueError:
+                    continue
+                if group_id not in groups:
+                    missing_groups.add(group_id)
+        if missing:
+            users.update(User.objects.in_bulk(missing))
+        if missing_groups:
+            groups.update({group_id: set() for group_id in missing_groups})
+            for group_id, user_id in GroupMember.objects.filter(group_id__in=missing_groups).values_list('group_id', 'user_id'):
+                groups[group_id].add(user_id)
+
+        results = []
+        prepared = []
+        for index, item in chunk:
+            result = {"index": index}
+            results.append(result)
+            try:
+                if isinstance(item, Exception):
+                    raise item
+                if not isinstance(item, dict):
+                    raise SplitValidationError("Each expense must be a JSON object.")
+                if 'client_id' in item:
+                    result['client_id'] = item['client_id']
+
+                description, amount, split_method, participants_data = self.parse_expense(item)
+                user_ids, request, self_included = self.split_request(creator, amount, split_method, participants_data, item, users)
+                group_id = self.get_group_id(creator, item.get('group_id'), user_ids, groups)
+            except User.DoesNotExist:
+                result.update(status="failed", error="One or more participants not found.")
+            except GroupNotFound:
+                result.update(status="failed", error="Group not found.")
+            except Exception as e:
+                result.update(status="failed", error=str(e))
+            else:
+                prepared.append((result, description, amount, split_method, user_ids, request, self_included, group_id))
+
+        # Compute the shares of the whole chunk in one batch
+        expenses = []
+        participants = []
+        group_debts = []
+        all_shares = splits.split_many(request for _, _, _, _, _, request, _, _ in prepared)
+        for (result, description, amount, split_method, user_ids, request, self_included, group_id), shares in zip(prepared, all_shares):
+            if isinstance(shares, splits.SplitError):
+                result.update(status="failed", error=str(shares))
+                continue
+            expense = Expense(
+                description=description,
+                amount=amount,
+                split_method=split_method,
+                created_by_id=creator.pk,
+                group_id=group_id
+            )
+            rows = self.make_participants(user_ids, request, shares, self_included)
+            for participant in rows:
+                participant.expense_id = expense.pk
+            expenses.append(expense)
+            participants.extend(rows)
+            group_debts.extend((group_id, p.user_id, creator.pk, p.amount) for p in rows if p.status == "pending")
+            result.update(status="created", expense_id=str(expense.expense_id))
+
+        try:
+            with transaction.atomic():
+                Expense.objects.bulk_create(expenses)
+                # The creation times are set by bulk_create
+                created_at = {expense.pk: expense.created_at for expense in expenses}
+                for participant in participants:
+                    participant.created_at = created_at[participant.expense_id]
+                Participant.objects.bulk_create(participants)
+                ledger.add_debts((p.user_id, creator.pk, p.amount) for p in participants if p.status == "pending")
+                ledger.add_group_debts(group_debts)
+                by_id = {expense.pk: expense for expense in expenses}
+                rollups.add_shares(
+                    (p.user_id, creator.pk, by_id[p.expense_id].created_at, by_id[p.expense_id].split_method, p.amount, p.status)
+                    for p in participants
+                )
+                if expenses:
+                    cache.invalidate_users([creator.pk, *(p.user_id for p in participants)])
+        except Exception as e:
+            for result in results:
+                if result['status'] == 'created':
+                    del result['expense_id']
+                    result.update(status="failed", error=str(e))
+
+        return results
+
+
+class UsersAllExpensesView(AsyncAPIView):
+    """
+    UsersAllExpensesView: API to fetch all expenses for the authenticated user. 
+
+    This view returns two types of data:
+    1. **i_owe**: Expenses where the user is a participant and owes money to others.
+    2. **others_owe_me**: Expenses where the user is the creator, and other participants owe them money.
+
+    Authentication:
+    - Requires Bearer JWT Token (Authorization header).
+
+    Input:
+    - No input payload required (GET request).
+
+    Query Parameters:
+    - `limit` (int, optional): Page size of each list. Defaults to `EXPENSE_PAGE_SIZE`, capped at `EXPENSE_MAX_PAGE_SIZE`.
+    - `cursor` (str, optional): The `next` value of the previous page.
+
+    Output:
+    - Both lists are ordered by (`created_at`, `expense_id`) and paginated independently with one cursor.
+    - **next** (str or null): Opaque cursor of the following page, `null` once both lists are exhausted.
+    - **i_owe** (list): A list of expenses where the user owes others.
+        - `description` (str): A description of the expense.
+        - `amount` (float): The amount the user owes.
+        - `split_method` (str): The method used to split the expense ('equal', 'exact', or 'percentage').
+        - `created_by` (str): The email of the user who created the expense.
+        - `status` (str): The payment status of the user's share ('pending' or 'settled').
+        - `created_at` (str): The timestamp when the expense was created.
+
+    - **others_owe_me** (list): A list of expenses where others owe the user.
+        - `expense_id` (UUID): The unique ID of the expense.
+        - `description` (str): A description of the expense.
+        - `amount` (float): The total expense amount.
+        - `split_method` (str): The method used to split the expense.
+        - `created_at` (str): The timestamp when the expense was created.
+        - `participants` (list): A list of participants who owe the user.
+            - `user_id` (UUID): The unique ID of the participant.
+            - `user_email` (str): The email of the participant.
+            - `amount` (float): The amount the participant owes.
+            - `status` (str): The payment status of the participant's share ('pending' or 'settled').
+
+    Example Output:
+    ```json
+    {
+        "i_owe": [
+            {
+                "description": "Dinner at Restaurant",
+                "amount": 1200.0,
+                "split_method": "equal",
+                "created_by": "john.doe@example.com",
+                "status": "pending",
+                "created_at": "2024-10-21T14:34:22Z"
+            }
+        ],
+        "others_owe_me": [
+            {
+                "expense_id": "eb663885-6a16-48cb-84ba-d2ecd9c6269d",
+                "description": "Birthday Party Expenses",
+                "amount": 6000.0,
+                "split_method": "percentage",
+                "created_at": "2024-10-22T15:01:05.483699Z",
+                "participants": [
+                    {
+                        "user_id": "eac58f88-5b89-42b7-aa23-c4a0200663ea",
+                        "user_email": "infonikhil@gmail.com",
+                        "amount": 2400.0,
+                        "status": "settled"
+                    },
+                    {
+                        "user_id": "a060c415-4870-4d7e-a580-3b34afab8c22",
+                        "user_email": "NitSharma@gmail.com",
+                        "amount": 1800.0,
+                        "status": "pending"
+                    }
+                ]
+            }
+        ],
+        "next": "eyJpX293ZSI6WyIyMDI0LTEwLTIxVDE0OjM0OjIyKzAwOjAwIiwiZWI2NjM4ODUtNmExNi00OGNiLTg0YmEtZDJlY2Q5YzYyNjlkIl19"
+    }
+    ```
+
+    Streaming:
+    - With `Accept: application/x-ndjson` the whole of both lists (after `cursor`, if given; `limit` is ignored) is
+      streamed as one JSON record per line, `i_owe` first, each record tagged with its list. The rows are read from a
+      database cursor in chunks of `STREAM_CHUNK_SIZE`, so memory does not grow with the history, and the stream is
+      gzipped on the fly when `Accept-Encoding` allows it.
+    ```
+    {"list":"i_owe","description":"Dinner at Restaurant","amount":1200.0,"split_method":"equal",...}
+    {"list":"others_owe_me","expense_id":"eb663885-6a16-48cb-84ba-d2ecd9c6269d","description":"Birthday Party Expenses",...}
+    ```
+
+    Queries:
+    - A page costs a constant number of queries: the created expenses, their other participants
+      (prefetched with their users) and the user's pending participations joined with expense and creator.
+    - Responses are cached per user and query string until one of the user's expenses changes
+      (`X-Cache: HIT|MISS` header), so a repeated request runs no query at all.
+    - Responses carry a strong `ETag` derived from the user's ledger version; a matching `If-None-Match`
+      is answered with an empty 304 before any expense is loaded.
+
+    Response Status Codes:
+    - **200 OK**: Successfully returns the list of expenses.
+    - **304 Not Modified**: `If-None-Match` matches the current `ETag`.
+    - **400 Bad Request**: Invalid `cursor` or `limit`.
+    - **500 Internal Server Error**: Returns an error message in case of an internal server issue.
+
+    Endpoint:
+    - GET /expense/users_expense/
+    """
+    permission_classes = [IsAuthenticated]
+
+    @cache.cache_per_user('users_expense')
+    @routers.reads_from_replica
+    async def get(self, request):
+        try:
+            limit = pagination.get_limit(request)
+            positions = pagination.decode_cursor(request, ('i_owe', 'others_owe_me'))
+
+            if streaming.wants_ndjson(request):
+                # The rows are read while the response streams, after get() has returned: bind the
+                # queries to the database chosen for this request now
+                return streaming.NDJSONResponse(request, self.stream_records(request.user, positions, routers.read_alias()))
+
+            next_positions = {}
+
+            # Fetch expenses where the user is the creator (others owe them)
+            others_owe_me = []
+            if 'others_owe_me' in positions:
+                created_expenses, next_positions['others_owe_me'] = await pagination.akeyset_page(
+                    self.created_expenses(request.user), positions['others_owe_me'], limit
+                )
+                others_owe_me = await self.with_participants(created_expenses, request.user)
+
+            # Fetch expenses where the user is a participant (they owe others)
+            participant_expenses = []
+            if 'i_owe' in positions:
+                participant_expenses, next_positions['i_owe'] = await pagination.akeyset_page(
+                    self.pending_participations(request.user), positions['i_owe'], limit
+                )
+            i_owe = [self.i_owe_record(row) for row in participant_expenses]
+
+            # Return the response with the i_owe and others_owe_me data
+            return APIResponse({
+                'i_owe': i_owe,
+                'others_owe_me': others_owe_me,
+                'next': pagination.encode_cursor(next_positions)
+            }, status=status.HTTP_200_OK)
+
+        except pagination.InvalidCursor as e:
+            return APIResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return APIResponse({'error': f'{e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    # The lists are built from `values()` projections of the columns they show: no model instance
+    # is created, and the rows of `created_expenses` already are the `others_owe_me` records
+
+    def created_expenses(self, user):
+        """The expenses `user` created, as `others_owe_me` records without their participants."""
+        return Expense.objects.filter(created_by=user).values('expense_id', 'description', 'amount', 'split_method', 'created_at')
+
+    async def with_participants(self, expenses, user, using=None):
+        """Add to the `created_expenses` rows their participants other than `user`, fetched with one query."""
+        rows = [row async for row in self.participant_rows(expenses, user, using)] if expenses else []
+        return self.attach_participants(expenses, rows)
+
+    def participant_rows(self, expenses, user, using=None):
+        return (
+            Participant.objects.using(using)
+            .filter(expense_id__in=[expense['expense_id'] for expense in expenses])
+            .exclude(user=user)
+            .values_list('expense_id', 'user_id', 'user__email', 'amount', 'status')
+        )
+
+    def attach_participants(self, expenses, rows):
+        participants = defaultdict(list)
+        for expense_id, user_id, user_email, amount, part_status in rows:
+            participants[expense_id].append({
+                'user_id': user_id,
+                'user_email': user_email,
+                'amount': amount,
+                'status': part_status
+            })
+        for expense in expenses:
+            expense['participants'] = participants[expense['expense_id']]
+        return expenses
+
+    def pending_participations(self, user):
+        """The pending participations of `user`, joined with their expense and its creator."""
+        return Participant.objects.filter(user=user, status='pending').values(
+            'expense_id', 'expense__description', 'amount', 'expense__split_method', 'expense__created_by__email', 'status', 'created_at'
+        )
+
+    def i_owe_record(self, row):
+        return {
+            'description': row['expense__description'],
+            'amount': row['amount'],
+            'split_method': row['expense__split_method'],
+            'created_by': row['expense__created_by__email'],
+            'status': row['status'],
+            'created_at': row['created_at']
+        }
+
+    def stream_records(self, user, positions, using):
+        """Yield every record of both lists after `positions`, read from `using`, tagged with its `list`."""
+        if 'i_owe' in positions:
+            participations = pagination.after(
+                self.pending_participations(user).using(using), positions['i_owe']
+            )
+            for row in participations.iterator(chunk_size=settings.STREAM_CHUNK_SIZE):
+                yield {'list': 'i_owe', **self.i_owe_record(row)}
+        if 'others_owe_me' in positions:
+            expenses = pagination.after(self.created_expenses(user).using(using), positions['others_owe_me'])
+            batch = []
+            for expense in expenses.iterator(chunk_size=settings.STREAM_CHUNK_SIZE):
+                batch.append(expense)
+                if len(batch) == settings.STREAM_CHUNK_SIZE:
+                    for record in self.attach_participants(batch, self.participant_rows(batch, user, using)):
+                        yield {'list': 'others_owe_me', **record}
+                    batch = []
+            if batch:
+                for record in self.attach_participants(batch, self.participant_rows(batch, user, using)):
+                    yield {'list': 'others_owe_me', **record}
+
+
+class OweView(AsyncAPIView):
+    """
+    OweView: API to fetch total amounts the user owes to others and others owe to the user.
+    
+    This view returns two types of data:
+    1. **people_i_owe**: A list of people to whom the user owes money.
+    2. **people_owe_me**: A list of people who owe money to the user.
+
+    Authentication:
+    - Requires Bearer JWT Token (Authorization header).
+
+    Input:
+    - No input payload required (GET request).
+
+    Output:
+    - **people_i_owe** (list): A list of people the user owes.
+        - `name` (str): The name of the person to whom the user owes money.
+        - `total_owe` (float): The total amount the user owes this person.
+        
+    - **people_owe_me** (list): A list of people who owe the user.
+        - `name` (str): The name of the person who owes the user money.
+        - `total_owed_to_me` (float): The total amount this person owes the user.
+
+    Example Output:
+    ```json
+    {
+        "people_i_owe": [
+            {
+                "name": "John Doe",
+                "total_owe": 4500.0
+            }
+        ],
+        "people_owe_me": [
+            {
+                "name": "Nit Sharma",
+                "total_owed_to_me": 11250.0
+            },
+            {
+                "name": "Patil Nikhil",
+                "total_owed_to_me": 10650.0
+            },
+            {
+                "name": "info Nikhil",
+                "total_owed_to_me": 6450.0
+            }
+        ]
+    }
+    ```
+
+    Notes:
+    - The totals are read from the `Balance` ledger, which holds one row per pair of users, with what one owes
+      the other net of the debts in the opposite direction. It is updated whenever an expense is created or
+      settled, so the cost does not grow with the expense history. A user is listed on one side at most.
+    - Responses are cached per user until one of the user's expenses changes (`X-Cache: HIT|MISS` header).
+
+    Response Status Codes:
+    - **200 OK**: Successfully returns the list of people the user owes and those who owe the user.
+    - **500 Internal Server Error**: Returns an error message in case of an internal server issue.
+
+   Endpoint:
+    - GET /expense/owe_list/
+    """
+    permission_classes = [IsAuthenticated]
+
+    @cache.cache_per_user('owe_list')
+    @routers.reads_from_replica
+    async def get(self, request):
+        try:
+            user = request.user
+
+            # Get list of all people the user owes money to (one ledger row per creditor)
+            people_i_owe = [person async for person in Balance.objects.filter(
+                debtor=user, amount__gt=0
+            ).values('creditor__name', 'amount')]
+
+            # Get list of all people who owe money to the user (one ledger row per debtor)
+            people_owe_me = [person async for person in Balance.objects.filter(
+                creditor=user, amount__gt=0
+            ).values('debtor__name', 'amount')]
+
+            # Format the results to include names
+            data = {
+                "people_i_owe": [
+                    {
+                        "name": person['creditor__name'],
+                        "total_owe": person['amount']
+                    }
+                    for person in people_i_owe
+                ],
+                "people_owe_me": [
+                    {
+                        "name": person['debtor__name'],
+                        "total_owed_to_me": person['amount']
+                    }
+                    for person in people_owe_me
+                ],
+            }
+
+            return APIResponse(data, status=status.HTTP_200_OK)
+        except Exception as e:
+            return APIResponse({'error': f'{e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class SettlementPlanView(APIView):
+    """
+    SettlementPlanView: API to get the fewest payments that settle all pending debts of a circle of users.
+
+    Instead of settling every expense separately, the pending balances between the users are netted and
+    turned into a minimal list of transfers (greedy min-cash-flow: the largest debtor always pays the
+    largest creditor).
+
+    Authentication:
+    - Requires Bearer JWT Token (Authorization header).
+
+    Query Parameters:
+    - `user_ids` (str, optional): Comma separated user IDs forming the circle (e.g. a group of friends).
+      The authenticated user is always included. Only debts between members of the circle are considered.
+      Defaults to the authenticated user and everyone they have a pending balance with.
+
+    Example Output:
+    ```json
+    {
+        "users": 3,
+        "transfers": [
+            {
+                "from_user_id": "eac58f88-5b89-42b7-aa23-c4a0200663ea",
+                "from_name": "info Nikhil",
+                "to_user_id": "49b0b4d2-8753-4af8-b510-afcd885101d9",
+                "to_name": "Nikhil Patil",
+                "amount": 4500.0
+            }
+        ]
+    }
+    ```
+
+    Response Status Codes:
+    - **200 OK**: Successfully returns the settlement plan.
+    - **400 Bad Request**: `user_ids` contains an invalid user ID.
+    - **500 Internal Server Error**: Returns an error message in case of an internal server issue.
+
+    Endpoint:
+    - GET /expense/settlement_plan/
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            user_ids = request.query_params.get('user_ids')
+            if user_ids:
+                try:
+                    circle = {uuid.UUID(user_id.strip()) for user_id in user_ids.split(',') if user_id.strip()}
+                except ValueError:
+                    return Response({"error": "user_ids must be a comma separated list of user IDs."}, status=status.HTTP_400_BAD_REQUEST)
+            else:
+                circle = settlement.counterparties(request.user.pk)
+            circle.add(request.user.pk)
+
+            net = settlement.net_balances(circle)
+            transfers = settlement.minimal_transfers(net)
+            names = dict(User.objects.filter(id__in=list(net)).values_list('id', 'name'))
+
+            return Response({
+                "users": len(net),
+                "transfers": [
+                    {
+                        "from_user_id": debtor_id,
+                        "from_name": names.get(debtor_id),
+                        "to_user_id": creditor_id,
+                        "to_name": names.get(creditor_id),
+                        "amount": cents / 100
+                    }
+                    for debtor_id, creditor_id, cents in transfers
+                ]
+            }, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({'error': f'{e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class SettleExpenseView(APIView):
+    """
+    SettleExpenseView: API to settle payments for an expense. The user who created the expense can mark participants as "settled".
+
+    Task:
+    - Allows settling payments for participants of an expense.
+
+    Authentication:
+    - Requires Bearer JWT Token (Authorization header).
+
+    Input:
+    - **user_ids** (optional): List of user IDs to mark as settled for the expense.
+    ```json
+    {
+        "user_ids": ["eac58f88-5b89-42b7-aa23-c4a0200663ea", "04ed7b18-2c74-437e-90be-87820c74932d"]
+    }
+    ```
+    - If `user_ids` is not provided, all pending participants will be settled.
+
+    URL Path:
+    - The API expects the `expense_id` to be passed in the URL path, representing the specific expense to settle participants for.
+
+    Example Request:
+    - POST /expenses/settle_expense/{expense_id}/
+    
+    Output:
+    - If `user_ids` are provided:
+    ```json
+    {
+        "message": "Expense settled for users: John Doe, Jane Doe.",
+        "not_settled": "Some users could not be settled: ['user_id1', 'user_id2']"
+    }
+    ```
+    - If `user_ids` is not provided, the response will settle all pending participants:
+    ```json
+    {
+        "message": "All participants have been settled."
+    }
+    ```
+
+    Response Status Codes:
+    - **200 OK**: Successfully settled participants.
+    - **400 Bad Request**: Invalid input (e.g., `user_ids` is not a list or no pending participants).
+    - **404 Not Found**: Expense not found or the user is not the creator of the expense.
+    - **500 Internal Server Error**: Internal server error with an error message.
+
+    Example Output:
+    - When no users are settled:
+    ```json
+    {
+        "message": "No participants were settled.",
+        "not_settled": "Some users could not be settled: ['eac58f88-5b89-42b7-aa23-c4a0200663ea', '04ed7b18-2c74-437e-90be-87820c74932d']"
+    }
+    ```
+
+    Example Usage:
+    - POST /expenses/settle_expense/{expense_id}/
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, expense_id):
+        try:
+            user_ids = request.data.get("user_ids", None)  # List of user_ids to settle
+
+            try:
+                # Fetch the expense by ID and ensure it's created by the current user
+                expense = Expense.objects.get(expense_id=expense_id, created_by=request.user)
+
+                if user_ids:
+                    # Validate that user_ids is a list
+                    if not isinstance(user_ids, list):
+                        return Response({"error": "user_ids must be a list."}, status=status.HTTP_400_BAD_REQUEST)
+                    
+                    # Ids that are not UUIDs cannot match a participant
+                    requested = []
+                    for user_id in user_ids:
+                        try:
+                            requested.append((user_id, uuid.UUID(str(user_id))))
+                        except ValueError:
+                            requested.append((user_id, None))
+
+                    # Settle the listed participants with one conditional UPDATE
+                    with transaction.atomic():
+                        pending = Participant.objects.filter(
+                            expense=expense, user_id__in={key for _, key in requested if key}, status="pending"
+                        )
+                        rows = list(pending.select_for_update(of=('self',)).values_list('pk', 'user_id', 'user__name', 'amount'))
+                        if rows:
+                            Participant.objects.filter(pk__in=[pk for pk, _, _, _ in rows], status="pending").update(status="settled")
+
+                        settled_debts = [(user_id, expense.created_by_id, amount) for _, user_id, _, amount in rows]
+                        ledger.settle_debts(settled_debts)
+                        ledger.settle_group_debts((expense.group_id, *debt) for debt in settled_debts)
+                        rollups.settle_shares((user_id, expense.created_at, expense.split_method, amount) for user_id, _, amount in settled_debts)
+                        if settled_debts:
+                            cache.invalidate_users([request.user.pk, *(user_id for user_id, _, _ in settled_debts)])
+
+                    # Report in the order of the request; ids that were not found or already settled are not settled
+                    names = {user_id: name for _, user_id, name, _ in rows}
+                    not_found_users = [user_id for user_id, key in requested if key not in names]
+                    settled_users = [names.pop(key) for _, key in requested if key in names]
+
+                    if settled_users:
+                        message = f"Expense settled for users: {', '.join(settled_users)}."
+                    else:
+                        message = "No participants were settled."
+
+                    # Include users that were not found or already settled
+                    if not_found_users:
+                        return Response({
+                            "message": message,
+                            "not_settled": f"Some users could not be settled: {not_found_users}"
+                        }, status=status.HTTP_200_OK)
+
+                    return Response({"message": message}, status=status.HTTP_200_OK)
+
+                else:
+                    # Settle all participants if no user_ids are provided
+                    participants = Participant.objects.filter(expense=expense, status="pending")
+                    
+                    with transaction.atomic():
+                        settled_debts = [
+                            (user_id, expense.created_by_id, amount)
+                            for user_id, amount in participants.select_for_update().values_list('user_id', 'amount')
+                        ]
+                        if not settled_debts:
+                            return Response({"message": "No pending payments to settle for this expense."}, status=status.HTTP_400_BAD_REQUEST)
+
+                        participants.update(status="settled")
+                        ledger.settle_debts(settled_debts)
+                        ledger.settle_group_debts((expense.group_id, *debt) for debt in settled_debts)
+                        rollups.settle_shares((user_id, expense.created_at, expense.split_method, amount) for user_id, _, amount in settled_debts)
+                        cache.invalidate_users([request.user.pk, *(user_id for user_id, _, _ in settled_debts)])
+                    
+                    return Response({"message": "All participants have been settled."}, status=status.HTTP_200_OK)
+
+            except Expense.DoesNotExist:
+                return Response({"error": "Expense not found or you are not the creator."}, status=status.HTTP_404_NOT_FOUND)
+            except Exception as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({'error': f'{e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class SettleWithUserView(APIView):
+    """
+    SettleWithUserView: API to settle everything another user owes the authenticated user, across all expenses.
+
+    Task:
+    - Marks every pending participation of the given user in expenses created by the authenticated user as "settled",
+      in one transaction. This is what happens when someone pays back their whole debt at once.
+
+    Authentication:
+    - Requires Bearer JWT Token (Authorization header).
+
+    URL Path:
+    - The API expects the `user_id` of the user who paid back.
+
+    Output:
+    ```json
+    {
+        "message": "Settled 3 expenses with John Doe.",
+        "amount": "45.00",
+        "expense_ids": [
+            "eb663885-6a16-48cb-84ba-d2ecd9c6269d",
+            "0ee1cc1d-6b36-4f5e-a6e3-1e3aef04a1f2",
+            "5c0e0c6a-14e1-4ec6-9f3a-3c2f1f0c5a77"
+        ]
+    }
+    ```
+
+    Notes:
+    - As with `settle_expense/`, only the creditor can mark debts as settled: debts the authenticated user owes
+      the other user are left untouched.
+    - The whole settlement is one locking SELECT and one UPDATE, whatever the number of expenses.
+
+    Response Status Codes:
+    - **200 OK**: Successfully settled the pending participations.
+    - **400 Bad Request**: The user does not owe the authenticated user anything.
+    - **404 Not Found**: User not found.
+    - **500 Internal Server Error**: Internal server error with an error message.
+
+    Example Usage:
+    - POST /expense/settle_with_user/{user_id}/
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, user_id):
+        try:
+            try:
+                debtor = User.objects.get(id=user_id)
+            except User.DoesNotExist:
+                return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+
+            with transaction.atomic():
+                pending = Participant.objects.filter(expense__created_by=request.user, user=debtor, status="pending")
+                rows = list(pending.select_for_update(of=('self',)).values_list(
+                    'pk', 'expense_id', 'expense__group_id', 'amount', 'expense__created_at', 'expense__split_method'
+                ))
+                if not rows:
+                    return Response({"message": f"{debtor.name} has no pending payments to settle."}, status=status.HTTP_400_BAD_REQUEST)
+
+                Participant.objects.filter(pk__in=[pk for pk, *_ in rows], status="pending").update(status="settled")
+                ledger.settle_debts([(debtor.pk, request.user.pk, amount) for _, _, _, amount, _, _ in rows])
+                ledger.settle_group_debts([(group_id, debtor.pk, request.user.pk, amount) for _, _, group_id, amount, _, _ in rows])
+                rollups.settle_shares([(debtor.pk, created_at, split_method, amount) for _, _, _, amount, created_at, split_method in rows])
+                cache.invalidate_users([request.user.pk, debtor.pk])
+
+            return Response({
+                "message": f"Settled {len(rows)} expenses with {debtor.name}.",
+                "amount": str(sum(ledger.to_decimal(amount) for _, _, _, amount, _, _ in rows)),
+                "expense_ids": [expense_id for _, expense_id, *_ in rows],
+            }, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({'error': f'{e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class BalanceSheetView(AsyncAPIView):
+    """
+    BalanceSheetView: API to retrieve the balance sheet of expenses for the authenticated user.
+
+    Task:
+    - Retrieves all expenses the user has participated in, including their share and the total expense amount.
+
+    Authentication:
+    - Requires Bearer JWT Token (Authorization header).
+
+    Query Parameters:
+    - `limit` (int, optional): Page size. Defaults to `EXPENSE_PAGE_SIZE`, capped at `EXPENSE_MAX_PAGE_SIZE`.
+    - `cursor` (str, optional): The `next` value of the previous page.
+
+    Output:
+    - Returns a JSON response with a page of the user's individual expenses, ordered by (`created_at`, `expense_id`),
+      and the opaque `next` cursor of the following page (`null` on the last page).
+    ```json
+    {
+        "individual_expenses": [
+            {
+                "expense_id": "eb663885-6a16-48cb-84ba-d2ecd9c6269d",
+                "description": "Birthday Party Expenses",
+                "user_share": "2400.00",
+                "total_amount": "6000.00",
+                "split_method": "percentage",
+                "created_by": "John Doe",
+                "created_at": "2024-10-22T15:01:05.483Z",
+                "status": "settled"
+            },
+            ...
+        ],
+        "next": "eyJpbmRpdmlkdWFsX2V4cGVuc2VzIjpbIjIwMjQtMTAtMjJUMTU6MDE6MDUuNDgzNjk5KzAwOjAwIiwiZWI2NjM4ODUtNmExNi00OGNiLTg0YmEtZDJlY2Q5YzYyNjlkIl19"
+    }
+    ```
+
+    Streaming:
+    - With `Accept: application/x-ndjson` every individual expense (after `cursor`, if given; `limit` is ignored)
+      is streamed as one JSON record per line, read from a database cursor in chunks of `STREAM_CHUNK_SIZE`, so
+      memory does not grow with the history. The stream is gzipped on the fly when `Accept-Encoding` allows it.
+
+    Notes:
+    - Responses are cached per user and query string until one of the user's expenses changes (`X-Cache: HIT|MISS` header).
+      Streams are not cached.
+    - Responses carry a strong `ETag` derived from the user's ledger version; a matching `If-None-Match`
+      is answered with an empty 304 before any expense is loaded.
+
+    Response Status Codes:
+    - **200 OK**: Successfully retrieved individual expenses.
+    - **304 Not Modified**: `If-None-Match` matches the current `ETag`.
+    - **400 Bad Request**: Invalid `cursor` or `limit`.
+
+    Example Usage:
+    - GET /expense/balance_sheet/
+    """
+    permission_classes = [IsAuthenticated]
+
+    @cache.cache_per_user('balance_sheet')
+    @routers.reads_from_replica
+    async def get(self, request):
+        try:
+            limit = pagination.get_limit(request)
+            positions = pagination.decode_cursor(request, ('individual_expenses',))
+        except pagination.InvalidCursor as e:
+            return APIResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if streaming.wants_ndjson(request):
+            # Bound to this request's database now, like users_expense
+            return streaming.NDJSONResponse(
+                request, self.stream_records(request.user, positions, routers.read_alias()), dumps=renderers.django_dumps
+            )
+
+        participated_expenses = []
+        next_positions = {}
+        if 'individual_expenses' in positions:
+            participated_expenses, next_positions['individual_expenses'] = await pagination.akeyset_page(
+                self.participations(request.user), positions['individual_expenses'], limit
+            )
+
+        # Process participated expenses (user as participant)
+        individual_expenses_data = [self.record(row) for row in participated_expenses]
+
+        # Amounts as strings and timestamps to the millisecond, as balance_sheet/ has always sent them
+        return APIResponse({
+            'individual_expenses': individual_expenses_data,
+            'next': pagination.encode_cursor(next_positions),
+        }, dumps=renderers.django_dumps)
+
+    def participations(self, user):
+        """The participations of `user`, projected on the columns of the balance sheet (no model instances)."""
+        return Participant.objects.filter(user=user).values(
+            'expense_id', 'expense__description', 'amount', 'expense__amount', 'expense__split_method',
+            'expense__created_by__name', 'created_at', 'status'
+        )
+
+    def record(self, row):
+        return {
+            'expense_id': row['expense_id'],
+            'description': row['expense__description'],
+            'user_share': row['amount'],
+            'total_amount': row['expense__amount'],  # Total expense amount
+            'split_method': row['expense__split_method'],
+            'created_by': row['expense__created_by__name'],
+            'created_at': row['created_at'],
+            'status': row['status'],  # User's status (pending/settled)
+        }
+
+    def stream_records(self, user, positions, using):
+        """Yield the record of every participation after `positions`, read from `using`."""
+        if 'individual_expenses' not in positions:
+            return
+        participations = pagination.after(
+            self.participations(user).using(using), positions['individual_expenses']
+        )
+        for row in participations.iterator(chunk_size=settings.STREAM_CHUNK_SIZE):
+            yield self.record(row)
+
+
+class Echo:
+    """File-like object whose write() returns the value, so csv.writer rows can be yielded one at a time."""
+
+    def write(self, value):
+        return value
+
+
+class BalanceSheetDownloadView(APIView):
+    """
+    BalanceSheetDownloadView: API to download the balance sheet of expenses for the authenticated user in CSV format.
+
+    Task:
+    - Allows users to download a CSV file containing their expenses along with their shares and statuses.
+
+    Authentication:
+    - Requires Bearer JWT Token (Authorization header).
+
+    Output:
+    - Returns a CSV file containing the following headers:
+    - `Expense ID`, `Description`, `Amount`, `Split Method`, `Created By`, `Created At`, `Your Share`, `Status`.
+
+    Example Response:
+    - The response will prompt a download of a CSV file named "balance_sheet.csv".
+    - The file is streamed from a single query iterated in chunks of `EXPENSE_EXPORT_CHUNK_SIZE` rows, so memory
+      use does not grow with the history and the first bytes are sent right away.
+    - For very long histories, prefer a background export (`POST balance-sheet/exports/`), which does not tie
+      up a request for the whole download.
+
+    Example Usage:
+    - GET /expense/balance_sheet/download/
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @routers.reads_from_replica
+    def get(self, request):
+        # The rows are read while the response streams, after get() has returned: bind the
+        # query to the database chosen for this request now
+        rows = exports.balance_sheet_rows(request.user, routers.read_alias()).iterator(chunk_size=settings.EXPENSE_EXPORT_CHUNK_SIZE)
+
+        # Stream the CSV row by row, so memory stays flat and the header goes out immediately
+        response = StreamingHttpResponse(self.stream_csv(rows), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="balance_sheet.csv"'
+        return response
+
+    def stream_csv(self, rows):
+        """Yield the CSV lines of the balance sheet: the header row, then one row per expense."""
+        writer = csv.writer(Echo())
+        yield writer.writerow(exports.HEADER)
+        for row in rows:
+            yield writer.writerow(exports.csv_row(row))
+
+
+def export_job_data(job):
+    """The status of an export job as returned by the export endpoints."""
+    return {
+        "job_id": job.job_id,
+        "status": job.status,
+        "progress": job.progress,
+        "rows_written": job.rows_written,
+        "total_rows": job.total_rows,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+        "duration_seconds": job.duration.total_seconds() if job.duration is not None else None,
+        "error": job.error or None,
+        "download_url": f"/expense/balance-sheet/exports/{job.job_id}/download/" if job.status == 'done' else None,
+    }
+
+
+class ExportJobsView(APIView):
+    """
+    ExportJobsView: API to start a background export of the authenticated user's balance sheet.
+
+    Authentication:
+    - Requires Bearer JWT Token (Authorization header).
+
+    Output:
+    - The queued job; poll `balance-sheet/exports/<job_id>/` until its status is `done`, then
+      download the file from its `download_url`.
+    ```json
+    {
+        "job_id": "3f2b8c1a-7d4e-4b9a-8e6f-1c2d3e4f5a6b",
+        "status": "queued",
+        "progress": null,
+        "rows_written": 0,
+        "total_rows": null,
+        "created_at": "2026-10-18T09:30:00.000000Z",
+        "finished_at": null,
+        "duration_seconds": null,
+        "error": null,
+        "download_url": null
+    }
+    ```
+
+    Notes:
+    - The file has the same rows as `balance-sheet/download/`, but is written by a worker thread of the
+      server (see exports.py), so a long history does not tie up a request for the whole download.
+    - A user has at most one unfinished export: while one is queued or running, it is returned with 409.
+    - Finished exports are deleted after `EXPORT_RETENTION` by the `purge_exports` command.
+
+    Response Status Codes:
+    - **202 Accepted**: The export was queued.
+    - **409 Conflict**: An export of the user is already queued or running; returns that job.
+    - **500 Internal Server Error**: Returns an error message in case of an internal server issue.
+
+    Endpoint:
+    - POST /expense/balance-sheet/exports/
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            with transaction.atomic():
+                unfinished = ExportJob.objects.filter(user=request.user, status__in=['queued', 'running']).first()
+                if unfinished is not None:
+                    return Response(export_job_data(unfinished), status=status.HTTP_409_CONFLICT)
+                job = ExportJob.objects.create(user=request.user)
+                exports.enqueue(job)
+            return Response(export_job_data(job), status=status.HTTP_202_ACCEPTED)
+
+        except Exception as e:
+            return Response({'error': f'{e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ExportJobView(APIView):
+    """
+    ExportJobView: API to poll the status and progress of one of the authenticated user's exports.
+
+    Authentication:
+    - Requires Bearer JWT Token (Authorization header).
+
+    Output:
+    - The job, as returned by `POST balance-sheet/exports/`. `status` is `queued`, `running`, `done` or
+      `failed` (with an `error`); `progress` is the percentage of `total_rows` written so far, null
+      until the rows are counted; `download_url` is set once the job is done.
+
+    Response Status Codes:
+    - **200 OK**: Returns the job.
+    - **404 Not Found**: No export with this ID for the user.
+    - **500 Internal Server Error**: Returns an error message in case of an internal server issue.
+
+    Endpoint:
+    - GET /expense/balance-sheet/exports/<job_id>/
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        try:
+            job = ExportJob.objects.get(pk=job_id, user=request.user)
+            return Response(export_job_data(job), status=status.HTTP_200_OK)
+
+        except ExportJob.DoesNotExist:
+            return Response({"error": "Export not found."}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response({'error': f'{e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ExportJobDownloadView(APIView):
+    """
+    ExportJobDownloadView: API to download the CSV file of a finished export.
+
+    Authentication:
+    - Requires Bearer JWT Token (Authorization header).
+
+    Output:
+    - The file, named "balance_sheet.csv", with the columns of `balance-sheet/download/`.
+
+    Response Status Codes:
+    - **200 OK**: Returns the file.
+    - **404 Not Found**: No export with this ID for the user, or its file has expired.
+    - **409 Conflict**: The export is not done.
+    - **500 Internal Server Error**: Returns an error message in case of an internal server issue.
+
+    Endpoint:
+    - GET /expense/balance-sheet/exports/<job_id>/download/
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        try:
+            job = ExportJob.objects.get(pk=job_id, user=request.user)
+            if job.status != 'done':
+                return Response({"error": f"The export is {job.status}."}, status=status.HTTP_409_CONFLICT)
+            return FileResponse(open(exports.file_path(job), 'rb'), as_attachment=True, filename='balance_sheet.csv', content_type='text/csv')
+
+        except (ExportJob.DoesNotExist, FileNotFoundError):
+            return Response({"error": "Export not found."}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response({'error': f'{e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def get_member_ids(data):
+    """
+    The `member_ids` of a group request as a set of user UUIDs, checked to exist with one query.
+
+    Raises `InvalidMembers` when `member_ids` is not a list of user ids and
+    `User.DoesNotExist` when one of them is not a user.
+    """
+    member_ids = data.get('member_ids', [])
+    if not isinstance(member_ids, list):
+        raise InvalidMembers("member_ids must be a list of user ids.")
+    try:
+        member_ids = {uuid.UUID(str(user_id)) for user_id in member_ids}
+    except ValueError:
+        raise InvalidMembers("member_ids must be a list of user ids.")
+    if member_ids and User.objects.filter(id__in=member_ids).count() != len(member_ids):
+        raise User.DoesNotExist
+    return member_ids
+
+
+class GroupView(APIView):
+    """
+    GroupView: API to create a group of users who share expenses, e.g. a flat or a trip.
+
+    Authentication:
+    - Requires Bearer JWT Token (Authorization header).
+
+    Input:
+    - `name` (str): The name of the group.
+    - `member_ids` (list, optional): The user IDs of the other members. The creator is always a member.
+    ```json
+    {
+        "name": "Flat 4B",
+        "member_ids": ["eac58f88-5b89-42b7-aa23-c4a0200663ea", "04ed7b18-2c74-437e-90be-87820c74932d"]
+    }
+    ```
+
+    Output:
+    ```json
+    {
+        "message": "Group created successfully.",
+        "group_id": "9b1f3c2e-5d4a-4e8b-a1c7-2f6d8e0b4a93"
+    }
+    ```
+
+    Notes:
+    - Expenses are added to the group by passing its `group_id` to `create_expense/` or `import_expenses/`.
+
+    Response Status Codes:
+    - **201 Created**: The group was created.
+    - **400 Bad Request**: `name` is missing or `member_ids` is not a list of user IDs.
+    - **404 Not Found**: One or more members not found.
+
+    Endpoint:
+    - POST /expense/groups/
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            name = request.data.get('name')
+            if not name:
+                return Response({"error": "Missing required fields."}, status=status.HTTP_400_BAD_REQUEST)
+            member_ids = get_member_ids(request.data)
+
+            with transaction.atomic():
+                group = Group.objects.create(name=name, created_by=request.user)
+                GroupMember.objects.bulk_create(
+                    [GroupMember(group=group, user_id=user_id) for user_id in {request.user.pk, *member_ids}]
+                )
+
+            return Response({"message": "Group created successfully.", "group_id": group.group_id}, status=status.HTTP_201_CREATED)
+
+        except InvalidMembers as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except User.DoesNotExist:
+            return Response({"error": "One or more members not found."}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class GroupMembersView(APIView):
+    """
+    GroupMembersView: API to add members to a group. Any member of the group can add members.
+
+    Authentication:
+    - Requires Bearer JWT Token (Authorization header).
+
+    Input:
+    - `member_ids` (list): The user IDs to add. Users who already are members are skipped.
+    ```json
+    {
+        "member_ids": ["a060c415-4870-4d7e-a580-3b34afab8c22"]
+    }
+    ```
+
+    Output:
+    ```json
+    {
+        "message": "Added 1 members."
+    }
+    ```
+
+    Response Status Codes:
+    - **200 OK**: The members were added.
+    - **400 Bad Request**: `member_ids` is not a list of user IDs.
+    - **404 Not Found**: The group is not found, the user is not one of its members, or a member is not found.
+
+    Endpoint:
+    - POST /expense/groups/{group_id}/members/
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, group_id):
+        try:
+            if not GroupMember.objects.filter(group_id=group_id, user=request.user).exists():
+                return Response({"error": "Group not found."}, status=status.HTTP_404_NOT_FOUND)
+            member_ids = get_member_ids(request.data)
+            if not member_ids:
+                return Response({"error": "member_ids must be a non-empty list of user ids."}, status=status.HTTP_400_BAD_REQUEST)
+
+            with transaction.atomic():
+                existing = set(GroupMember.objects.filter(group_id=group_id, user_id__in=member_ids).values_list('user_id', flat=True))
+                added = GroupMember.objects.bulk_create(
+                    [GroupMember(group_id=group_id, user_id=user_id) for user_id in member_ids if user_id not in existing]
+                )
+
+            return Response({"message": f"Added {len(added)} members."}, status=status.HTTP_200_OK)
+
+        except InvalidMembers as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except User.DoesNotExist:
+            return Response({"error": "One or more members not found."}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class GroupSummaryView(AsyncAPIView):
+    """
+    GroupSummaryView: API to read the net balance of every member of a group.
+
+    Authentication:
+    - Requires Bearer JWT Token (Authorization header) of a member of the group.
+
+    Output:
+    - `net_balance` is what the other members owe the member minus what the member owes them, over the
+      pending payments of the group's expenses: positive for members who are owed money, negative for members
+      who owe money. The net balances of a group always add up to zero.
+    ```json
+    {
+        "group_id": "9b1f3c2e-5d4a-4e8b-a1c7-2f6d8e0b4a93",
+        "name": "Flat 4B",
+        "members": [
+            {"user_id": "eac58f88-5b89-42b7-aa23-c4a0200663ea", "name": "John Doe", "email": "john@example.com", "net_balance": 150.0},
+            {"user_id": "04ed7b18-2c74-437e-90be-87820c74932d", "name": "Jane Doe", "email": "jane@example.com", "net_balance": -50.0},
+            {"user_id": "a060c415-4870-4d7e-a580-3b34afab8c22", "name": "Nit Sharma", "email": "nit@example.com", "net_balance": -100.0}
+        ]
+    }
+    ```
+
+    Notes:
+    - The net balances are stored on the memberships and updated whenever an expense of the group is created or
+      settled, so the summary is one query over the members, whatever the number of expenses in the group.
+    - Members are listed from the most owed to the most owing.
+
+    Response Status Codes:
+    - **200 OK**: Successfully returns the summary.
+    - **404 Not Found**: The group is not found or the user is not one of its members.
+    - **500 Internal Server Error**: Returns an error message in case of an internal server issue.
+
+    Endpoint:
+    - GET /expense/groups/{group_id}/summary/
+    """
+    permission_classes = [IsAuthenticated]
+
+    @routers.reads_from_replica
+    async def get(self, request, group_id):
+        try:
+            members = [member async for member in GroupMember.objects.filter(group_id=group_id).select_related('group', 'user')]
+            if not any(member.user_id == request.user.pk for member in members):
+                return APIResponse({"error": "Group not found."}, status=status.HTTP_404_NOT_FOUND)
+
+            members.sort(key=lambda member: (-member.net_balance, member.user.name))
+            return APIResponse({
+                "group_id": group_id,
+                "name": members[0].group.name,
+                "members": [
+                    {
+                        "user_id": member.user_id,
+                        "name": member.user.name,
+                        "email": member.user.email,
+                        "net_balance": member.net_balance
+                    }
+                    for member in members
+                ]
+            }, status=status.HTTP_200_OK)
+        except Exception as e:
+            return APIResponse({'error': f'{e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AnalyticsView(AsyncAPIView):
+    """
+    AnalyticsView: API to fetch the authenticated user's monthly totals over a range of months.
+
+    Authentication:
+    - Requires Bearer JWT Token (Authorization header).
+
+    Query Parameters:
+    - `from` (str, optional): First month, `YYYY-MM`. Defaults to 11 months before `to`.
+    - `to` (str, optional): Last month, `YYYY-MM`. Defaults to the current month.
+    The range may span at most `ANALYTICS_MAX_MONTHS` months.
+
+    Output:
+    - One entry per month of the range, oldest first, months without expenses included:
+        - `spent`: the user's shares of the expenses they take part in, their own share included.
+        - `owed`: the user's shares of other users' expenses that are still pending.
+        - `settled`: the user's shares of other users' expenses that are settled.
+        - `expenses`: the number of expenses the user takes part in.
+        - `by_split_method`: the same totals per split method.
+    - `totals`: the same totals over the whole range.
+    An expense counts towards the month it was created in, also once it is settled.
+    ```json
+    {
+        "from": "2026-09",
+        "to": "2026-10",
+        "months": [
+            {"month": "2026-09", "spent": 0, "owed": 0, "settled": 0, "expenses": 0, "by_split_method": {}},
+            {
+                "month": "2026-10", "spent": 150.0, "owed": 50.0, "settled": 25.0, "expenses": 3,
+                "by_split_method": {
+                    "equal": {"spent": 100.0, "owed": 50.0, "settled": 0.0, "expenses": 2},
+                    "exact": {"spent": 50.0, "owed": 0.0, "settled": 25.0, "expenses": 1}
+                }
+            }
+        ],
+        "totals": {"spent": 150.0, "owed": 50.0, "settled": 25.0, "expenses": 3}
+    }
+    ```
+
+    Notes:
+    - The totals are read from the `MonthlyRollup` table, which holds one row per user, month and split method and is
+      updated whenever an expense is created or settled, so the cost grows with the number of months, not expenses.
+    - Responses are cached per user until one of the user's expenses changes (`X-Cache: HIT|MISS` header).
+
+    Response Status Codes:
+    - **200 OK**: Successfully returns the monthly totals.
+    - **400 Bad Request**: `from` or `to` is not a `YYYY-MM` month, or the range is invalid or too long.
+    - **500 Internal Server Error**: Returns an error message in case of an internal server issue.
+
+    Endpoint:
+    - GET /expense/analytics/?from=2026-01&to=2026-10
+    """
+    permission_classes = [IsAuthenticated]
+
+    @cache.cache_per_user('analytics')
+    @routers.reads_from_replica
+    async def get(self, request):
+        try:
+            try:
+                last = self.parse_month(request.GET.get('to')) or rollups.month_of(timezone.now())
+                first = self.parse_month(request.GET.get('from')) or rollups.months_between(
+                    last.replace(year=last.year - 1), last
+                )[1]
+            except ValueError:
+                return APIResponse({"error": "from and to must be months formatted as YYYY-MM."}, status=status.HTTP_400_BAD_REQUEST)
+            months = rollups.months_between(first, last)
+            if not months:
+                return APIResponse({"error": "from must not be after to."}, status=status.HTTP_400_BAD_REQUEST)
+            if len(months) > settings.ANALYTICS_MAX_MONTHS:
+                return APIResponse({"error": f"The range cannot span more than {settings.ANALYTICS_MAX_MONTHS} months."}, status=status.HTTP_400_BAD_REQUEST)
+
+            by_month = {month: {} for month in months}
+            async for rollup in MonthlyRollup.objects.filter(user=request.user, month__range=(first, last)).values('month', 'split_method', *rollups.FIELDS):
+                by_month[rollup.pop('month')][rollup.pop('split_method')] = rollup
+
+            totals = self.add_up(by_month.values())
+            return APIResponse({
+                "from": f"{first:%Y-%m}",
+                "to": f"{last:%Y-%m}",
+                "months": [
+                    {"month": f"{month:%Y-%m}", **self.add_up([by_split_method]), "by_split_method": by_split_method}
+                    for month, by_split_method in by_month.items()
+                ],
+                "totals": totals,
+            }, status=status.HTTP_200_OK)
+        except Exception as e:
+            return APIResponse({'error': f'{e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def parse_month(self, value):
+        """The first day of a `YYYY-MM` month, or None when `value` is empty. Raises ValueError."""
+        if not value:
+            return None
+        return datetime.strptime(value, '%Y-%m').date()
+
+    def add_up(self, months):
+        """Add up the per split method totals of `months`."""
+        totals = {field: 0 for field in rollups.FIELDS}
+        for by_split_method in months:
+            for rollup in by_split_method.values():
+                for field in rollups.FIELDS:
+                    totals[field] += rollup[field]
+        return totals
+
+
+class CacheStatsView(APIView):
+    """
+    CacheStatsView: API to read the hit/miss counters of the per-user response cache.
+
+    The cached endpoints (`balance_sheet/`, `owe_list/`, `users_expense/`) are keyed by user and ledger version;
+    the counters are kept per server process.
+
+    Authentication:
+    - Requires Bearer JWT Token (Authorization header) of a staff user.
+
+    Example Output:
+    ```json
+    {
+        "hits": 120,
+        "misses": 30,
+        "not_modified": 45,
+        "hit_rate": 0.8
+    }
+    ```
+
+    `not_modified` counts the conditional requests answered with a 304.
+
+    Example Usage:
+    - GET /expense/cache_stats/
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache.stats(), status=status.HTTP_200_OK)
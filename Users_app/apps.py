@@ -1,6 +1,9 @@
-from django.apps import AppConfig
-
-
-class UsersAppConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'Users_app'
+from django.apps import AppConfig
+
+
+class UsersAppConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'Users_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,115 @@
+"""
+JWT authentication that serves the user from an in-process cache.
+
+`JWTAuthentication` loads the user row on every request. `CachedJWTAuthentication` keeps the
+users it loaded in a bounded LRU cache with a TTL, keyed by the token's user id claim, so a
+request only hits the database when the user is not cached or the entry expired.
+
+Saving or deleting a user drops its entry in this process (see signals.py), so deactivating a
+user takes effect right away here; other worker processes pick the change up after at most
+`AUTH_USER_CACHE_TTL` seconds. Changes made with `QuerySet.update()` send no signal and are also
+only seen after the TTL.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+class UserCache:
+    """Thread-safe LRU cache of at most `maxsize` users, each kept for `ttl` seconds."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires <= time.monotonic():
+                del self._users[user_id]
+                return None
+            self._users.move_to_end(user_id)
+            return user
+
+    def set(self, user_id, user):
+        with self._lock:
+            self._users[user_id] = (user, time.monotonic() + self.ttl)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.maxsize:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+    def __len__(self):
+        return len(self._users)
+
+
+user_cache = UserCache(settings.AUTH_USER_CACHE_SIZE, settings.AUTH_USER_CACHE_TTL)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """`JWTAuthentication` that looks the user up in `user_cache` before the database."""
+
+    def get_user(self, validated_token):
+        key = self._user_key(validated_token)
+        user = user_cache.get(key)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(key, user)
+        else:
+            self._check(user, validated_token)
+        # Every request gets its own instance, so a view changing request.user cannot leak into another request
+        return copy.copy(user)
+
+    async def aauthenticate(self, request):
+        """Async version of `authenticate`; only a cache miss leaves the event loop."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        key = self._user_key(validated_token)
+        user = user_cache.get(key)
+        if user is None:
+            user = await sync_to_async(JWTAuthentication.get_user)(self, validated_token)
+            user_cache.set(key, user)
+        else:
+            self._check(user, validated_token)
+        return copy.copy(user), validated_token
+
+    def _user_key(self, validated_token):
+        try:
+            return str(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def _check(self, user, validated_token):
+        # Same checks as JWTAuthentication.get_user, on the cached row
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
@@ -0,0 +1,58 @@
+"""
+Password hashing on a bounded thread pool.
+
+PBKDF2 is deliberately slow (hundreds of milliseconds per hash). Run inline it blocks the
+ASGI event loop, or the single thread Django runs sync views on under ASGI, for the whole
+hash, so a burst of logins stalls every other request. These coroutines run the hashers on
+at most `PASSWORD_HASHING_WORKERS` threads instead; hashlib releases the GIL while hashing.
+
+At most `PASSWORD_HASHING_QUEUE_SIZE` hashes may wait for a worker. Past that `PoolFull` is
+raised and the caller answers 503, so a login storm queues in bounded memory and fails fast
+instead of piling up minutes of work.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASHING_WORKERS, thread_name_prefix='password-hashing')
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+class PoolFull(Exception):
+    """Raised when `PASSWORD_HASHING_QUEUE_SIZE` hashes are already waiting for a worker."""
+
+
+async def _run(func, *args):
+    global _pending
+    with _pending_lock:
+        if _pending >= settings.PASSWORD_HASHING_WORKERS + settings.PASSWORD_HASHING_QUEUE_SIZE:
+            raise PoolFull("Too many logins in progress, try again later.")
+        _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+    finally:
+        with _pending_lock:
+            _pending -= 1
+
+
+async def make_password(raw_password):
+    """`django.contrib.auth.hashers.make_password` on the hashing pool."""
+    return await _run(hashers.make_password, raw_password)
+
+
+async def check_password(user, raw_password):
+    """
+    Like `user.acheck_password`, with the hashing on the pool.
+
+    When the stored hash uses an outdated hasher or work factor, the password is rehashed
+    with the current one and saved, transparently for the user.
+    """
+    is_correct, must_update = await _run(hashers.verify_password, raw_password, user.password)
+    if is_correct and must_update:
+        user.password = await make_password(raw_password)
+        await user.asave(update_fields=['password'])
+    return is_correct
@@ -1,45 +1,54 @@
-from rest_framework import serializers
-from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.tokens import RefreshToken
-
-User = get_user_model()
-
-class UserSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = User
-        fields = ('id', 'email', 'name', 'mobile_number', 'password')
-        extra_kwargs = {'password': {'write_only': True}, 'id': {'read_only': True}}
-
-    def create(self, validated_data):
-        user = User(
-            email=validated_data['email'],
-            name=validated_data['name'],
-            mobile_number=validated_data['mobile_number']
-        )
-        user.set_password(validated_data['password'])
-        user.save()
-        return user
-
-class LoginSerializer(serializers.Serializer):
-    email = serializers.EmailField()
-    password = serializers.CharField(write_only=True)
-
-    def validate(self, data):
-        email = data.get("email")
-        password = data.get("password")
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
-            raise serializers.ValidationError("User not found.")
-
-        if not user.check_password(password):
-            raise serializers.ValidationError("Incorrect password.")
-
-        return data
-
-    def get_tokens(self, user):
-        refresh = RefreshToken.for_user(user)
-        return {
-            'refresh': str(refresh),
-            'access': str(refresh.access_token),
-        }
+from rest_framework import serializers
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import hashing
+
+User = get_user_model()
+
+class UserSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ('id', 'email', 'name', 'mobile_number', 'password')
+        extra_kwargs = {'password': {'write_only': True}, 'id': {'read_only': True}}
+
+    def create(self, validated_data):
+        user = User(
+            email=validated_data['email'],
+            name=validated_data['name'],
+            mobile_number=validated_data['mobile_number']
+        )
+        # SignupView hashes the password off the request thread and passes the result as encoded_password
+        if 'encoded_password' in validated_data:
+            user.password = validated_data['encoded_password']
+        else:
+            user.set_password(validated_data['password'])
+        user.save()
+        return user
+
+class LoginSerializer(serializers.Serializer):
+    email = serializers.EmailField()
+    password = serializers.CharField(write_only=True)
+
+    async def authenticate(self):
+        """
+        Return the user matching the validated credentials, with a single user lookup.
+
+        The password is checked on the hashing pool and rehashed if the hasher settings changed.
+        """
+        try:
+            user = await User.objects.aget(email=self.validated_data['email'])
+        except User.DoesNotExist:
+            raise serializers.ValidationError("User not found.")
+
+        if not await hashing.check_password(user, self.validated_data['password']):
+            raise serializers.ValidationError("Incorrect password.")
+
+        return user
+
+    def get_tokens(self, user):
+        refresh = RefreshToken.for_user(user)
+        return {
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+        }
@@ -1,3 +1,131 @@
-from django.test import TestCase
-
-# Create your tests here.
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import hashing
+from .authentication import UserCache, user_cache
+
+User = get_user_model()
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='owner@example.com', name='owner', mobile_number='0000000000', password='!')
+
+    def setUp(self):
+        user_cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.url = f'/expense/get_user/{self.user.email}/'
+
+    def test_user_is_loaded_once(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_deactivated_user_is_rejected_right_away(self):
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_deleted_user_is_rejected_right_away(self):
+        self.client.get(self.url)
+        self.user.delete()
+
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_invalid_token_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+class UserCacheTests(TestCase):
+    def test_least_recently_used_user_is_evicted(self):
+        cache = UserCache(maxsize=2, ttl=60)
+        cache.set('a', 'A')
+        cache.set('b', 'B')
+        cache.get('a')
+        cache.set('c', 'C')
+
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), ('A', None, 'C'))
+        self.assertEqual(len(cache), 2)
+
+    def test_entries_expire(self):
+        cache = UserCache(maxsize=2, ttl=60)
+        with mock.patch('Users_app.authentication.time.monotonic', return_value=1000):
+            cache.set('a', 'A')
+        with mock.patch('Users_app.authentication.time.monotonic', return_value=1059):
+            self.assertEqual(cache.get('a'), 'A')
+        with mock.patch('Users_app.authentication.time.monotonic', return_value=1060):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+
+def user_lookups(ctx):
+    table = User._meta.db_table
+    return [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT') and f'FROM "{table}"' in q['sql']]
+
+
+@override_settings(PASSWORD_HASHERS=[
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+])
+class LoginTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='owner@example.com', password='secret', name='owner', mobile_number='0000000000')
+
+    def login(self, password='secret', email='owner@example.com'):
+        return APIClient().post('/users/login/', {'email': email, 'password': password}, format='json')
+
+    def test_login(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user_id'], str(self.user.id))
+        self.assertEqual(set(response.json()['tokens']), {'access', 'refresh'})
+        self.assertEqual(len(user_lookups(ctx)), 1)
+
+    def test_wrong_credentials(self):
+        self.assertEqual(self.login(password='wrong').json(), {'non_field_errors': ['Incorrect password.']})
+        self.assertEqual(self.login(email='nobody@example.com').json(), {'non_field_errors': ['User not found.']})
+        self.assertEqual(APIClient().post('/users/login/', {'email': 'owner'}, format='json').status_code, 400)
+
+    def test_outdated_hash_is_upgraded_on_login(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password('secret', hasher='pbkdf2_sha256'))
+
+        self.assertEqual(self.login().status_code, 200)
+
+        self.user.refresh_from_db()
+        self.assertEqual(identify_hasher(self.user.password).algorithm, 'md5')
+        self.assertEqual(self.login().status_code, 200)
+
+    def test_saturated_pool_answers_503(self):
+        busy = settings.PASSWORD_HASHING_WORKERS + settings.PASSWORD_HASHING_QUEUE_SIZE
+        with mock.patch.object(hashing, '_pending', busy):
+            response = self.login()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_signup(self):
+        payload = {'email': 'new@example.com', 'name': 'new', 'mobile_number': '0000000000', 'password': 'secret'}
+        with CaptureQueriesContext(connection) as ctx:
+            response = APIClient().post('/users/signup/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(user_lookups(ctx)), 1)
+        self.assertTrue(User.objects.get(email='new@example.com').check_password('secret'))
+
+        response = APIClient().post('/users/signup/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.json())
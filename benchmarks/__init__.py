@@ -0,0 +1,10 @@
+"""
+Benchmarks for the split_up API.
+
+Every benchmark is a module that can be run from the project root, e.g.
+
+    python -m benchmarks.create_expense
+
+Benchmarks run against a throw-away test database, so the development
+database (db.sqlite3) is never touched.
+"""
@@ -0,0 +1,113 @@
+"""
+Analytics latency as a user's expense history grows.
+
+    python -m benchmarks.analytics [--users 20] [--expenses 1000,10000,100000] [--months 24]
+
+Expenses spread evenly over the last `--months` months are loaded with raw executemany calls
+(every expense shared by the creator and up to 5 other users), the monthly rollups are rebuilt
+from them, and then the GET analytics/ endpoint, which reads the rollups, is timed against
+aggregating the user's participant rows by month and split method, the cost of the same
+report without them. The response cache is cleared before every request.
+"""
+import argparse
+import random
+import time
+import uuid
+from datetime import timedelta
+
+from benchmarks.utils import setup_django, test_database, make_users, api_client, timed, print_table
+
+
+def load_expenses(users, count, months, per_expense=5, seed=0):
+    from django.db import connection
+    from django.utils import timezone
+    from Expences_app.models import Expense, Participant
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    quote = connection.ops.quote_name
+
+    expense_rows = []
+    participant_rows = []
+    for _ in range(count):
+        creator, *others = rng.sample(users, per_expense + 1)
+        expense_id = uuid.uuid4().hex
+        share = rng.randint(100, 10000)
+        created_at = connection.ops.adapt_datetimefield_value(now - timedelta(days=rng.uniform(0, months * 30)))
+        split_method = rng.choice(['equal', 'exact', 'percentage'])
+        expense_rows.append((expense_id, 'bench', f'{share * (len(others) + 1) / 100:.2f}', split_method, creator.id.hex, created_at, created_at))
+        participant_rows.append((creator.id.hex, expense_id, f'{share / 100:.2f}', 'settled', created_at))
+        participant_rows.extend((user.id.hex, expense_id, f'{share / 100:.2f}', rng.choice(['pending', 'settled']), created_at) for user in others)
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {quote(Expense._meta.db_table)} (expense_id, description, amount, split_method, created_by_id, created_at, updated_at) '
+            'VALUES (%s, %s, %s, %s, %s, %s, %s)',
+            expense_rows
+        )
+        cursor.executemany(
+            f'INSERT INTO {quote(Participant._meta.db_table)} (user_id, expense_id, amount, status, created_at) VALUES (%s, %s, %s, %s, %s)',
+            participant_rows
+        )
+
+
+def aggregate(user):
+    from django.db.models import Case, Count, DateField, F, Sum, Value, When
+    from django.db.models.functions import TruncMonth
+    from Expences_app.models import Participant
+
+    return list(
+        Participant.objects.filter(user=user)
+        .annotate(
+            month=TruncMonth('expense__created_at', output_field=DateField()),
+            own=Case(When(user=F('expense__created_by'), then=Value(True)), default=Value(False)),
+        )
+        .values_list('month', 'expense__split_method', 'own', 'status')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+
+
+def run(user_count, sizes, months):
+    from django.db import transaction
+    from Expences_app import cache, rollups
+
+    rows = []
+    for size in sizes:
+        users = make_users(user_count, prefix=f'bench{size}-')
+        start = time.perf_counter()
+        load_expenses(users, size, months)
+        with transaction.atomic():
+            rollups.rebuild_rollups()
+        print(f'loaded {size} expenses in {time.perf_counter() - start:.1f}s')
+
+        client = api_client(users[0])
+
+        def analytics():
+            cache.get_cache().clear()
+            response = client.get('/expense/analytics/')
+            assert response.status_code == 200, response.content
+            return response.json()['months']
+
+        seconds, result = timed(analytics, repeat=5)
+        rows.append((size, 'GET analytics/', f'{seconds * 1000:.2f}', len(result)))
+        seconds, result = timed(lambda: aggregate(users[0]), repeat=3)
+        rows.append((size, 'aggregate participant rows', f'{seconds * 1000:.2f}', len({month for month, *_ in result})))
+
+    print_table(['expenses', 'step', 'median_ms', 'months'], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--expenses', default='1000,10000,100000')
+    parser.add_argument('--months', type=int, default=24)
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database():
+        run(args.users, [int(size) for size in args.expenses.split(',')], args.months)
+
+
+if __name__ == '__main__':
+    main()
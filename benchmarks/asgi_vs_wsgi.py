@@ -0,0 +1,216 @@
+"""
+Requests/second, latency and memory per connection of a read endpoint under WSGI and ASGI.
+
+    python -m benchmarks.asgi_vs_wsgi [--clients 1000] [--duration 10] [--url /expense/owe_list/]
+
+Both servers run in a subprocess on the same benchmark database:
+
+- wsgi: Django's threaded WSGI server (one thread per connection, like any thread-per-request
+        WSGI deployment);
+- asgi: uvicorn serving split_up/asgi.py (one event loop, the async read views run on it).
+        Requires `pip install uvicorn`.
+
+`--clients` keep-alive connections are opened at once and each sends the request back to back
+for `--duration` seconds, authenticated with a JWT. Memory per connection is the growth of the
+server's resident set size between idle and the peak under load, divided by the number of clients.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.utils import setup_django, test_database, make_users, api_client, print_table
+
+
+def serve(kind, port):
+    """Run the `kind` server on `port` (entry point of the server subprocess)."""
+    if kind == 'asgi':
+        import uvicorn
+        uvicorn.run('split_up.asgi:application', host='127.0.0.1', port=port, log_level='warning', backlog=4096)
+        return
+
+    import django
+    django.setup()
+    from django.core.servers.basehttp import WSGIServer, run
+    from django.core.wsgi import get_wsgi_application
+
+    class Server(WSGIServer):
+        request_queue_size = 4096
+
+    run('127.0.0.1', port, get_wsgi_application(), threading=True, server_cls=Server)
+
+
+def rss_kib(pid):
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length = 0
+    keep_alive = True
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'connection' and value.strip().lower() == b'close':
+            keep_alive = False
+    await reader.readexactly(length)
+    return status, keep_alive
+
+
+async def load(port, url, token, clients, duration, on_sample):
+    request = (
+        f'GET {url} HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: Bearer {token}\r\n\r\n'
+    ).encode()
+    latencies = []
+    errors = 0
+    connected = asyncio.Event()
+    ready = 0
+
+    async def client():
+        nonlocal errors, ready
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        ready += 1
+        if ready == clients:
+            connected.set()
+        await connected.wait()
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                writer.write(request)
+                status, keep_alive = await read_response(reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                errors += 1
+                keep_alive = False
+            else:
+                if status == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+            if not keep_alive:
+                writer.close()
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.close()
+
+    async def sample():
+        await connected.wait()
+        while True:
+            on_sample()
+            await asyncio.sleep(0.2)
+
+    sampler = asyncio.create_task(sample())
+    await asyncio.gather(*(client() for _ in range(clients)))
+    sampler.cancel()
+    return latencies, errors
+
+
+def bench(kind, database, url, token, clients, duration):
+    port = free_port()
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='benchmarks.server_settings', SPLIT_UP_BENCH_DB=database)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.asgi_vs_wsgi', '--serve', kind, '--port', str(port)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(('127.0.0.1', port)).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError(f'the {kind} server did not start')
+
+        # one warm-up request loads the code and fills the caches
+        asyncio.run(load(port, url, token, 1, 0.5, lambda: None))
+        idle = rss_kib(server.pid)
+        peak = idle
+
+        def on_sample():
+            nonlocal peak
+            peak = max(peak, rss_kib(server.pid))
+
+        start = time.perf_counter()
+        latencies, errors = asyncio.run(load(port, url, token, clients, duration, on_sample))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    return (
+        kind,
+        clients,
+        len(latencies),
+        errors,
+        f'{len(latencies) / elapsed:.0f}',
+        f'{statistics.median(latencies) * 1000:.1f}' if latencies else '-',
+        f'{quantiles[98] * 1000:.1f}',
+        f'{idle / 1024:.0f}',
+        f'{peak / 1024:.0f}',
+        f'{(peak - idle) / clients:.1f}',
+    )
+
+
+def run(clients, duration, url):
+    from django.db import connection
+
+    user, friend = make_users(2)
+    client = api_client(user)
+    for i in range(20):
+        client.post('/expense/create_expense/', {
+            'description': f'bench {i}', 'amount': 30, 'split_method': 'equal',
+            'participants_data': {str(friend.id): 0}, 'self': True,
+        }, format='json')
+
+    from rest_framework_simplejwt.tokens import AccessToken
+    token = str(AccessToken.for_user(user))
+    database = connection.settings_dict['NAME']
+
+    rows = [bench(kind, database, url, token, clients, duration) for kind in ('wsgi', 'asgi')]
+    print_table(['server', 'clients', 'requests', 'errors', 'requests_per_s', 'p50_ms', 'p99_ms',
+                 'idle_mib', 'peak_mib', 'kib_per_connection'], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=10, help='seconds')
+    parser.add_argument('--url', default='/expense/owe_list/')
+    parser.add_argument('--serve', choices=['wsgi', 'asgi'], help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # every client needs a socket here and in the server
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, min(hard, 2 * args.clients + 256)), hard))
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    setup_django()
+    with test_database(on_disk=True):
+        run(args.clients, args.duration, args.url)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Throughput of JWT authenticated requests with and without the cached user lookup.
+
+    python -m benchmarks.auth [--requests 2000] [--users 50] [--repeat 5]
+
+Every request is a GET /expense/get_user/<email>/ (one query of its own) sent with a real
+Bearer token by one of `--users` clients in turn, once with simplejwt's JWTAuthentication
+and once with CachedJWTAuthentication.
+"""
+import argparse
+
+from benchmarks.utils import setup_django, test_database, make_users, api_client, timed, print_table
+
+
+def run(requests, users, repeat):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.views import APIView
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+
+    from Users_app.authentication import CachedJWTAuthentication, user_cache
+
+    members = make_users(users)
+    clients = [(api_client(user, jwt=True), f'/expense/get_user/{user.email}/') for user in members]
+
+    rows = []
+    default = APIView.authentication_classes
+    try:
+        for authentication in (JWTAuthentication, CachedJWTAuthentication):
+            APIView.authentication_classes = [authentication]
+            user_cache.clear()
+
+            def send():
+                connection.queries_log.clear()
+                with CaptureQueriesContext(connection) as ctx:
+                    for i in range(requests):
+                        client, url = clients[i % len(clients)]
+                        response = client.get(url)
+                        assert response.status_code == 200, response.content
+                return len(ctx.captured_queries)
+
+            seconds, queries = timed(send, repeat)
+            rows.append((authentication.__name__, requests, f'{requests / seconds:.0f}',
+                         f'{seconds / requests * 1e6:.0f}', f'{queries / requests:.2f}'))
+    finally:
+        APIView.authentication_classes = default
+
+    print_table(['authentication', 'requests', 'requests_per_s', 'us_per_request', 'queries_per_request'], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database(on_disk=True):
+        run(args.requests, args.users, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
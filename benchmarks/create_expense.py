@@ -0,0 +1,67 @@
+"""
+Latency and query count of POST /expense/create_expense/ by group size.
+
+    python -m benchmarks.create_expense [--sizes 2,10,50,100,500,1000] [--repeat 5]
+"""
+import argparse
+
+from benchmarks.utils import setup_django, test_database, make_users, api_client, timed, print_table
+
+
+def run(sizes, repeat):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    rows = []
+    creator = make_users(1, prefix='creator')[0]
+    members = make_users(max(sizes))
+    client = api_client(creator)
+
+    for size in sizes:
+        participants = members[:size - 1]
+        payloads = {
+            'equal': {
+                'split_method': 'equal',
+                'participants_data': {str(u.id): 0 for u in participants},
+                'self': True,
+            },
+            'exact': {
+                'split_method': 'exact',
+                'participants_data': {str(u.id): 1 for u in participants},
+                'self_amount': 1,
+            },
+            'percentage': {
+                'split_method': 'percentage',
+                'participants_data': {str(u.id): 0 for u in participants},
+                'self_percentage': 100,
+            },
+        }
+        for split_method, payload in payloads.items():
+            payload.update(description=f'bench {size}', amount=size)
+
+            def create():
+                with CaptureQueriesContext(connection) as ctx:
+                    response = client.post('/expense/create_expense/', payload, format='json')
+                assert response.status_code == 201, response.content
+                return len(ctx.captured_queries)
+
+            seconds, queries = timed(create, repeat)
+            rows.append((size, split_method, f'{seconds * 1000:.2f}', queries))
+
+    print_table(['participants', 'split_method', 'median_ms', 'queries'], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='2,10,50,100,500,1000')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(',')]
+
+    setup_django()
+    with test_database():
+        run(sizes, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+"""
+Deterministic synthetic data: users, groups and expenses with a realistic participant fan-out.
+
+    python -m benchmarks.datagen [--users 1000] [--expenses 100000] [--groups 100] [--seed 0]
+
+`generate` loads, for a given seed, always the same data:
+
+- `users` users, all with the password `PASSWORD` (hashed once and shared, hashing every user
+  would dominate the load time). Every user has a circle of friends, the `CIRCLE` users next to
+  them in the list, with whom they share their expenses;
+- `groups` groups of 3 to 12 friends, created by one of them;
+- `expenses` expenses spread over the last `months` months. The split method is equal, exact or
+  percentage in the proportions of `SPLIT_METHODS`, the number of other participants follows
+  `FANOUT` (mostly 1 to 3, a few large ones), amounts are log-normal around 40.00 and
+  `group_share` of the expenses belong to one of the creator's groups. Shares are computed by
+  the split engine (splits.py), like the endpoints do; the older an expense, the more of its
+  participants have settled.
+
+The rows are written with raw executemany calls, then the Balance ledger, the group net balances
+and the monthly rollups are rebuilt from them, so the derived tables are what the endpoints would
+have left. Only the timestamps depend on the current time.
+
+Run as a script, it loads the data into a throw-away test database and reports the load time.
+"""
+import argparse
+import math
+import random
+import time
+import uuid
+from collections import Counter, namedtuple
+from datetime import timedelta
+
+from benchmarks.utils import setup_django, test_database, print_table
+
+PASSWORD = 'bench-password'
+
+# Friends each user shares expenses with
+CIRCLE = 20
+
+# Relative frequency of each split method
+SPLIT_METHODS = {'equal': 60, 'exact': 25, 'percentage': 15}
+
+# Relative frequency of each number of other participants
+FANOUT = {1: 40, 2: 25, 3: 15, 4: 8, 5: 5, 6: 3, 8: 2, 12: 1, 20: 1}
+
+Dataset = namedtuple('Dataset', 'users groups expenses participants')
+
+
+def uuid_from(rng):
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def insert(model, columns, rows):
+    """Insert `rows` of values of the `columns` fields of `model` with one executemany call."""
+    from django.db import DEFAULT_DB_ALIAS, connections
+
+    connection = connections[DEFAULT_DB_ALIAS]
+    fields = [model._meta.get_field(column) for column in columns]
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {quote(model._meta.db_table)} ({", ".join(quote(field.column) for field in fields)}) '
+            f'VALUES ({", ".join(["%s"] * len(fields))})',
+            [[field.get_db_prep_save(value, connection) for field, value in zip(fields, row)] for row in rows]
+        )
+
+
+def make_users(rng, count):
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.hashers import make_password
+
+    User = get_user_model()
+    password = make_password(PASSWORD)
+    return User.objects.bulk_create([
+        User(id=uuid_from(rng), email=f'user{i}@example.com', name=f'User {i}', mobile_number=f'{9000000000 + i}', password=password)
+        for i in range(count)
+    ], batch_size=1000)
+
+
+def friends(users, index, rng, count):
+    """`count` distinct friends of users[index], from their circle."""
+    circle = min(CIRCLE, len(users) - 1)
+    return [users[(index + offset) % len(users)] for offset in rng.sample(range(1, circle + 1), min(count, circle))]
+
+
+def make_groups(rng, users, count):
+    """Create `count` groups of friends; returns [(group_id, [member, ...])]."""
+    from Expences_app.models import Group, GroupMember
+
+    groups = []
+    for i in range(count):
+        index = rng.randrange(len(users))
+        members = [users[index]] + friends(users, index, rng, rng.randint(2, 11))
+        groups.append((uuid_from(rng), members))
+    Group.objects.bulk_create([
+        Group(group_id=group_id, name=f'Group {i}', created_by=members[0]) for i, (group_id, members) in enumerate(groups)
+    ])
+    GroupMember.objects.bulk_create(
+        [GroupMember(group_id=group_id, user=member) for group_id, members in groups for member in members],
+        batch_size=1000
+    )
+    return groups
+
+
+def partition(rng, total, count):
+    """Cut `total` into `count` random non-negative integers adding up to it."""
+    cuts = sorted(rng.randint(0, total) for _ in range(count - 1))
+    return [b - a for a, b in zip([0] + cuts, cuts + [total])]
+
+
+def split_expense(rng, method, total, count):
+    """
+    The shares in cents, and the percentages, of an expense between the creator and `count` others.
+
+    Returns (shares, percentages, self_included); when `self_included` the first share is the creator's.
+    """
+    from Expences_app import splits
+
+    if method == splits.EQUAL:
+        self_included = rng.random() < 0.7
+        shares = splits.split(method, total, count + self_included)
+        return shares, [splits.percentage_of(share, total) for share in shares], self_included
+    if method == splits.EXACT:
+        shares = splits.split(method, total, partition(rng, total, count + 1))
+        return shares, [splits.percentage_of(share, total) for share in shares], True
+    basis_points = partition(rng, splits.HUNDRED_PERCENT, count + 1)
+    return splits.split(method, total, basis_points), [splits.from_cents(points) for points in basis_points], True
+
+
+def make_expenses(rng, users, groups, count, months, group_share, now):
+    from Expences_app import splits
+    from Expences_app.models import Expense, Participant
+
+    methods, method_weights = zip(*SPLIT_METHODS.items())
+    fanouts, fanout_weights = zip(*FANOUT.items())
+
+    participants = 0
+    for start in range(0, count, 10000):
+        expense_rows = []
+        participant_rows = []
+        for i in range(start, min(count, start + 10000)):
+            method = rng.choices(methods, method_weights)[0]
+            fanout = rng.choices(fanouts, fanout_weights)[0]
+            if groups and rng.random() < group_share:
+                group_id, members = rng.choice(groups)
+                creator, *others = rng.sample(members, min(fanout, len(members) - 1) + 1)
+            else:
+                group_id = None
+                index = rng.randrange(len(users))
+                creator, others = users[index], friends(users, index, rng, fanout)
+
+            total = max(100, int(rng.lognormvariate(math.log(4000), 0.9)))
+            shares, percentages, self_included = split_expense(rng, method, total, len(others))
+            age = rng.random()
+            created_at = now - timedelta(days=age * months * 30)
+            expense_id = uuid_from(rng)
+            expense_rows.append((expense_id, f'Expense {i}', splits.from_cents(total), method, creator.pk, group_id, created_at, created_at))
+
+            owners = ([creator] if self_included else []) + others
+            for position, (user, share, percentage) in enumerate(zip(owners, shares, percentages)):
+                own = self_included and position == 0
+                settled = own or rng.random() < age * 0.8
+                participant_rows.append((user.pk, expense_id, splits.from_cents(share), percentage, 'settled' if settled else 'pending', created_at))
+
+        insert(Expense, ['expense_id', 'description', 'amount', 'split_method', 'created_by', 'group', 'created_at', 'updated_at'], expense_rows)
+        insert(Participant, ['user', 'expense', 'amount', 'percentage', 'status', 'created_at'], participant_rows)
+        participants += len(participant_rows)
+    return participants
+
+
+def generate(users=1000, expenses=100000, groups=100, months=24, group_share=0.3, seed=0, now=None):
+    """Load the synthetic data set of `seed` into the default database and return a `Dataset`."""
+    from django.db import transaction
+    from django.utils import timezone
+    from Expences_app import ledger, rollups
+
+    rng = random.Random(seed)
+    with transaction.atomic():
+        user_rows = make_users(rng, users)
+        group_rows = make_groups(rng, user_rows, groups) if groups else []
+        participants = make_expenses(rng, user_rows, group_rows, expenses, months, group_share, now or timezone.now())
+        ledger.rebuild_balances()
+        ledger.rebuild_group_balances()
+        rollups.rebuild_rollups()
+    return Dataset(user_rows, group_rows, expenses, participants)
+
+
+def run(args):
+    from django.db.models import Count
+    from Expences_app.models import Balance, Expense, MonthlyRollup, Participant
+
+    start = time.perf_counter()
+    dataset = generate(args.users, args.expenses, args.groups, args.months, args.group_share, args.seed)
+    seconds = time.perf_counter() - start
+
+    print(f'loaded {dataset.expenses} expenses, {dataset.participants} participants in {seconds:.1f}s '
+          f'({(dataset.expenses + dataset.participants) / seconds:,.0f} rows/s)')
+    fanout = Counter(count for count in Expense.objects.annotate(count=Count('participants')).values_list('count', flat=True))
+    print_table(['table', 'rows'], [
+        ('users', len(dataset.users)),
+        ('groups', len(dataset.groups)),
+        ('expenses', Expense.objects.count()),
+        ('participants', Participant.objects.count()),
+        ('pending participants', Participant.objects.filter(status='pending').count()),
+        ('balances', Balance.objects.count()),
+        ('monthly rollups', MonthlyRollup.objects.count()),
+    ])
+    print()
+    print_table(['split_method', 'expenses'], sorted(Expense.objects.values_list('split_method').annotate(Count('pk')).order_by()))
+    print()
+    print_table(['participants', 'expenses'], sorted(fanout.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--expenses', type=int, default=100000)
+    parser.add_argument('--groups', type=int, default=100)
+    parser.add_argument('--months', type=int, default=24)
+    parser.add_argument('--group-share', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database():
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
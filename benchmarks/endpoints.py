@@ -0,0 +1,442 @@
+"""
+Latency, throughput and queries per request of every endpoint, on synthetic data, against a baseline.
+
+    python -m benchmarks.endpoints [--users 1000] [--expenses 20000] [--concurrency 8] [--requests 200]
+                                   [--only owe_list,login] [--save-baseline | --check] [--threshold 0.5]
+
+A data set is generated by benchmarks.datagen (the same seed gives the same data) in an on-disk
+test database, then every route of Expences_app/urls.py and Users_app/urls.py is driven in turn,
+in the order of ENDPOINTS, through Django's ASGI handler (AsyncClient) by `--concurrency`
+concurrent clients until `--requests` requests have been answered (`--hashing-requests` for
+signup/ and login/, which queue on the small password hashing pool). As under uvicorn with one
+worker, the async views interleave on the event loop and the sync views run one at a time in
+Django's sync thread. Requests are spread over the first `--active-users` users, authenticated
+with JWTs; the write endpoints each get rows of their own (pending expenses, balances, users
+without an export) so every request does real work.
+
+Queries per request are counted once per endpoint before the load, on a request served with
+every cache cleared, so a cached read endpoint reports the queries of a miss. Then every client
+sends one untimed warm-up request (but to signup/ and login/, which would only add hashing time).
+
+Reported per endpoint: p50/p95/p99 latency, requests/s, queries per request and errors (responses
+with another status than the expected one). --save-baseline writes the results and the run's
+settings to --baseline; --check compares the run with it and exits with status 1 when an endpoint
+regressed: errors, more queries than the baseline, a p95 latency above (1 + threshold) times the
+baseline's or a throughput below the baseline's divided by (1 + threshold). An endpoint slower than
+the baseline is measured again, up to --retries times, before it counts as a regression. Latencies
+depend on the machine: save the baseline on the machine that checks it.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from collections import namedtuple
+
+from benchmarks import datagen
+from benchmarks.utils import setup_django, test_database, print_table
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+SETTINGS = ('users', 'expenses', 'groups', 'seed', 'active_users', 'concurrency', 'requests', 'hashing_requests')
+
+# A request of an endpoint: `user` is the authenticated user (None for anonymous requests)
+Request = namedtuple('Request', 'user path data headers', defaults=(None, None))
+
+
+class Workload:
+    """The users and rows the requests are built from; the builders draw from `rng` so the requests are deterministic too."""
+
+    def __init__(self, dataset, active_users, seed):
+        from django.contrib.auth import get_user_model
+        from Expences_app.models import Balance, Participant
+
+        User = get_user_model()
+        self.rng = random.Random(seed)
+        self.users = dataset.users
+        self.active = dataset.users[:active_users]
+        self.index = {user.pk: i for i, user in enumerate(self.users)}
+        self.by_id = {user.pk: user for user in self.users}
+        self.groups = dataset.groups
+        self.staff = User.objects.create_user(email='staff@example.com', name='Staff', mobile_number='0000000000', password=None, is_staff=True)
+        self.tokens = {}
+
+        # The expenses with pending shares of half of the active users, for settle_expense/, and
+        # what the other half is owed, by whom, for settle_with_user/, so one does not settle the other's rows
+        self.pending_expenses = list(
+            Participant.objects.filter(status='pending', expense__created_by__in=[user.pk for user in self.active[::2]])
+            .values_list('expense__created_by_id', 'expense_id').distinct().order_by('expense_id')
+        )
+        self.balances = list(
+            Balance.objects.filter(creditor_id__in=[user.pk for user in self.active[1::2]], amount__gt=0)
+            .values_list('creditor_id', 'debtor_id').order_by('creditor_id', 'debtor_id')
+        )
+        self.jobs = []
+
+    def make_export_jobs(self):
+        """Run one balance sheet export per active user, for the export status and download endpoints."""
+        from Expences_app import exports
+        from Expences_app.models import ExportJob
+
+        for user in self.active:
+            job = ExportJob.objects.create(user=user)
+            exports.run(job.pk)
+            self.jobs.append((user, job.pk))
+
+    def user(self, i):
+        return self.active[i % len(self.active)]
+
+    def friends(self, user, count):
+        return datagen.friends(self.users, self.index[user.pk], self.rng, count)
+
+    def access_token(self, user):
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        if user.pk not in self.tokens:
+            self.tokens[user.pk] = str(AccessToken.for_user(user))
+        return self.tokens[user.pk]
+
+    def expense(self, user, i):
+        """The body of a new expense of `user` with 1 to 4 friends, split one of the three ways."""
+        from Expences_app import splits
+
+        others = self.friends(user, self.rng.randint(1, 4))
+        method = self.rng.choice([splits.EQUAL, splits.EXACT, splits.PERCENTAGE])
+        total = self.rng.randint(100, 100000)
+        data = {'description': f'Load {i}', 'amount': str(splits.from_cents(total)), 'split_method': method}
+        if method == splits.EQUAL:
+            data['participants_data'] = {str(other.pk): 0 for other in others}
+            data['self'] = True
+        else:
+            parts = datagen.partition(self.rng, total if method == splits.EXACT else splits.HUNDRED_PERCENT, len(others) + 1)
+            data['participants_data'] = {str(other.pk): str(splits.from_cents(part)) for other, part in zip(others, parts[1:])}
+            data['self_amount' if method == splits.EXACT else 'self_percentage'] = str(splits.from_cents(parts[0]))
+        return data
+
+
+def get_user(w, i):
+    return Request(w.user(i), f'/expense/get_user/{w.users[i * 7 % len(w.users)].email}/')
+
+
+def create_expense(w, i):
+    user = w.user(i)
+    return Request(user, '/expense/create_expense/', w.expense(user, i))
+
+
+def import_expenses(w, i):
+    user = w.user(i)
+    return Request(user, '/expense/import_expenses/', [w.expense(user, f'{i}.{n}') for n in range(10)])
+
+
+def read(path, headers=None):
+    return lambda w, i: Request(w.user(i), path, headers=headers)
+
+
+def settle_expense(w, i):
+    creator_id, expense_id = w.pending_expenses[i % len(w.pending_expenses)]
+    return Request(w.by_id[creator_id], f'/expense/settle_expense/{expense_id}/', {})
+
+
+def settle_with_user(w, i):
+    creditor_id, debtor_id = w.balances[i % len(w.balances)]
+    return Request(w.by_id[creditor_id], f'/expense/settle_with_user/{debtor_id}/', {})
+
+
+def start_export(w, i):
+    # Users without a job of their own, who would otherwise get a 409
+    return Request(w.users[(len(w.active) + i) % len(w.users)], '/expense/balance-sheet/exports/', {})
+
+
+def export_job(w, i):
+    user, job_id = w.jobs[i % len(w.jobs)]
+    return Request(user, f'/expense/balance-sheet/exports/{job_id}/')
+
+
+def download_export(w, i):
+    user, job_id = w.jobs[i % len(w.jobs)]
+    return Request(user, f'/expense/balance-sheet/exports/{job_id}/download/')
+
+
+def create_group(w, i):
+    user = w.user(i)
+    return Request(user, '/expense/groups/', {'name': f'Load {i}', 'member_ids': [str(friend.pk) for friend in w.friends(user, 3)]})
+
+
+def add_members(w, i):
+    group_id, members = w.groups[i % len(w.groups)]
+    return Request(members[0], f'/expense/groups/{group_id}/members/', {'member_ids': [str(friend.pk) for friend in w.friends(members[0], 2)]})
+
+
+def group_summary(w, i):
+    group_id, members = w.groups[i % len(w.groups)]
+    return Request(members[i % len(members)], f'/expense/groups/{group_id}/summary/')
+
+
+def cache_stats(w, i):
+    return Request(w.staff, '/expense/cache_stats/')
+
+
+def signup(w, i):
+    return Request(None, '/users/signup/', {
+        'email': f'signup{i}@example.com', 'name': f'Signup {i}', 'mobile_number': f'{8000000000 + i}', 'password': datagen.PASSWORD,
+    })
+
+
+def login(w, i):
+    return Request(None, '/users/login/', {'email': w.user(i).email, 'password': datagen.PASSWORD})
+
+
+def refresh_token(w, i):
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    return Request(None, '/users/token/refresh/', {'refresh': str(RefreshToken.for_user(w.user(i)))})
+
+
+NDJSON = {'Accept': 'application/x-ndjson', 'Accept-Encoding': 'gzip'}
+
+# (name, expected status, request builder, hashes a password); the reads come first, so they
+# run on the generated data only
+ENDPOINTS = [
+    ('GET /expense/get_user/<email>/', 200, get_user, False),
+    ('GET /expense/users_expense/', 200, read('/expense/users_expense/'), False),
+    ('GET /expense/owe_list/', 200, read('/expense/owe_list/'), False),
+    ('GET /expense/settlement_plan/', 200, read('/expense/settlement_plan/'), False),
+    ('GET /expense/balance_sheet/', 200, read('/expense/balance_sheet/'), False),
+    ('GET /expense/balance_sheet/ (ndjson, gzip)', 200, read('/expense/balance_sheet/', NDJSON), False),
+    ('GET /expense/balance-sheet/download/', 200, read('/expense/balance-sheet/download/'), False),
+    ('GET /expense/balance-sheet/exports/<job_id>/', 200, export_job, False),
+    ('GET /expense/balance-sheet/exports/<job_id>/download/', 200, download_export, False),
+    ('GET /expense/groups/<group_id>/summary/', 200, group_summary, False),
+    ('GET /expense/analytics/', 200, read('/expense/analytics/'), False),
+    ('GET /expense/cache_stats/', 200, cache_stats, False),
+    ('POST /expense/create_expense/', 201, create_expense, False),
+    ('POST /expense/import_expenses/', 200, import_expenses, False),
+    ('POST /expense/settle_expense/<expense_id>/', 200, settle_expense, False),
+    ('POST /expense/settle_with_user/<user_id>/', 200, settle_with_user, False),
+    ('POST /expense/balance-sheet/exports/', 202, start_export, False),
+    ('POST /expense/groups/', 201, create_group, False),
+    ('POST /expense/groups/<group_id>/members/', 200, add_members, False),
+    ('POST /users/signup/', 201, signup, True),
+    ('POST /users/login/', 200, login, True),
+    ('POST /users/token/refresh/', 200, refresh_token, False),
+]
+
+
+def headers_of(w, request):
+    headers = dict(request.headers or {})
+    if request.user is not None:
+        headers['Authorization'] = f'Bearer {w.access_token(request.user)}'
+    return headers
+
+
+def count_queries(w, method, request):
+    """Serve `request` once with every cache cleared and return (status, number of queries)."""
+    from django.conf import settings
+    from django.core.cache import caches
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from Users_app.authentication import user_cache
+
+    for alias in settings.CACHES:
+        caches[alias].clear()
+    user_cache.clear()
+
+    client = Client(raise_request_exception=False)
+    with CaptureQueriesContext(connection) as queries, warnings.catch_warnings():
+        # The sync test client consumes the async NDJSON streams with a warning
+        warnings.simplefilter('ignore')
+        if method == 'GET':
+            response = client.get(request.path, headers=headers_of(w, request))
+        else:
+            response = client.post(request.path, request.data, content_type='application/json', headers=headers_of(w, request))
+        if response.streaming:
+            b''.join(response)
+    return response.status_code, len(queries)
+
+
+async def send(client, w, method, request):
+    from asgiref.sync import sync_to_async
+
+    if method == 'GET':
+        response = await client.get(request.path, headers=headers_of(w, request))
+    else:
+        response = await client.post(request.path, request.data, content_type='application/json', headers=headers_of(w, request))
+    # Streams are read to the end, like a client downloading them
+    if response.streaming:
+        if response.is_async:
+            async for _ in response.streaming_content:
+                pass
+        else:
+            await sync_to_async(lambda: b''.join(response.streaming_content))()
+    return response
+
+
+async def drive(w, method, build, expected, indexes, concurrency):
+    """Send the requests of `indexes` from `concurrency` concurrent clients; returns (latencies, errors, seconds)."""
+    from asgiref.sync import sync_to_async
+    from django.test import AsyncClient
+
+    client = AsyncClient(raise_request_exception=False)
+    # Built up front: some builders use the ORM (e.g. RefreshToken.for_user saves the token)
+    requests = iter(await sync_to_async(lambda: [build(w, i) for i in indexes])())
+    latencies = []
+    errors = 0
+
+    async def run_client():
+        nonlocal errors
+        for request in requests:
+            start = time.perf_counter()
+            response = await send(client, w, method, request)
+            latencies.append(time.perf_counter() - start)
+            errors += response.status_code != expected
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def measure(w, endpoint, args):
+    """Count the queries of one request of `endpoint`, then load it; returns its results."""
+    from Expences_app.models import ExportJob
+
+    name, expected, build, hashing = endpoint
+    method = name.split()[0]
+    count = args.hashing_requests if hashing else args.requests
+
+    status, queries = count_queries(w, method, build(w, 0))
+    if not hashing:
+        # Warm up (the sync thread's connection, the auth cache, ...) on requests of their own
+        asyncio.run(drive(w, method, build, expected, range(count + 1, count + 1 + args.concurrency), args.concurrency))
+    latencies, errors, seconds = asyncio.run(drive(w, method, build, expected, range(1, count + 1), args.concurrency))
+    errors += status != expected
+
+    # Let the export workers finish before the next endpoint (and before the database goes away)
+    while ExportJob.objects.filter(status__in=['queued', 'running']).exists():
+        time.sleep(0.05)
+
+    p50, p95, p99 = (statistics.quantiles(latencies, n=100, method='inclusive')[i] * 1000 for i in (49, 94, 98))
+    return {
+        'requests': count, 'errors': errors, 'p50_ms': round(p50, 2), 'p95_ms': round(p95, 2), 'p99_ms': round(p99, 2),
+        'throughput': round(count / seconds, 1), 'queries': queries,
+    }
+
+
+def run(args, baseline=None):
+    """
+    Generate the data set and measure every endpoint selected by `args`.
+
+    With a `baseline`, an endpoint slower than the baseline is measured again, up to `args.retries`
+    times, keeping its best latencies and throughput: a busy machine's hiccup does not fail a check.
+    """
+    from django.test import override_settings
+
+    start = time.perf_counter()
+    dataset = datagen.generate(args.users, args.expenses, args.groups, seed=args.seed)
+    print(f'generated {dataset.expenses} expenses, {dataset.participants} participants in {time.perf_counter() - start:.1f}s')
+
+    results = {}
+    with tempfile.TemporaryDirectory() as export_root, override_settings(EXPORT_ROOT=export_root):
+        w = Workload(dataset, args.active_users, args.seed)
+        w.make_export_jobs()
+        # Keep the collector from walking the generated data set during the load
+        gc.collect()
+        gc.freeze()
+
+        for endpoint in ENDPOINTS:
+            name = endpoint[0]
+            if args.only and not any(part in name for part in args.only):
+                continue
+            result = measure(w, endpoint, args)
+            for _ in range(args.retries if baseline else 0):
+                if not slower(result, baseline.get(name), args.threshold):
+                    break
+                retry = measure(w, endpoint, args)
+                result = {**min(result, retry, key=lambda r: r['p95_ms']), 'throughput': max(result['throughput'], retry['throughput'])}
+            results[name] = result
+
+    print_table(
+        ['endpoint', 'requests', 'errors', 'p50_ms', 'p95_ms', 'p99_ms', 'req_per_s', 'queries'],
+        [(name, r['requests'], r['errors'], r['p50_ms'], r['p95_ms'], r['p99_ms'], r['throughput'], r['queries']) for name, r in results.items()]
+    )
+    return results
+
+
+def slower(result, base, threshold):
+    """Whether `result` has a p95 latency or a throughput worse than the `base` result's beyond `threshold`."""
+    return base is not None and (
+        result['p95_ms'] > base['p95_ms'] * (1 + threshold) or result['throughput'] < base['throughput'] / (1 + threshold)
+    )
+
+
+def regressions(results, baseline, threshold):
+    """Describe every way `results` regressed from the `baseline` endpoints."""
+    found = []
+    for name, result in results.items():
+        if result['errors']:
+            found.append(f'{name}: {result["errors"]} errors')
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['queries'] > base['queries']:
+            found.append(f'{name}: {result["queries"]} queries per request, baseline {base["queries"]}')
+        if result['p95_ms'] > base['p95_ms'] * (1 + threshold):
+            found.append(f'{name}: p95 {result["p95_ms"]} ms, baseline {base["p95_ms"]} ms')
+        if result['throughput'] < base['throughput'] / (1 + threshold):
+            found.append(f'{name}: {result["throughput"]} requests/s, baseline {base["throughput"]}')
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--expenses', type=int, default=20000)
+    parser.add_argument('--groups', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--active-users', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--hashing-requests', type=int, default=16)
+    parser.add_argument('--only', type=lambda value: value.split(','), default=None,
+                        help="Comma separated parts of endpoint names; only the matching endpoints run.")
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--retries', type=int, default=2)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--save-baseline', action='store_true')
+    mode.add_argument('--check', action='store_true')
+    args = parser.parse_args()
+
+    settings = {name: getattr(args, name) for name in SETTINGS}
+    if args.check:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline['settings'] != settings:
+            parser.error(f'the baseline was measured with {baseline["settings"]}, run with the same settings to check it')
+
+    setup_django()
+    # On disk, so the export workers' connections see the generated rows
+    with test_database(on_disk=True):
+        results = run(args, baseline['endpoints'] if args.check else None)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump({'settings': settings, 'endpoints': results}, file, indent=2)
+            file.write('\n')
+        print(f'baseline saved to {args.baseline}')
+    elif args.check:
+        found = regressions(results, baseline['endpoints'], args.threshold)
+        if found:
+            print('\nregressions:\n' + '\n'.join(f'  {line}' for line in found))
+            sys.exit(1)
+        print('\nno regression')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Time a web request is held by a balance sheet export: streamed download vs background job.
+
+    python -m benchmarks.export_jobs [--expenses 10000,100000,500000]
+
+For every history size, one user's expenses are loaded with bulk_create, then the user's balance
+sheet is exported twice: streamed by GET balance-sheet/download/, which holds the request for the
+whole export, and by POST balance-sheet/exports/, which returns as soon as the job is queued while
+a worker thread writes the file. The job's own duration and rows/s are reported from its record.
+"""
+import argparse
+import tempfile
+import time
+
+from benchmarks.utils import setup_django, test_database, make_users, api_client, timed, print_table
+
+
+def load_expenses(user, friend, count):
+    from Expences_app.models import Expense, Participant
+
+    for start in range(0, count, 50000):
+        expenses = Expense.objects.bulk_create([
+            Expense(description=f'expense {i}', amount=10, split_method='exact', created_by=friend)
+            for i in range(start, min(count, start + 50000))
+        ])
+        Participant.objects.bulk_create([Participant(user=user, expense_id=expense.pk, amount=4, created_at=expense.created_at) for expense in expenses])
+
+
+def run(sizes):
+    from django.test import override_settings
+    from Expences_app import exports
+    from Expences_app.models import ExportJob
+
+    rows = []
+    for size in sizes:
+        user, friend = make_users(2, prefix=f'bench{size}-')
+        load_expenses(user, friend, size)
+        client = api_client(user)
+
+        def download():
+            response = client.get('/expense/balance-sheet/download/')
+            return sum(len(chunk) for chunk in response.streaming_content)
+
+        seconds, _ = timed(download, repeat=1)
+        rows.append((size, 'GET balance-sheet/download/', f'{seconds * 1000:.1f}', '-', '-'))
+
+        with tempfile.TemporaryDirectory() as export_root, override_settings(EXPORT_ROOT=export_root):
+            start = time.perf_counter()
+            response = client.post('/expense/balance-sheet/exports/')
+            held = time.perf_counter() - start
+            assert response.status_code == 202, response.content
+            job_id = response.json()['job_id']
+            exports.wait_for_idle()
+            job = ExportJob.objects.get(pk=job_id)
+            assert job.status == 'done', job.error
+            duration = job.duration.total_seconds()
+            rows.append((size, 'POST balance-sheet/exports/', f'{held * 1000:.1f}', f'{duration * 1000:.1f}', f'{job.rows_written / duration:,.0f}'))
+
+    print_table(['expenses', 'request', 'request_ms', 'job_ms', 'job_rows_per_s'], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--expenses', default='10000,100000,500000')
+    args = parser.parse_args()
+
+    setup_django()
+    # On disk, so the worker threads' connections see the benchmark's rows
+    with test_database(on_disk=True):
+        run([int(size) for size in args.expenses.split(',')])
+
+
+if __name__ == '__main__':
+    main()
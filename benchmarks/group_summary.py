@@ -0,0 +1,113 @@
+"""
+Group summary latency as a group's expense history grows.
+
+    python -m benchmarks.group_summary [--members 20] [--expenses 1000,10000,100000]
+
+A group's expenses are loaded with raw executemany calls (every expense shared by the creator
+and up to 5 other members), the members' net balances are rebuilt from them, and then the
+GET groups/<id>/summary/ endpoint, which reads the stored net balances, is timed against
+aggregating the group's pending participant rows, the cost of a summary without them.
+"""
+import argparse
+import random
+import time
+import uuid
+
+from benchmarks.utils import setup_django, test_database, make_users, api_client, timed, print_table
+
+
+def load_expenses(group, members, count, per_expense=5, seed=0):
+    from django.db import connection
+    from django.utils import timezone
+    from Expences_app.models import Expense, Participant
+
+    rng = random.Random(seed)
+    now = timezone.now().isoformat()
+    quote = connection.ops.quote_name
+
+    expense_rows = []
+    participant_rows = []
+    for _ in range(count):
+        creator, *others = rng.sample(members, per_expense + 1)
+        expense_id = uuid.uuid4().hex
+        share = rng.randint(100, 10000)
+        expense_rows.append((expense_id, 'bench', f'{share * (len(others) + 1) / 100:.2f}', 'equal', creator.id.hex, group.group_id.hex, now, now))
+        participant_rows.append((creator.id.hex, expense_id, f'{share / 100:.2f}', 'settled', now))
+        participant_rows.extend((user.id.hex, expense_id, f'{share / 100:.2f}', rng.choice(['pending', 'settled']), now) for user in others)
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {quote(Expense._meta.db_table)} (expense_id, description, amount, split_method, created_by_id, group_id, created_at, updated_at) '
+            'VALUES (%s, %s, %s, %s, %s, %s, %s, %s)',
+            expense_rows
+        )
+        cursor.executemany(
+            f'INSERT INTO {quote(Participant._meta.db_table)} (user_id, expense_id, amount, status, created_at) VALUES (%s, %s, %s, %s, %s)',
+            participant_rows
+        )
+
+
+def aggregate(group):
+    from collections import defaultdict
+    from decimal import Decimal
+    from django.db.models import F, Sum
+    from Expences_app.models import Participant
+
+    net = defaultdict(Decimal)
+    pending = (
+        Participant.objects.filter(expense__group=group, status='pending')
+        .exclude(user=F('expense__created_by'))
+        .values_list('user_id', 'expense__created_by_id')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+    for debtor_id, creditor_id, total in pending:
+        net[creditor_id] += total
+        net[debtor_id] -= total
+    return net
+
+
+def run(member_count, sizes):
+    from django.db import transaction
+    from Expences_app import ledger
+    from Expences_app.models import Group, GroupMember
+
+    rows = []
+    for size in sizes:
+        members = make_users(member_count, prefix=f'bench{size}-')
+        group = Group.objects.create(name=f'bench {size}', created_by=members[0])
+        GroupMember.objects.bulk_create([GroupMember(group=group, user=member) for member in members])
+        start = time.perf_counter()
+        load_expenses(group, members, size)
+        with transaction.atomic():
+            ledger.rebuild_group_balances()
+        print(f'loaded {size} expenses in {time.perf_counter() - start:.1f}s')
+
+        client = api_client(members[0])
+
+        def summary():
+            response = client.get(f'/expense/groups/{group.group_id}/summary/')
+            assert response.status_code == 200, response.content
+            return response.json()['members']
+
+        seconds, result = timed(summary, repeat=5)
+        rows.append((size, 'GET groups/<id>/summary/', f'{seconds * 1000:.2f}', len(result)))
+        seconds, result = timed(lambda: aggregate(group), repeat=3)
+        rows.append((size, 'aggregate participant rows', f'{seconds * 1000:.2f}', len(result)))
+
+    print_table(['expenses', 'step', 'median_ms', 'members'], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, default=20)
+    parser.add_argument('--expenses', default='1000,10000,100000')
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database():
+        run(args.members, [int(size) for size in args.expenses.split(',')])
+
+
+if __name__ == '__main__':
+    main()
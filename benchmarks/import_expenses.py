@@ -0,0 +1,79 @@
+"""
+Expenses/second of POST /expense/import_expenses/ against one POST /expense/create_expense/ per expense.
+
+    python -m benchmarks.import_expenses [--expenses 2000] [--participants 3] [--chunk-size 500]
+"""
+import argparse
+import json
+import time
+
+from benchmarks.utils import setup_django, test_database, make_users, api_client, print_table
+
+
+def build_payloads(count, members):
+    payloads = []
+    for i in range(count):
+        participants = members[i % len(members):] + members[:i % len(members)]
+        method = ('equal', 'exact', 'percentage')[i % 3]
+        payload = {
+            'client_id': str(i),
+            'description': f'offline expense {i}',
+            'amount': 100 * len(participants),
+            'split_method': method,
+            'participants_data': {str(u.id): 100 for u in participants},
+        }
+        if method == 'equal':
+            payload['self'] = True
+            payload['amount'] = 100 * (len(participants) + 1)
+        elif method == 'exact':
+            payload['self_amount'] = 0
+        else:
+            payload['participants_data'] = {str(u.id): 0 for u in participants}
+            payload['self_percentage'] = 100
+        payloads.append(payload)
+    return payloads
+
+
+def run(count, participants, chunk_size):
+    creator = make_users(1, prefix='creator')[0]
+    members = make_users(participants)
+    client = api_client(creator, jwt=True)
+    payloads = build_payloads(count, members)
+    rows = []
+
+    start = time.perf_counter()
+    for payload in payloads:
+        response = client.post('/expense/create_expense/', payload, format='json')
+        assert response.status_code == 201, response.content
+    single = time.perf_counter() - start
+    rows.append(('create_expense x N', count, f'{single:.2f}', f'{count / single:.0f}', '1.0x'))
+
+    url = f'/expense/import_expenses/?chunk_size={chunk_size}'
+    bodies = {
+        'import (JSON array)': (json.dumps(payloads), 'application/json'),
+        'import (NDJSON)': ('\n'.join(json.dumps(p) for p in payloads), 'application/x-ndjson'),
+    }
+    for label, (body, content_type) in bodies.items():
+        start = time.perf_counter()
+        response = client.generic('POST', url, body, content_type=content_type)
+        elapsed = time.perf_counter() - start
+        assert response.status_code == 200 and response.json()['created'] == count, response.content[:500]
+        rows.append((label, count, f'{elapsed:.2f}', f'{count / elapsed:.0f}', f'{single / elapsed:.1f}x'))
+
+    print_table(['endpoint', 'expenses', 'seconds', 'expenses/s', 'speedup'], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--expenses', type=int, default=2000)
+    parser.add_argument('--participants', type=int, default=3)
+    parser.add_argument('--chunk-size', type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database(on_disk=True):
+        run(args.expenses, args.participants, args.chunk_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Latency of other endpoints while a storm of logins is in flight, served through the ASGI handler.
+
+    python -m benchmarks.login_storm [--rate 100] [--duration 5] [--probe-interval 0.01]
+
+A probe client sends GET /expense/get_user/<email>/ (a sync DRF view) back to back while
+`--rate` logins per second are fired at /users/login/, and the probe latency percentiles are
+reported for three runs:
+
+- idle:    no logins;
+- inline:  logins with the password hashed on the event loop, as a sync login view would;
+- pool:    logins with the password hashed on the bounded hashing pool (Users_app/hashing.py).
+
+Logins beyond the pool's queue are answered 503 and counted as rejected.
+"""
+import argparse
+import asyncio
+import contextlib
+import statistics
+import time
+from unittest import mock
+
+from benchmarks.utils import setup_django, test_database, make_users, print_table
+
+
+async def _inline(func, *args):
+    return func(*args)
+
+
+async def storm(mode, prober, rate, duration, probe_interval):
+    from django.test import AsyncClient
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from Users_app import hashing
+
+    client = AsyncClient()
+    headers = {'Authorization': f'Bearer {AccessToken.for_user(prober)}'}
+    probe_url = f'/expense/get_user/{prober.email}/'
+    statuses = []
+    latencies = []
+
+    async def log_in():
+        response = await client.post('/users/login/', {'email': 'storm@example.com', 'password': 'secret'},
+                                     content_type='application/json')
+        statuses.append(response.status_code)
+
+    async def fire():
+        if mode == 'idle':
+            await asyncio.sleep(duration)
+            return []
+        tasks = []
+        for _ in range(int(rate * duration)):
+            tasks.append(asyncio.create_task(log_in()))
+            await asyncio.sleep(1 / rate)
+        return tasks
+
+    async def measure(until):
+        while time.perf_counter() < until:
+            start = time.perf_counter()
+            response = await client.get(probe_url, headers=headers)
+            assert response.status_code == 200, response.content
+            latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(probe_interval)
+
+    with mock.patch.object(hashing, '_run', _inline) if mode == 'inline' else contextlib.nullcontext():
+        tasks, _ = await asyncio.gather(fire(), measure(time.perf_counter() + duration))
+        await asyncio.gather(*tasks)
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return (
+        mode,
+        len(statuses),
+        statuses.count(200),
+        statuses.count(503),
+        len(latencies),
+        f'{statistics.median(latencies) * 1000:.1f}',
+        f'{quantiles[98] * 1000:.1f}',
+        f'{max(latencies) * 1000:.1f}',
+    )
+
+
+def run(rate, duration, probe_interval):
+    from django.contrib.auth import get_user_model
+
+    get_user_model().objects.create_user(email='storm@example.com', password='secret', name='storm', mobile_number='0')
+    prober = make_users(1, prefix='probe')[0]
+
+    rows = []
+    for mode in ('idle', 'inline', 'pool'):
+        rows.append(asyncio.run(storm(mode, prober, rate, duration, probe_interval)))
+    print_table(['mode', 'logins', 'ok', 'rejected', 'probes', 'probe_p50_ms', 'probe_p99_ms', 'probe_max_ms'], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=float, default=100, help='logins per second')
+    parser.add_argument('--duration', type=float, default=5, help='seconds')
+    parser.add_argument('--probe-interval', type=float, default=0.01, help='seconds between two probe requests')
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database(on_disk=True):
+        run(args.rate, args.duration, args.probe_interval)
+
+
+if __name__ == '__main__':
+    main()
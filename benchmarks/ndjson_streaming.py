@@ -0,0 +1,129 @@
+"""
+Bytes on the wire and peak memory of a user's whole balance sheet: JSON pages vs NDJSON streams.
+
+    python -m benchmarks.ndjson_streaming [--expenses 10000,100000]
+
+For every history size, one user's participations are loaded with bulk_create, then the whole
+balance sheet is fetched through the ASGI handler (AsyncClient) three ways: JSON pages of
+EXPENSE_MAX_PAGE_SIZE rows following the `next` cursor, one `Accept: application/x-ndjson`
+stream, and the same stream with `Accept-Encoding: gzip`. Streams are consumed chunk by chunk,
+as a client would, and only their sizes are kept.
+
+Memory is reported twice: the peak of the Python heap over the fetch (tracemalloc, measured on a
+second, untimed run), which is what the response building holds, and the growth of the process'
+resident set high-water mark, reset before every mode through /proc/self/clear_refs (Linux only,
+'-' elsewhere). The RSS also counts SQLite's own memory, e.g. the temporary b-tree sorting the
+rows, which grows with the history whichever way the rows are sent.
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from benchmarks.utils import setup_django, test_database, make_users, print_table
+
+
+def load_expenses(user, friend, count):
+    from Expences_app.models import Expense, Participant
+
+    for start in range(0, count, 50000):
+        expenses = Expense.objects.bulk_create([
+            Expense(description=f'expense {i}', amount=10, split_method='exact', created_by=friend)
+            for i in range(start, min(count, start + 50000))
+        ])
+        Participant.objects.bulk_create([Participant(user=user, expense_id=expense.pk, amount=4, created_at=expense.created_at) for expense in expenses])
+
+
+def _status_kib(field):
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+
+
+def reset_peak_rss():
+    """Reset the RSS high-water mark and return the current RSS in KiB, or None when unsupported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return _status_kib('VmRSS')
+    except OSError:
+        return None
+
+
+async def json_pages(client, headers, limit):
+    url = f'/expense/balance_sheet/?limit={limit}'
+    size = rows = 0
+    while url:
+        response = await client.get(url, headers=headers)
+        size += len(response.content)
+        data = response.json()
+        rows += len(data['individual_expenses'])
+        url = f'/expense/balance_sheet/?limit={limit}&cursor={data["next"]}' if data['next'] else None
+    return size, rows
+
+
+async def ndjson_stream(client, headers, gzipped):
+    import zlib
+
+    headers = {**headers, 'Accept': 'application/x-ndjson'}
+    if gzipped:
+        headers['Accept-Encoding'] = 'gzip'
+    response = await client.get('/expense/balance_sheet/', headers=headers)
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS) if gzipped else None
+    size = rows = 0
+    async for chunk in response.streaming_content:
+        size += len(chunk)
+        rows += (decompressor.decompress(chunk) if gzipped else chunk).count(b'\n')
+    return size, rows
+
+
+def run(sizes):
+    from django.conf import settings
+    from django.core.cache import caches
+    from django.test import AsyncClient
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    rows = []
+    for size in sizes:
+        user, friend = make_users(2, prefix=f'bench{size}-')
+        load_expenses(user, friend, size)
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+        client = AsyncClient()
+
+        modes = [
+            (f'JSON pages of {settings.EXPENSE_MAX_PAGE_SIZE}', lambda: json_pages(client, headers, settings.EXPENSE_MAX_PAGE_SIZE)),
+            ('NDJSON stream', lambda: ndjson_stream(client, headers, gzipped=False)),
+            ('NDJSON stream, gzip', lambda: ndjson_stream(client, headers, gzipped=True)),
+        ]
+        for name, fetch in modes:
+            caches[settings.LEDGER_CACHE_ALIAS].clear()
+            rss = reset_peak_rss()
+            start = time.perf_counter()
+            wire_bytes, records = asyncio.run(fetch())
+            seconds = time.perf_counter() - start
+            assert records == size, (name, records)
+            peak_rss = f'{(_status_kib("VmHWM") - rss) / 1024:.1f}' if rss is not None else '-'
+
+            caches[settings.LEDGER_CACHE_ALIAS].clear()
+            tracemalloc.start()
+            asyncio.run(fetch())
+            _, peak_heap = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            rows.append((size, name, f'{wire_bytes / 2 ** 20:.2f}', f'{seconds * 1000:.0f}', f'{peak_heap / 2 ** 20:.1f}', peak_rss))
+
+    print_table(['expenses', 'mode', 'wire_MiB', 'total_ms', 'peak_heap_MiB', 'peak_rss_growth_MiB'], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--expenses', default='10000,100000')
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database():
+        run([int(size) for size in args.expenses.split(',')])
+
+
+if __name__ == '__main__':
+    main()
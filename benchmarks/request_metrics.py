@@ -0,0 +1,112 @@
+"""
+Overhead of the request metrics (split_up/metrics.py): Server-Timing header and route histograms.
+
+    python -m benchmarks.request_metrics [--requests 500] [--repeat 7]
+
+Endpoints from cheap to query heavy are requested `--requests` times through the test client,
+authenticated with a JWT, with and without `RequestMetricsMiddleware` (and without the execute
+wrapper on the connection), alternating the two `--repeat` times; the medians are compared. These
+differences are within the run to run noise of a millisecond request, so the fixed costs are
+measured apart too: the execute wrapper on `SELECT 1` queries, the cheapest there is, and the
+Server-Timing header and histogram update every request pays.
+"""
+import argparse
+
+from benchmarks.utils import setup_django, test_database, make_users, api_client, timed, print_table
+
+
+def load(user, friends):
+    from Expences_app import ledger
+    from Expences_app.models import Expense, Participant
+
+    expenses = Expense.objects.bulk_create([
+        Expense(description=f'dinner {i}', amount=40, split_method='equal', created_by=friends[i % len(friends)]) for i in range(200)
+    ])
+    Participant.objects.bulk_create([Participant(user=user, expense=expense, amount=10, created_at=expense.created_at) for expense in expenses])
+    ledger.rebuild_balances()
+
+
+def run(count, repeat):
+    from django.conf import settings
+    from django.db import connection
+    from django.test import override_settings
+    from Expences_app import cache
+    from split_up import metrics
+
+    user, *friends = make_users(6, prefix='bench')
+    load(user, friends)
+    # cache_stats/ is for staff users
+    user.is_staff = True
+    user.save(update_fields=['is_staff'])
+    without = [name for name in settings.MIDDLEWARE if name != 'split_up.metrics.RequestMetricsMiddleware']
+
+    def requests(url, clear_cache):
+        def send():
+            client = api_client(user, jwt=True)
+            for _ in range(count):
+                if clear_cache:
+                    cache.get_cache().clear()
+                response = client.get(url)
+                assert response.status_code == 200, response.content
+        return send
+
+    rows = []
+    for url, clear_cache in (('/expense/cache_stats/', False), ('/expense/owe_list/', False), ('/expense/owe_list/', True),
+                             ('/expense/balance_sheet/', True), ('/expense/settlement_plan/', True)):
+        send = requests(url, clear_cache)
+        send()  # warm up
+        on, off = [], []
+        for _ in range(repeat):
+            metrics.install(connection)
+            on.append(timed(send, repeat=1)[0])
+            connection.execute_wrappers.remove(metrics.record_query)
+            with override_settings(MIDDLEWARE=without):
+                off.append(timed(send, repeat=1)[0])
+        metrics.install(connection)
+        on, off = sorted(on)[repeat // 2], sorted(off)[repeat // 2]
+        name = f'GET {url}' + (' (cache miss)' if clear_cache else '')
+        rows.append((name, f'{off / count * 1e6:.0f}', f'{on / count * 1e6:.0f}', f'{(on - off) / count * 1e6:+.0f}', f'{(on - off) / off * 100:+.1f}%'))
+
+    print_table(['request', 'without_us', 'with_us', 'overhead_us', 'overhead'], rows)
+
+    def select_one():
+        with connection.cursor() as cursor:
+            for _ in range(10000):
+                cursor.execute('SELECT 1')
+
+    token = metrics._current.set(metrics.RequestMetrics())
+    try:
+        with_wrapper, _ = timed(select_one, repeat)
+        connection.execute_wrappers.remove(metrics.record_query)
+        without_wrapper, _ = timed(select_one, repeat)
+        metrics.install(connection)
+    finally:
+        metrics._current.reset(token)
+
+    def bookkeeping():
+        measured = metrics.RequestMetrics()
+        for _ in range(10000):
+            metrics.server_timing(measured, 0.001)
+            metrics.observe('GET', '/expense/owe_list/', 200, measured, 0.001)
+
+    seconds, _ = timed(bookkeeping, repeat)
+    print()
+    print_table(['cost', 'us'], [
+        ('execute wrapper, per query', f'{(with_wrapper - without_wrapper) / 10000 * 1e6:.2f}'),
+        ('header and histograms, per request', f'{seconds / 10000 * 1e6:.2f}'),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=7)
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database():
+        run(args.requests, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+Per-row cost of building and encoding the pages of balance_sheet/ and users_expense/.
+
+    python -m benchmarks.row_serialization [--rows 1000] [--repeat 5]
+
+A user with `--rows` participations in other users' expenses and `--rows` expenses of their own
+(each shared with 3 other users) is loaded, then one page of `--rows` rows of each list is fetched
+and encoded three ways:
+
+- before: model instances (select_related / prefetch_related), dicts built from their attributes
+  and the stdlib encoder (DRF's JSONRenderer, or DjangoJSONEncoder for balance_sheet/), as the
+  views did before the projections;
+- values() + stdlib: the views' `values()` projections, encoded by `renderers.dumps` (or
+  `renderers.django_dumps` for balance_sheet/) without orjson;
+- values() + orjson: the same, with orjson (what the views run when it is installed).
+
+Then the endpoints themselves are timed through the test client with `?limit=--rows`.
+"""
+import argparse
+import json
+from unittest import mock
+
+from benchmarks.utils import setup_django, test_database, make_users, api_client, timed, print_table
+
+
+def load(user, others, count):
+    from Expences_app.models import Expense, Participant
+
+    theirs = Expense.objects.bulk_create([
+        Expense(description=f'dinner {i}', amount=40, split_method='equal', created_by=others[i % len(others)])
+        for i in range(count)
+    ])
+    mine = Expense.objects.bulk_create([
+        Expense(description=f'rent {i}', amount=40, split_method='equal', created_by=user) for i in range(count)
+    ])
+    Participant.objects.bulk_create(
+        [Participant(user=user, expense=expense, amount=10, created_at=expense.created_at) for expense in theirs]
+        + [Participant(user=other, expense=expense, amount=10, created_at=expense.created_at) for expense in mine for other in others]
+    )
+
+
+def before_balance_sheet(user, limit):
+    """The balance sheet page as built before the projections."""
+    from Expences_app.models import Participant
+
+    rows = Participant.objects.filter(user=user).select_related('expense__created_by').order_by('expense__created_at', 'expense_id')[:limit]
+    return {'individual_expenses': [{
+        'expense_id': part.expense.expense_id,
+        'description': part.expense.description,
+        'user_share': part.amount,
+        'total_amount': part.expense.amount,
+        'split_method': part.expense.split_method,
+        'created_by': part.expense.created_by.name,
+        'created_at': part.expense.created_at,
+        'status': part.status,
+    } for part in rows]}
+
+
+def before_users_expense(user, limit):
+    """The users_expense page as built before the projections."""
+    from django.db.models import Prefetch
+    from Expences_app.models import Expense, Participant
+
+    created = Expense.objects.filter(created_by=user).prefetch_related(Prefetch(
+        'participants', queryset=Participant.objects.exclude(user=user).select_related('user'), to_attr='other_participants'
+    )).order_by('created_at', 'expense_id')[:limit]
+    pending = Participant.objects.filter(user=user, status='pending').select_related('expense__created_by').order_by('expense__created_at', 'expense_id')[:limit]
+    return {
+        'i_owe': [{
+            'description': part.expense.description,
+            'amount': part.amount,
+            'split_method': part.expense.split_method,
+            'created_by': part.expense.created_by.email,
+            'status': part.status,
+            'created_at': part.expense.created_at,
+        } for part in pending],
+        'others_owe_me': [{
+            'expense_id': exp.expense_id,
+            'description': exp.description,
+            'amount': exp.amount,
+            'split_method': exp.split_method,
+            'created_at': exp.created_at,
+            'participants': [
+                {'user_id': part.user.id, 'user_email': part.user.email, 'amount': part.amount, 'status': part.status}
+                for part in exp.other_participants
+            ],
+        } for exp in created],
+    }
+
+
+def after_balance_sheet(user, limit):
+    from Expences_app.views import BalanceSheetView
+
+    view = BalanceSheetView()
+    rows = view.participations(user).order_by('created_at', 'expense_id')[:limit]
+    return {'individual_expenses': [view.record(row) for row in rows]}
+
+
+def after_users_expense(user, limit):
+    from asgiref.sync import async_to_sync
+    from Expences_app.views import UsersAllExpensesView
+
+    view = UsersAllExpensesView()
+    created = list(view.created_expenses(user).order_by('created_at', 'expense_id')[:limit])
+    pending = view.pending_participations(user).order_by('created_at', 'expense_id')[:limit]
+    return {
+        'i_owe': [view.i_owe_record(row) for row in pending],
+        'others_owe_me': async_to_sync(view.with_participants)(created, user),
+    }
+
+
+def run(count, repeat):
+    from django.core.serializers.json import DjangoJSONEncoder
+    from rest_framework.renderers import JSONRenderer
+    from split_up import renderers
+
+    user, *others = make_users(4, prefix='bench')
+    load(user, others, count)
+
+    def without_orjson(dumps):
+        def encode(data):
+            with mock.patch.object(renderers, 'orjson', None):
+                return dumps(data)
+        return encode
+
+    # endpoint: (way: (build, encode))
+    ways = {
+        'balance_sheet/': {
+            'before': (before_balance_sheet, lambda data: json.dumps(data, cls=DjangoJSONEncoder).encode()),
+            'values() + stdlib': (after_balance_sheet, without_orjson(renderers.django_dumps)),
+            'values() + orjson': (after_balance_sheet, renderers.django_dumps),
+        },
+        'users_expense/': {
+            'before': (before_users_expense, JSONRenderer().render),
+            'values() + stdlib': (after_users_expense, without_orjson(renderers.dumps)),
+            'values() + orjson': (after_users_expense, renderers.dumps),
+        },
+    }
+
+    rows = []
+    for endpoint, page_rows in (('balance_sheet/', count), ('users_expense/', 2 * count)):
+        expected = None
+        for name, (build, encode) in ways[endpoint].items():
+            if name.endswith('orjson') and renderers.orjson is None:
+                continue
+            build_seconds, data = timed(lambda: build(user, count), repeat)
+            encode_seconds, content = timed(lambda: encode(data), repeat)
+            # Every way must produce the same JSON
+            expected = expected or json.loads(content)
+            assert json.loads(content) == expected, name
+            rows.append((endpoint, name, f'{build_seconds / page_rows * 1e6:.1f}', f'{encode_seconds / page_rows * 1e6:.1f}',
+                         f'{(build_seconds + encode_seconds) / page_rows * 1e6:.1f}'))
+
+        client = api_client(user)
+        url = f'/expense/{endpoint}?limit={count}'
+
+        def get():
+            from Expences_app import cache
+            cache.get_cache().clear()
+            response = client.get(url)
+            assert response.status_code == 200, response.content
+            return response
+
+        seconds, _ = timed(get, repeat)
+        rows.append((endpoint, f'GET ?limit={count}', '-', '-', f'{seconds / page_rows * 1e6:.1f}'))
+
+    print_table(['endpoint', 'way', 'build_us_per_row', 'encode_us_per_row', 'total_us_per_row'], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database():
+        run(args.rows, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
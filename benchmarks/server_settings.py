@@ -0,0 +1,17 @@
+"""
+Settings of the servers started by the benchmarks: the project settings, pointed at the
+benchmark database given in SPLIT_UP_BENCH_DB, with DEBUG off so queries are not logged.
+"""
+import os
+
+from split_up.settings import *  # noqa: F401,F403
+from split_up.settings import DATABASES
+
+DEBUG = False
+
+DATABASES['default']['NAME'] = os.environ['SPLIT_UP_BENCH_DB']
+
+# SPLIT_UP_BENCH_SQLITE=default serves with Django's stock SQLite settings instead of the tuned
+# profile; WAL is persistent in the database file, so the rollback journal is set back explicitly.
+if os.environ.get('SPLIT_UP_BENCH_SQLITE') == 'default':
+    DATABASES['default'].update(CONN_MAX_AGE=0, OPTIONS={'init_command': 'PRAGMA journal_mode=DELETE'})
@@ -0,0 +1,104 @@
+"""
+Settlement plan computation for a large ledger.
+
+    python -m benchmarks.settlement_plan [--users 10000] [--participants 1000000] [--circle-size 20]
+
+Users are split into circles of friends; every expense is created by a member of a circle
+and shared with other members of the same circle. The participant rows are loaded with raw
+executemany calls (the ORM would dominate the setup time), the Balance ledger is rebuilt from
+them, and then the net balance query and the min-cash-flow plan are timed for every user at
+once and for a single circle through the endpoint.
+"""
+import argparse
+import random
+import time
+import uuid
+
+from benchmarks.utils import setup_django, test_database, make_users, api_client, timed, print_table
+
+
+def load_participants(users, participants, circle_size, per_expense=10, seed=0):
+    from django.db import connection
+    from django.utils import timezone
+    from Expences_app.models import Expense, Participant
+
+    rng = random.Random(seed)
+    circles = [users[i:i + circle_size] for i in range(0, len(users), circle_size)]
+    now = timezone.now().isoformat()
+    quote = connection.ops.quote_name
+
+    expense_rows = []
+    participant_rows = []
+    pending = 0
+    while pending < participants:
+        circle = rng.choice(circles)
+        creator, *others = rng.sample(circle, min(per_expense + 1, len(circle)))
+        expense_id = uuid.uuid4().hex
+        share = rng.randint(100, 100000)
+        expense_rows.append((expense_id, 'bench', f'{share * (len(others) + 1) / 100:.2f}', 'equal', creator.id.hex, now, now))
+        participant_rows.append((creator.id.hex, expense_id, f'{share / 100:.2f}', 'settled', now))
+        participant_rows.extend((user.id.hex, expense_id, f'{share / 100:.2f}', 'pending', now) for user in others)
+        pending += len(others)
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {quote(Expense._meta.db_table)} (expense_id, description, amount, split_method, created_by_id, created_at, updated_at) '
+            'VALUES (%s, %s, %s, %s, %s, %s, %s)',
+            expense_rows
+        )
+        cursor.executemany(
+            f'INSERT INTO {quote(Participant._meta.db_table)} (user_id, expense_id, amount, status, created_at) VALUES (%s, %s, %s, %s, %s)',
+            participant_rows
+        )
+    return len(expense_rows), pending
+
+
+def run(user_count, participants, circle_size):
+    from django.db import transaction
+    from Expences_app import ledger, settlement
+
+    users = make_users(user_count)
+    start = time.perf_counter()
+    expenses, pending = load_participants(users, participants, circle_size)
+    print(f'loaded {expenses} expenses / {pending} pending participants in {time.perf_counter() - start:.1f}s')
+
+    rows = []
+    seconds, balances = timed(ledger.compute_balances, repeat=1)
+    rows.append(('aggregate pairs from Participant', f'{seconds * 1000:.0f}', len(balances)))
+    with transaction.atomic():
+        ledger.rebuild_balances()
+
+    seconds, net = timed(settlement.net_balances, repeat=3)
+    rows.append(('net balances from Balance (all users)', f'{seconds * 1000:.0f}', len(net)))
+    seconds, transfers = timed(lambda: settlement.minimal_transfers(net), repeat=3)
+    rows.append(('min-cash-flow plan (all users)', f'{seconds * 1000:.0f}', len(transfers)))
+    seconds, transfers = timed(lambda: settlement.minimal_transfers(settlement.net_balances()), repeat=3)
+    rows.append(('net balances + plan (all users)', f'{seconds * 1000:.0f}', len(transfers)))
+
+    client = api_client(users[0])
+
+    def plan():
+        response = client.get('/expense/settlement_plan/')
+        assert response.status_code == 200, response.content
+        return len(response.json()['transfers'])
+
+    seconds, count = timed(plan, repeat=5)
+    rows.append(('GET settlement_plan/ (one circle)', f'{seconds * 1000:.1f}', count))
+
+    print_table(['step', 'median_ms', 'rows'], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--participants', type=int, default=1000000)
+    parser.add_argument('--circle-size', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database():
+        run(args.users, args.participants, args.circle_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Throughput of the split engine (Expences_app/splits.py) by group size.
+
+    python -m benchmarks.splits [--sizes 2,10,100,1000,10000] [--expenses 200000] [--repeat 5]
+
+For every group size and split method, a batch of random expenses is split with `split_many`;
+`--expenses` is the number of participant shares computed per measurement, so small groups
+are measured on many expenses and large groups on a few.
+"""
+import argparse
+import random
+
+from benchmarks.utils import setup_django, timed, print_table
+
+
+def requests_for(method, size, count, rng):
+    from Expences_app import splits
+
+    requests = []
+    for _ in range(count):
+        total = rng.randint(size, 10 ** 9)
+        if method == splits.EQUAL:
+            values = size
+        elif method == splits.EXACT:
+            values = [total // size] * size
+            values[0] += total - sum(values)
+        else:
+            values = [splits.HUNDRED_PERCENT // size] * size
+            values[0] += splits.HUNDRED_PERCENT - sum(values)
+        requests.append((method, total, values))
+    return requests
+
+
+def run(sizes, shares, repeat):
+    from Expences_app import splits
+
+    rng = random.Random(0)
+    rows = []
+    for size in sizes:
+        count = max(1, shares // size)
+        for method in (splits.EQUAL, splits.EXACT, splits.PERCENTAGE):
+            requests = requests_for(method, size, count, rng)
+            seconds, results = timed(lambda: splits.split_many(requests), repeat)
+            assert not any(isinstance(result, splits.SplitError) for result in results)
+            rows.append((size, method, count, f'{count / seconds:,.0f}', f'{count * size / seconds:,.0f}'))
+
+    print_table(['participants', 'split_method', 'expenses', 'splits_per_s', 'shares_per_s'], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='2,10,100,1000,10000')
+    parser.add_argument('--expenses', type=int, default=200000, help='participant shares per measurement')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    run([int(s) for s in args.sizes.split(',')], args.expenses, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Throughput and lock timeouts of concurrent readers and writers on SQLite.
+
+    python -m benchmarks.sqlite_concurrency [--readers 16] [--writers 4] [--duration 10]
+
+A threaded WSGI server (see benchmarks/asgi_vs_wsgi.py) serves the benchmark database on disk
+while `--readers` clients send GET /expense/owe_list/ and `--writers` clients send
+POST /expense/create_expense/ back to back for `--duration` seconds. Every expense changes the
+ledger the readers read, so their responses are never served from the ledger cache.
+
+It runs twice on the same data:
+
+- default: Django's stock SQLite settings (rollback journal, full fsync per commit, a new
+           connection per request);
+- tuned:   the profile of split_up/settings.py (WAL, synchronous=NORMAL, busy_timeout, mmap,
+           IMMEDIATE write transactions, persistent connections).
+
+`lock_timeouts` counts the requests that failed with "database is locked".
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.asgi_vs_wsgi import free_port
+from benchmarks.utils import setup_django, test_database, make_users, print_table
+
+
+async def send(reader, writer, request):
+    writer.write(request)
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length = 0
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def load(port, reads, write, readers, writers, duration):
+    stats = {kind: {'latencies': [], 'errors': 0, 'lock_timeouts': 0} for kind in ('read', 'write')}
+
+    async def client(kind, request):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status, body = await send(reader, writer, request)
+            if status < 300:
+                stats[kind]['latencies'].append(time.perf_counter() - start)
+            elif b'database is locked' in body:
+                stats[kind]['lock_timeouts'] += 1
+            else:
+                stats[kind]['errors'] += 1
+        writer.close()
+
+    await asyncio.gather(
+        *(client('read', reads[i % len(reads)]) for i in range(readers)),
+        *(client('write', write) for _ in range(writers)),
+    )
+    return stats
+
+
+def bench(profile, database, reads, write, readers, writers, duration):
+    port = free_port()
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='benchmarks.server_settings',
+               SPLIT_UP_BENCH_DB=database, SPLIT_UP_BENCH_SQLITE=profile)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.asgi_vs_wsgi', '--serve', 'wsgi', '--port', str(port)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(('127.0.0.1', port)).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError(f'the {profile} server did not start')
+
+        asyncio.run(load(port, reads, write, 1, 1, 0.5))  # warm up
+        start = time.perf_counter()
+        stats = asyncio.run(load(port, reads, write, readers, writers, duration))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    rows = []
+    for kind, result in stats.items():
+        latencies = result['latencies']
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+        rows.append((
+            profile,
+            kind,
+            len(latencies),
+            f'{len(latencies) / elapsed:.0f}',
+            f'{statistics.median(latencies) * 1000:.1f}' if latencies else '-',
+            f'{quantiles[98] * 1000:.1f}',
+            result['lock_timeouts'],
+            result['errors'],
+        ))
+    return rows
+
+
+def run(readers, writers, duration):
+    from django.db import connection
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    payer, *friends = make_users(readers + 1)
+    reads = [
+        f'GET /expense/owe_list/ HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+        f'Authorization: Bearer {AccessToken.for_user(friend)}\r\n\r\n'.encode()
+        for friend in friends
+    ]
+    body = json.dumps({
+        'description': 'bench', 'amount': 30, 'split_method': 'equal',
+        'participants_data': {str(friend.id): 0 for friend in friends}, 'self': True,
+    }).encode()
+    write = (
+        f'POST /expense/create_expense/ HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+        f'Authorization: Bearer {AccessToken.for_user(payer)}\r\n'
+        f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n'
+    ).encode() + body
+
+    database = connection.settings_dict['NAME']
+    connection.close()  # the servers own the database from here on
+
+    rows = []
+    for profile in ('default', 'tuned'):
+        rows += bench(profile, database, reads, write, readers, writers, duration)
+    print_table(['profile', 'requests', 'completed', 'per_s', 'p50_ms', 'p99_ms', 'lock_timeouts', 'errors'], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10, help='seconds')
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database(on_disk=True):
+        run(args.readers, args.writers, args.duration)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+def setup_django():
+    """Configure Django for a standalone benchmark script."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'split_up.settings')
+    import django
+    django.setup()
+
+
+@contextmanager
+def test_database(on_disk=False):
+    """
+    Create a fresh test database for the duration of the block and destroy it afterwards.
+
+    SQLite test databases live in memory by default; pass `on_disk=True` when the benchmark
+    needs real commits (journal writes and fsyncs) to be part of the measurement.
+    """
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    if on_disk and connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    setup_test_environment(debug=False)
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def make_users(count, prefix='bench'):
+    """Bulk create `count` users with unusable passwords (hashing would dominate the setup time)."""
+    from django.contrib.auth import get_user_model
+    User = get_user_model()
+    users = [
+        User(email=f'{prefix}{i}@example.com', name=f'{prefix} {i}', mobile_number='0000000000', password='!')
+        for i in range(count)
+    ]
+    return User.objects.bulk_create(users)
+
+
+def api_client(user, jwt=False):
+    """
+    An APIClient authenticated as `user`.
+
+    By default authentication is forced and costs nothing; with `jwt=True` every request
+    carries a real Bearer token and pays for JWT authentication like a production client.
+    """
+    from rest_framework.test import APIClient
+    client = APIClient()
+    if jwt:
+        from rest_framework_simplejwt.tokens import AccessToken
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+    else:
+        client.force_authenticate(user=user)
+    return client
+
+
+def timed(func, repeat=5):
+    """Run `func` `repeat` times and return (median seconds, last result)."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+def print_table(headers, rows):
+    """Print rows as a fixed-width text table."""
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print('  '.join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print('  '.join(str(c).rjust(w) for c, w in zip(row, widths)))
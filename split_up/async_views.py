@@ -0,0 +1,131 @@
+"""
+Base class of the async JSON views.
+
+Django REST framework views are sync only: under ASGI Django runs every one of them on a single
+shared thread, so a slow sync view delays every other sync request. The views that must not hold
+that thread (login and signup, which hash passwords) and the hot read endpoints are plain async
+Django views built on `AsyncJSONView` and `AsyncAPIView`, with the same JSON input and output as
+the DRF views. They use the async ORM API and run on the event loop of the ASGI server
+(split_up/asgi.py); under WSGI Django still serves them, one event loop per request.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+from split_up import metrics, renderers
+
+
+class InvalidBody(Exception):
+    """Raised when the request body is not a JSON object."""
+
+
+class AsyncJSONView(View):
+    """Async class-based view taking and returning JSON, exempt from CSRF like DRF's APIView."""
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except InvalidBody as e:
+            return JsonResponse({'error': f'{e}'}, status=400)
+
+    def get_data(self, request):
+        """The JSON object sent in the body (form data is accepted too, like DRF's default parsers)."""
+        if request.content_type != 'application/json':
+            return request.POST.dict()
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            raise InvalidBody("Request body is not valid JSON.")
+        if not isinstance(data, dict):
+            raise InvalidBody("Request body must be a JSON object.")
+        return data
+
+
+class APIResponse(HttpResponse):
+    """JSON response encoding values like DRF's JSONRenderer (e.g. Decimal as a number), with orjson when available."""
+
+    def __init__(self, data, dumps=renderers.dumps, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        with metrics.serializing():
+            content = dumps(data)
+        super().__init__(content=content, **kwargs)
+
+
+class AsyncAPIView(AsyncJSONView):
+    """
+    `AsyncJSONView` behind DRF's authentication, permission and throttling stack, like an `APIView`.
+
+    `authentication_classes`, `permission_classes` and `throttle_classes` default to the
+    `REST_FRAMEWORK` settings and are checked by `APIView`'s own methods on a DRF `Request`, so
+    the errors are those of the sync views, built by the `EXCEPTION_HANDLER`. Authenticators with
+    an `aauthenticate` method (`CachedJWTAuthentication`) authenticate a cached user without
+    leaving the event loop; the others run in a thread. Permissions and throttles run on the
+    event loop, so they must not query the database. The handlers get the Django request, with
+    `request.user` and `request.auth` set.
+    """
+
+    settings = api_settings
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    permission_classes = api_settings.DEFAULT_PERMISSION_CLASSES
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+
+    # The checks of the sync views
+    get_authenticators = APIView.get_authenticators
+    get_permissions = APIView.get_permissions
+    get_throttles = APIView.get_throttles
+    check_permissions = APIView.check_permissions
+    check_throttles = APIView.check_throttles
+    permission_denied = APIView.permission_denied
+    throttled = APIView.throttled
+    get_authenticate_header = APIView.get_authenticate_header
+    get_exception_handler = APIView.get_exception_handler
+
+    async def dispatch(self, request, *args, **kwargs):
+        drf_request = Request(request, authenticators=self.get_authenticators())
+        try:
+            await self.perform_authentication(drf_request)
+            self.check_permissions(drf_request)
+            self.check_throttles(drf_request)
+        except exceptions.APIException as e:
+            return self.handle_exception(drf_request, e)
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def perform_authentication(self, request):
+        """Authenticate `request` like `Request.user` does, awaiting the authenticators that can be."""
+        for authenticator in request.authenticators:
+            if hasattr(authenticator, 'aauthenticate'):
+                user_auth_tuple = await authenticator.aauthenticate(request)
+            else:
+                user_auth_tuple = await sync_to_async(authenticator.authenticate)(request)
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+        request._not_authenticated()
+
+    def handle_exception(self, request, exc):
+        """`APIView.handle_exception`, answering with an `APIResponse`."""
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            # WWW-Authenticate header for 401 responses, else coerce to 403
+            auth_header = self.get_authenticate_header(request)
+            if auth_header:
+                exc.auth_header = auth_header
+            else:
+                exc.status_code = status.HTTP_403_FORBIDDEN
+        context = {'view': self, 'args': self.args, 'kwargs': self.kwargs, 'request': request}
+        response = self.get_exception_handler()(exc, context)
+        if response is None:
+            raise exc
+        headers = {name: value for name, value in response.items() if name.lower() != 'content-type'}
+        return APIResponse(response.data, status=response.status_code, headers=headers)
@@ -0,0 +1,282 @@
+"""
+Per-request SQL and timing instrumentation: a Server-Timing header and Prometheus histograms.
+
+`RequestMetricsMiddleware` measures every request:
+
+- db: the number of queries and the time spent running them, counted by an execute wrapper
+  (`record_query`) installed on every database connection, so it works with DEBUG off;
+- serialize: the time spent encoding response bodies (`serializing`, used by the JSON renderer
+  and `APIResponse`);
+- view: the rest of the time the request spent in the middleware chain and the view;
+- total: view + serialize.
+
+The numbers are sent back in a `Server-Timing` header, which browsers' developer tools display,
+and added to per-route histograms, served in the Prometheus text format by `metrics_view`
+(GET /metrics). The route is the URL pattern, not the path, so the histograms do not grow with
+the ids in the URLs. Like the cache counters, the histograms are kept per server process: scrape
+every process, or run one.
+
+The measurements live in a context variable, which asgiref copies into the threads that run the
+sync code of async views, so the queries of a request are attributed to it under WSGI and ASGI
+alike. What a streamed response does after the headers are sent is not measured.
+"""
+import bisect
+import contextvars
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+# Prometheus' default buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    The measurements of one request, in seconds.
+
+    `statements` is None, or a list the (sql, seconds) of every query are added to (see
+    split_up/profiling.py).
+    """
+
+    __slots__ = ('queries', 'db', 'serialize', 'statements')
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.statements = None
+
+
+def current():
+    """The metrics of the current request, None outside of a measured request."""
+    return _current.get()
+
+
+def measure():
+    """Start measuring the current context's queries (when no middleware does); returns (metrics, token)."""
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper adding the query and its duration to the current request's metrics."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        metrics.db += duration
+        metrics.queries += 1
+        if metrics.statements is not None:
+            metrics.statements.append((sql, duration))
+
+
+def install(connection, **kwargs):
+    """Install `record_query` on `connection`, first so the wrappers pushed by others pop cleanly."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+connection_created.connect(install)
+
+
+class serializing:
+    """Context manager adding the time spent in its block to the current request's serialize time."""
+
+    __slots__ = ('metrics', 'start')
+
+    def __enter__(self):
+        self.metrics = _current.get()
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self.metrics is not None:
+            self.metrics.serialize += time.perf_counter() - self.start
+
+
+class Histogram:
+    """Cumulative histogram of the observed values, Prometheus style."""
+
+    __slots__ = ('buckets', 'counts', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self):
+        """(le, cumulative count) for every bucket, then for +Inf."""
+        total = 0
+        for le, count in zip((*self.buckets, '+Inf'), self.counts):
+            total += count
+            yield le, total
+
+
+# name: (help, buckets) of the histograms kept per route
+HISTOGRAMS = {
+    'split_up_request_duration_seconds': ("Time to handle a request (view + serialize).", DURATION_BUCKETS),
+    'split_up_request_view_seconds': ("Time spent in the middleware chain and the view, serialization excluded.", DURATION_BUCKETS),
+    'split_up_request_db_seconds': ("Time spent running SQL queries.", DURATION_BUCKETS),
+    'split_up_request_serialize_seconds': ("Time spent encoding the response body.", DURATION_BUCKETS),
+    'split_up_request_queries': ("SQL queries run by a request.", QUERY_BUCKETS),
+}
+
+
+class RouteMetrics:
+    """The histograms of one (method, route) and its responses by status code."""
+
+    def __init__(self):
+        self.histograms = {name: Histogram(buckets) for name, (_, buckets) in HISTOGRAMS.items()}
+        self.statuses = {}
+
+
+_routes = {}
+_lock = threading.Lock()
+
+
+def observe(method, route, status, metrics, total):
+    """Add the measurements of a request to the histograms of its route."""
+    values = {
+        'split_up_request_duration_seconds': total,
+        'split_up_request_view_seconds': total - metrics.serialize,
+        'split_up_request_db_seconds': metrics.db,
+        'split_up_request_serialize_seconds': metrics.serialize,
+        'split_up_request_queries': metrics.queries,
+    }
+    with _lock:
+        route_metrics = _routes.get((method, route))
+        if route_metrics is None:
+            route_metrics = _routes[(method, route)] = RouteMetrics()
+        for name, value in values.items():
+            route_metrics.histograms[name].observe(value)
+        route_metrics.statuses[status] = route_metrics.statuses.get(status, 0) + 1
+
+
+def reset():
+    """Forget every observation (for the tests)."""
+    with _lock:
+        _routes.clear()
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def exposition():
+    """The histograms and request counts in the Prometheus text format."""
+    with _lock:
+        routes = sorted(_routes.items())
+        lines = [
+            '# HELP split_up_requests_total Requests handled, by route and status code.',
+            '# TYPE split_up_requests_total counter',
+        ]
+        for (method, route), route_metrics in routes:
+            for status, count in sorted(route_metrics.statuses.items()):
+                lines.append(f'split_up_requests_total{{{_labels(method=method, route=route, status=status)}}} {count}')
+        for name, (help_text, _) in HISTOGRAMS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for (method, route), route_metrics in routes:
+                histogram = route_metrics.histograms[name]
+                labels = _labels(method=method, route=route)
+                for le, count in histogram.samples():
+                    lines.append(f'{name}_bucket{{{labels},le="{le}"}} {count}')
+                lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+                lines.append(f'{name}_count{{{labels}}} {sum(histogram.counts)}')
+    return '\n'.join(lines) + '\n'
+
+
+def server_timing(metrics, total):
+    """The Server-Timing header value of a request's measurements (durations in milliseconds)."""
+    return (
+        f'db;dur={metrics.db * 1000:.2f};desc="{metrics.queries} queries", '
+        f'view;dur={(total - metrics.serialize) * 1000:.2f}, '
+        f'serialize;dur={metrics.serialize * 1000:.2f}, '
+        f'total;dur={total * 1000:.2f}'
+    )
+
+
+def route_of(request):
+    """The URL pattern `request` matched, e.g. '/expense/get_user/<str:email>/' ('' when none matched)."""
+    match = getattr(request, 'resolver_match', None)
+    return f'/{match.route}' if match is not None else ''
+
+
+class RequestMetricsMiddleware:
+    """
+    Measure every request: Server-Timing header and per-route histograms (see the module docstring).
+
+    Sync and async capable, so it does not make ASGI requests hop threads. Put it first in
+    MIDDLEWARE to measure the whole middleware chain.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # Connections opened before the middleware was loaded did not get the wrapper
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    def finish(self, request, response, metrics, total):
+        response['Server-Timing'] = server_timing(metrics, total)
+        observe(request.method, route_of(request), response.status_code, metrics, total)
+        return response
+
+
+def metrics_view(request):
+    """
+    GET /metrics: the request histograms in the Prometheus text format.
+
+    Only served to the addresses of `METRICS_ALLOWED_IPS` (the scraper's), 403 for the others.
+    """
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(exposition(), content_type=CONTENT_TYPE)
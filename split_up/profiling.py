@@ -0,0 +1,216 @@
+"""
+On-demand profiling of single requests, for staff users.
+
+A staff user (`is_staff`, authenticated with a JWT or a session) sends `X-Profile: save` or
+`X-Profile: inline` with a request, and that one request runs under cProfile with its SQL recorded
+(by the execute wrapper of split_up/metrics.py):
+
+- save: the response is the usual one, with an `X-Profile-Id` header. The profile is written to
+  `PROFILE_ROOT` as `<id>.prof` (pstats format, e.g. for snakeviz) next to `<id>.json`, the
+  request, its status, duration and SQL statements. `python manage.py profiles` lists and
+  summarizes them;
+- inline: the response is replaced by a JSON document with the original status, the duration,
+  the top functions by cumulative time and the SQL statements.
+
+The header of anyone else is ignored. Without the header a request only pays for one dictionary
+lookup.
+
+cProfile only sees the thread it is enabled in, while a request spreads over two: the async code
+runs on an event loop and the sync code (the ORM calls of the async views, the sync views) in
+Django's sync thread. So a profiled request gets an event loop and a thread of its own, as
+`async_to_sync` gives them, each with a profiler, and the two profiles are merged: other requests
+never show up in it. What a streamed response does after the headers are sent is not profiled.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import uuid
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+
+from Users_app.authentication import CachedJWTAuthentication
+from split_up import metrics
+
+HEADER = 'HTTP_X_PROFILE'
+MODES = ('save', 'inline')
+
+# Functions listed by an inline profile
+INLINE_LIMIT = 40
+
+authentication = CachedJWTAuthentication()
+
+
+def jwt_user(request):
+    try:
+        authenticated = authentication.authenticate(request)
+    except APIException:
+        return None
+    return authenticated and authenticated[0]
+
+
+async def ajwt_user(request):
+    try:
+        authenticated = await authentication.aauthenticate(request)
+    except APIException:
+        return None
+    return authenticated and authenticated[0]
+
+
+def summary(stats, sort='cumulative', limit=INLINE_LIMIT):
+    """The `limit` top functions of `stats` by `sort`, as pstats prints them."""
+    out = io.StringIO()
+    stats.stream = out
+    stats.sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+class Profile:
+    """The cProfile stats and SQL statements of one request."""
+
+    def __init__(self, request, response, stats, statements, duration):
+        self.id = f'{timezone.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}'
+        self.request = request
+        self.response = response
+        self.stats = stats
+        self.statements = statements
+        self.duration = duration
+
+    def data(self, user):
+        return {
+            'id': self.id,
+            'created_at': timezone.now().isoformat(),
+            'user': user.email,
+            'method': self.request.method,
+            'path': self.request.get_full_path(),
+            'status': self.response.status_code,
+            'duration_ms': round(self.duration * 1000, 3),
+            'queries': [{'sql': sql, 'duration_ms': round(seconds * 1000, 3)} for sql, seconds in self.statements],
+        }
+
+    def save(self, user):
+        os.makedirs(settings.PROFILE_ROOT, exist_ok=True)
+        self.stats.dump_stats(os.path.join(settings.PROFILE_ROOT, f'{self.id}.prof'))
+        with open(os.path.join(settings.PROFILE_ROOT, f'{self.id}.json'), 'w') as file:
+            json.dump(self.data(user), file, indent=2)
+
+    def inline_response(self, user):
+        data = self.data(user)
+        data['profile'] = summary(self.stats)
+        return JsonResponse(data)
+
+
+def saved():
+    """The metadata of the profiles saved in `PROFILE_ROOT`, oldest first."""
+    if not os.path.isdir(settings.PROFILE_ROOT):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(settings.PROFILE_ROOT)):
+        if name.endswith('.json'):
+            with open(os.path.join(settings.PROFILE_ROOT, name)) as file:
+                profiles.append(json.load(file))
+    return profiles
+
+
+def load(profile_id):
+    """The (metadata, pstats.Stats) of the saved profile `profile_id`; raises FileNotFoundError."""
+    path = os.path.join(settings.PROFILE_ROOT, os.path.basename(profile_id))
+    with open(f'{path}.json') as file:
+        data = json.load(file)
+    return data, pstats.Stats(f'{path}.prof')
+
+
+def profile(request, handler):
+    """
+    Serve `request` with the async `handler` under cProfile; returns a `Profile`.
+
+    Must run in a thread without an event loop: it becomes the request's sync thread, and
+    `async_to_sync` runs `handler` on a new event loop in another thread (a new one even when
+    called from an async request's worker thread, so the server's loop is not profiled).
+    """
+    loop_profiler = cProfile.Profile()
+
+    async def profiled():
+        loop_profiler.enable()
+        try:
+            return await handler(request)
+        finally:
+            loop_profiler.disable()
+
+    request_metrics, token = metrics.current(), None
+    if request_metrics is None:
+        request_metrics, token = metrics.measure()
+    request_metrics.statements = []
+    start = time.perf_counter()
+    try:
+        with cProfile.Profile() as thread_profiler:
+            response = async_to_sync(profiled, force_new_loop=True)()
+    finally:
+        duration = time.perf_counter() - start
+        statements, request_metrics.statements = request_metrics.statements, None
+        if token is not None:
+            metrics.stop(token)
+
+    stats = pstats.Stats(thread_profiler)
+    stats.add(loop_profiler)
+    return Profile(request, response, stats, statements, duration)
+
+
+def respond(profiled, user, mode):
+    if mode == 'inline':
+        return profiled.inline_response(user)
+    profiled.save(user)
+    profiled.response['X-Profile-Id'] = profiled.id
+    return profiled.response
+
+
+class ProfilingMiddleware:
+    """
+    Profile the requests of staff users sending `X-Profile` (see the module docstring).
+
+    Put it after AuthenticationMiddleware, so that staff logged in to the admin are recognized too.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        mode = request.META.get(HEADER)
+        if mode not in MODES:
+            return self.get_response(request)
+        user = jwt_user(request) or request.user
+        if not user.is_staff:
+            return self.get_response(request)
+        return respond(profile(request, sync_to_async(self.get_response)), user, mode)
+
+    async def __acall__(self, request):
+        mode = request.META.get(HEADER)
+        if mode not in MODES:
+            return await self.get_response(request)
+        user = await ajwt_user(request) or await request.auser()
+        if not user.is_staff:
+            return await self.get_response(request)
+        profiled = await sync_to_async(self.profile_in_thread, thread_sensitive=False)(request)
+        return respond(profiled, user, mode)
+
+    def profile_in_thread(self, request):
+        try:
+            return profile(request, self.get_response)
+        finally:
+            # The thread is a pool's: do not leave its connections open
+            connections.close_all()
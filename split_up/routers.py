@@ -0,0 +1,111 @@
+"""
+Primary/replica database routing.
+
+Writes always go to the primary ('default'). Reads go to the primary too, except inside the view
+methods decorated with `reads_from_replica`: the ledger read endpoints, which are the bulk of the
+read traffic. Those read from one of the `DATABASE_REPLICAS` aliases, picked at random once per
+request so a paginated response comes from a single replica.
+
+Replicas lag behind the primary, so a user who has just written would not see their own write.
+Every ledger write pins the users it touched (see `Expences_app.cache.invalidate_users`): for
+`REPLICA_PIN_SECONDS` their reads stay on the primary. The pins live in the 'default' cache,
+which must be shared by the server processes for the pins to be seen by all of them.
+
+`replicate` copies the primary into a replica with SQLite's online backup. It stands in for real
+replication in development and in the tests (see the `sync_replicas` command).
+"""
+import contextvars
+import functools
+import inspect
+import random
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.transaction import TransactionManagementError
+
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+
+
+def _pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def pin(user_ids):
+    """Send the reads of `user_ids` to the primary for the next `REPLICA_PIN_SECONDS`."""
+    if settings.DATABASE_REPLICAS:
+        caches['default'].set_many({_pin_key(user_id): True for user_id in set(user_ids)}, timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user_id):
+    return caches['default'].get(_pin_key(user_id)) is not None
+
+
+def read_alias_for(user_id):
+    """The database the reads of `user_id` should use: a replica, unless the user is pinned."""
+    if not settings.DATABASE_REPLICAS or is_pinned(user_id):
+        return DEFAULT_DB_ALIAS
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+def read_alias():
+    """The database the reads of the current request are routed to."""
+    return _read_alias.get() or DEFAULT_DB_ALIAS
+
+
+def reads_from_replica(handler):
+    """
+    Route the reads of a view method to a replica, unless the requesting user is pinned.
+
+    Works on both sync and async handlers. Only the queries run while the handler runs are
+    routed; a streamed response that reads lazily must bind its querysets with `read_alias()`.
+    """
+    if inspect.iscoroutinefunction(handler):
+        @functools.wraps(handler)
+        async def async_wrapper(self, request, *args, **kwargs):
+            token = _read_alias.set(read_alias_for(request.user.pk))
+            try:
+                return await handler(self, request, *args, **kwargs)
+            finally:
+                _read_alias.reset(token)
+        return async_wrapper
+
+    @functools.wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        token = _read_alias.set(read_alias_for(request.user.pk))
+        try:
+            return handler(self, request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+    return wrapper
+
+
+def replicate(alias):
+    """Copy the primary database into the replica `alias` (SQLite only), outside of a transaction."""
+    primary = connections[DEFAULT_DB_ALIAS]
+    if primary.in_atomic_block:
+        # SQLite's backup would wait forever for the transaction to end
+        raise TransactionManagementError("replicate() cannot run inside a transaction.")
+    replica = connections[alias]
+    primary.ensure_connection()
+    replica.ensure_connection()
+    primary.connection.backup(replica.connection)
+
+
+class PrimaryReplicaRouter:
+    """Database router of the project, see the module docstring."""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        # Explicit, or Django would write an object back to the replica it was read from
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        return db not in settings.DATABASE_REPLICAS
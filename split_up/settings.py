@@ -1,159 +1,270 @@
-"""
-Django settings for split_up project.
-
-Generated by 'django-admin startproject' using Django 5.1.2.
-
-For more information on this file, see
-https://docs.djangoproject.com/en/5.1/topics/settings/
-
-For the full list of settings and their values, see
-https://docs.djangoproject.com/en/5.1/ref/settings/
-"""
-
-from pathlib import Path
-
-# Build paths inside the project like this: BASE_DIR / 'subdir'.
-BASE_DIR = Path(__file__).resolve().parent.parent
-
-
-# Quick-start development settings - unsuitable for production
-# See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
-
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-)1783@@zf9yf+%6fi&j*=fgmy7f6u_!j4h=%un(=b@mgvy!!$y'
-
-# SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
-
-ALLOWED_HOSTS = []
-
-
-# Application definition
-
-INSTALLED_APPS = [
-    'django.contrib.admin',
-    'django.contrib.auth',
-    'django.contrib.contenttypes',
-    'django.contrib.sessions',
-    'django.contrib.messages',
-    'django.contrib.staticfiles',
-    'rest_framework',
-    'rest_framework_simplejwt.token_blacklist',  # To handle JWT blacklisting
-    'corsheaders',
-    'Users_app',
-    'Expences_app'
-]
-
-MIDDLEWARE = [
-    'corsheaders.middleware.CorsMiddleware',
-    'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
-]
-
-ROOT_URLCONF = 'split_up.urls'
-
-TEMPLATES = [
-    {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
-        'APP_DIRS': True,
-        'OPTIONS': {
-            'context_processors': [
-                'django.template.context_processors.debug',
-                'django.template.context_processors.request',
-                'django.contrib.auth.context_processors.auth',
-                'django.contrib.messages.context_processors.messages',
-            ],
-        },
-    },
-]
-
-WSGI_APPLICATION = 'split_up.wsgi.application'
-
-
-# Database
-# https://docs.djangoproject.com/en/5.1/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
-
-
-# Password validation
-# https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
-
-AUTH_PASSWORD_VALIDATORS = [
-    {
-        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
-    },
-]
-
-
-# Internationalization
-# https://docs.djangoproject.com/en/5.1/topics/i18n/
-
-LANGUAGE_CODE = 'en-us'
-
-TIME_ZONE = 'UTC'
-
-USE_I18N = True
-
-USE_TZ = True
-
-
-# Static files (CSS, JavaScript, Images)
-# https://docs.djangoproject.com/en/5.1/howto/static-files/
-
-STATIC_URL = 'static/'
-
-# Default primary key field type
-# https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
-
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-from datetime import timedelta
-
-# Custom User Model
-AUTH_USER_MODEL = 'Users_app.CustomUser'  # Replace 'yourapp' with the actual app name
-
-# Add these for REST framework and JWT authentication
-REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    ],
-    'DEFAULT_PERMISSION_CLASSES': [
-        'rest_framework.permissions.IsAuthenticated',
-    ],
-}
-
-# Simple JWT settings
-SIMPLE_JWT = {
-    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),  # Adjust as necessary
-    'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
-    'ROTATE_REFRESH_TOKENS': False,
-    'BLACKLIST_AFTER_ROTATION': True,
-
-    'AUTH_HEADER_TYPES': ('Bearer',),  # Authorization: Bearer <Token>
-    'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
-}
-
-# CORS settings (if needed for cross-origin API requests)
-CORS_ALLOW_ALL_ORIGINS = True
-
+"""
+Django settings for split_up project.
+
+Generated by 'django-admin startproject' using Django 5.1.2.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.1/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/5.1/ref/settings/
+"""
+
+from pathlib import Path
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = 'django-insecure-)1783@@zf9yf+%6fi&j*=fgmy7f6u_!j4h=%un(=b@mgvy!!$y'
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = True
+
+ALLOWED_HOSTS = []
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'rest_framework',
+    'rest_framework_simplejwt.token_blacklist',  # To handle JWT blacklisting
+    'corsheaders',
+    'Users_app',
+    'Expences_app'
+]
+
+MIDDLEWARE = [
+    # First, to measure the whole chain (see split_up/metrics.py)
+    'split_up.metrics.RequestMetricsMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Staff users' X-Profile requests (see split_up/profiling.py)
+    'split_up.profiling.ProfilingMiddleware',
+]
+
+ROOT_URLCONF = 'split_up.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'split_up.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+
+# SQLite is tuned for a web server when each connection is opened (applied by the
+# 'init_command' option below):
+# - journal_mode=WAL: readers no longer block behind a writer, nor the writer behind readers;
+# - synchronous=NORMAL: in WAL mode a commit no longer waits for an fsync (a power loss may lose
+#   the last commits, but never corrupts the database);
+# - busy_timeout: a writer waits up to this many milliseconds for the write lock before
+#   failing with "database is locked";
+# - mmap_size, cache_size (negative: in KiB) and temp_store: read through a memory map, keep
+#   more pages cached per connection and keep temporary tables and indexes in memory.
+# Write transactions take the write lock when they BEGIN ('transaction_mode': 'IMMEDIATE'), so a
+# transaction that reads first waits on busy_timeout instead of failing when it starts writing.
+# Connections are kept open between requests (CONN_MAX_AGE) so the pragmas, the page cache and
+# the memory map are set up once per connection rather than once per request.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+}
+
+
+# Read replicas: aliases of DATABASES holding read-only copies of 'default'. The ledger read
+# endpoints read from them, see split_up/routers.py. For example, with SQLite:
+#     DATABASES['replica'] = {**DATABASES['default'], 'NAME': BASE_DIR / 'db-replica.sqlite3'}
+#     DATABASE_REPLICAS = ['replica']
+# and `python manage.py sync_replicas --interval 1` standing in for replication.
+DATABASE_REPLICAS = []
+
+DATABASE_ROUTERS = ['split_up.routers.PrimaryReplicaRouter']
+
+# Seconds during which the users touched by a write read from the primary, so they see their
+# own writes despite the replication lag
+REPLICA_PIN_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# The 'ledger' cache holds the per-user ledger versions and cached responses of the read endpoints.
+# LocMemCache is per process: with several worker processes use a shared backend, e.g.
+#     'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': BASE_DIR / 'cache'
+#     'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'ledger': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ledger',
+        'TIMEOUT': 300,
+    },
+}
+
+LEDGER_CACHE_ALIAS = 'ledger'
+
+
+# Password validation
+# https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/5.1/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/5.1/howto/static-files/
+
+STATIC_URL = 'static/'
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+from datetime import timedelta
+
+# Custom User Model
+AUTH_USER_MODEL = 'Users_app.CustomUser'  # Replace 'yourapp' with the actual app name
+
+# Add these for REST framework and JWT authentication
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'Users_app.authentication.CachedJWTAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': [
+        'rest_framework.permissions.IsAuthenticated',
+    ],
+    # orjson when installed, the stdlib otherwise (see split_up/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'split_up.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Simple JWT settings
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),  # Adjust as necessary
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    'ROTATE_REFRESH_TOKENS': False,
+    'BLACKLIST_AFTER_ROTATION': True,
+
+    'AUTH_HEADER_TYPES': ('Bearer',),  # Authorization: Bearer <Token>
+    'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
+}
+
+# In-process cache of the users authenticated by CachedJWTAuthentication: maximum entries and
+# seconds a user is served without reading the database (the staleness bound across processes)
+AUTH_USER_CACHE_SIZE = 10000
+AUTH_USER_CACHE_TTL = 60
+
+# Threads hashing passwords for login and signup, and hashes allowed to wait for one before
+# login and signup answer 503 (see Users_app/hashing.py)
+PASSWORD_HASHING_WORKERS = 2
+PASSWORD_HASHING_QUEUE_SIZE = 64
+
+# Number of expenses committed per transaction by the batch import endpoint
+EXPENSE_IMPORT_CHUNK_SIZE = 500
+
+# Default and maximum page size of the cursor paginated expense lists
+EXPENSE_PAGE_SIZE = 100
+EXPENSE_MAX_PAGE_SIZE = 1000
+
+# Rows fetched per database round trip (and written per chunk) by the balance sheet exports
+EXPENSE_EXPORT_CHUNK_SIZE = 2000
+
+# Records per chunk of the NDJSON streams of the list endpoints (also the rows fetched per database
+# round trip), see split_up/streaming.py
+STREAM_CHUNK_SIZE = 1000
+
+# Background balance sheet exports (see Expences_app/exports.py): threads writing the files (0 runs
+# the jobs inline, in the request), where the files go, and how long finished jobs are kept
+EXPORT_WORKERS = 2
+EXPORT_ROOT = BASE_DIR / 'exports'
+EXPORT_RETENTION = timedelta(days=1)
+
+# Longest range of months served by the analytics endpoint
+ANALYTICS_MAX_MONTHS = 120
+
+# Addresses allowed to scrape the request metrics at /metrics (see split_up/metrics.py)
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# Where the requests profiled with `X-Profile: save` are written (see split_up/profiling.py)
+PROFILE_ROOT = BASE_DIR / 'profiles'
+
+# CORS settings (if needed for cross-origin API requests)
+CORS_ALLOW_ALL_ORIGINS = True
+
 ALLOWED_HOSTS = ['localhost', '127.0.0.1'] 
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""
+Streamed NDJSON responses of the async list endpoints.
+
+A client sending `Accept: application/x-ndjson` gets the whole list as newline-delimited JSON, one
+record per line, instead of a page. The records come from an iterator over a database cursor
+(`QuerySet.iterator`), are encoded `STREAM_CHUNK_SIZE` lines at a time and sent as they are
+encoded, so the memory a response holds does not grow with the number of rows.
+
+The stream is built from sync iterators, which a WSGI server consumes as they are. Under ASGI
+every chunk is read and encoded in the request's sync thread, as `QuerySet.aiterator` reads its
+rows, and sent from the event loop. (Given an async iterator, Django's WSGI handler would read the
+whole stream into memory before sending it.)
+
+When the request's `Accept-Encoding` allows gzip, the stream is compressed on the fly with a single
+deflate stream, flushed after every chunk so the client can decode each chunk as it arrives.
+(Django's GZipMiddleware compresses every chunk of an async stream as a separate gzip member,
+which costs most of the compression on chunks this small.)
+"""
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+from split_up import renderers
+
+NDJSON = 'application/x-ndjson'
+
+re_accepts_gzip = _lazy_re_compile(r'\bgzip\b')
+
+
+def _quality(media_type):
+    try:
+        return float(media_type.params.get('q', 1))
+    except ValueError:
+        return 0.0
+
+
+def wants_ndjson(request):
+    """True when the `Accept` header lists NDJSON, with a quality at least that of JSON."""
+    ndjson = json_ = 0.0
+    for media_type in request.accepted_types:
+        if (media_type.main_type, media_type.sub_type) == ('application', 'x-ndjson'):
+            ndjson = max(ndjson, _quality(media_type))
+        elif (media_type.main_type, media_type.sub_type) == ('application', 'json'):
+            json_ = max(json_, _quality(media_type))
+    return ndjson > 0 and ndjson >= json_
+
+
+def accepts_gzip(request):
+    return bool(re_accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+
+
+def variant(request):
+    """The representation `request` negotiates: '' (a JSON page), 'ndjson' or 'ndjson+gzip'."""
+    if not wants_ndjson(request):
+        return ''
+    return 'ndjson+gzip' if accepts_gzip(request) else 'ndjson'
+
+
+def encode_lines(records, dumps=renderers.dumps):
+    """Encode the dicts of the iterator `records` with `dumps` as NDJSON, `STREAM_CHUNK_SIZE` lines per chunk."""
+    lines = []
+    for record in records:
+        lines.append(dumps(record))
+        if len(lines) >= settings.STREAM_CHUNK_SIZE:
+            lines.append(b'')
+            yield b'\n'.join(lines)
+            lines = []
+    if lines:
+        lines.append(b'')
+        yield b'\n'.join(lines)
+
+
+def gzip_chunks(chunks):
+    """Compress the iterator of bytes `chunks` as one gzip stream, flushed after every chunk."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+async def in_sync_thread(chunks):
+    """Iterate the sync iterator `chunks` from the event loop, computing each chunk in the sync thread."""
+    next_chunk = sync_to_async(next)
+    while (chunk := await next_chunk(chunks, None)) is not None:
+        yield chunk
+
+
+class NDJSONResponse(StreamingHttpResponse):
+    """
+    A streamed NDJSON response of the iterator of dicts `records`, gzipped if `request` allows it.
+
+    The stream is async for an ASGI request and sync for a WSGI one, so neither handler buffers it.
+    """
+
+    def __init__(self, request, records, dumps=renderers.dumps, **kwargs):
+        content = encode_lines(records, dumps)
+        gzipped = accepts_gzip(request)
+        if gzipped:
+            content = gzip_chunks(content)
+        if isinstance(request, ASGIRequest):
+            content = in_sync_thread(content)
+        kwargs.setdefault('content_type', NDJSON)
+        super().__init__(content, **kwargs)
+        patch_vary_headers(self, ('Accept', 'Accept-Encoding'))
+        if gzipped:
+            self['Content-Encoding'] = 'gzip'